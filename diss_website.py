@@ -7,83 +7,133 @@ from reflex.style import set_color_mode, color_mode  # For handling color modes
 import smtplib  # For sending emails
 from email.mime.text import MIMEText  # For creating email content
 from email.mime.multipart import MIMEMultipart  # For creating multipart emails
-import copy  # For deep copying objects
 import time  # For time-related operations
-from typing import Any, List, Union  # For type hints
+from typing import Any, List, NamedTuple  # For type hints
 import os  # For interacting with the operating system
+import bisect  # For bucketing histogram observations
+import contextvars  # For tracking the event being processed by the current task
+import functools  # For caching handler labels
+import re  # For tidying generated state class names
+import contextlib  # For lifespan context managers
+import hashlib  # For hashing session tokens
+import hmac  # For constant-time admin token checks
+import json  # For flight recorder dumps
+import signal  # For on-demand dumps via SIGUSR1
+import sys  # For sampling thread stacks
+import threading  # For the slow-event watchdog
+import traceback  # For formatting stack samples
+import asyncio  # For background maintenance tasks
+import collections  # For the LRU session index
+import dataclasses  # For the session store's fields
+import weakref  # For per-session locks that go away with the session
+import urllib.parse  # For resolving URLs in stylesheets
+import zlib  # For modelling permessage-deflate in the transport benchmark
+import base64  # For URL-safe result tokens
+import html  # For escaping option text on result permalink pages
+import html.parser  # For finding above-the-fold elements in exported pages
+import importlib.util  # For detecting optional dependencies
+import statistics  # For ability percentiles in the adaptive quiz
+import math  # For HyperLogLog's small-range correction and DDSketch bins
+import sqlite3  # Embedded store for leaderboard entries
+import tempfile  # For scratch databases in benchmarks
+import gzip  # For precompressed .gz siblings
+import mimetypes  # For the Content-Type of precompressed files
+import io  # For in-memory WOFF2 encoding
+import mmap  # For serving the static pack without copies
+import struct  # For the static pack header
+from reflex.components.el.elements.base import BaseHTML  # Base for the SVG <use> element
+from reflex.app import default_backend_exception_handler  # Default error toast for backend exceptions
+from reflex.event import EventSpec  # Return type for the backend exception handler
+from reflex.istate.manager import StateManager, StateManagerDisk, StateManagerMemory  # Reflex state manager base classes
+from reflex.state import _split_substate_key  # Splits "<token>_<substate>" keys
+from reflex.utils.exceptions import LockExpiredError  # Raised when a session lock is lost mid-event
+from reflex.environment import environment  # Reflex's run mode (dev or prod)
+from reflex.middleware import Middleware  # Base class for event middleware
+from reflex.utils import format as rx_format  # Reflex's JSON serializer for state deltas
+from reflex.utils.serializers import serialize  # Converts non-JSON values (for binary codecs)
+from starlette.applications import Starlette  # Extra backend routes (metrics, admin)
+from starlette.datastructures import Headers  # Request headers for static file negotiation
+from starlette.routing import Mount, Route  # Mounts and routes for the static file server
+from starlette.staticfiles import NotModifiedResponse, StaticFiles  # Base for precompressed static files
+from starlette.responses import FileResponse, HTMLResponse, JSONResponse, PlainTextResponse, RedirectResponse, Response  # HTTP responses for the extra routes
 
 
-# Component for a top banner that can be toggled on/off
-class TopBannerBasic(rx.ComponentState):
-    hide: bool = False  # State to track if the banner is hidden
+# Routes that show the quiz banner; decided per route when the page is compiled
+BANNER_ROUTES = frozenset({"/"})
 
-    # Event handler to toggle the banner visibility
-    @rx.event
-    def toggle(self):
-        self.hide = not self.hide
+# Flip the banner in the browser and remember the choice; no server state or events
+TOGGLE_BANNER_SCRIPT = (
+    "var hidden = document.documentElement.classList.toggle('banner-hidden');"
+    "localStorage.setItem('topBannerHidden', hidden ? '1' : '0');"
+)
 
-    # Method to render the banner component
-    @classmethod
-    def get_component(cls, **props):
-        return rx.cond(
-            ~cls.hide,  # Show the banner if not hidden
-            rx.hstack(
-                rx.flex(
-                    rx.badge(
-                        rx.icon("circle-help", size=18, aria_label="Help icon"),
-                        padding="0.30rem",
-                        radius="full",
-                        color="#333333",
-                    ),
-                    rx.text(
-                        "Want To Try Our AI Quiz? - ",
-                        rx.link(
-                            "Try AI Quiz!",
-                            href="/resources/user-experiences#quiz-form",
-                            underline="always",
-                            display="inline",
-                            underline_offset="2px",
-                            color="#333333",
-                            aria_label="Link to AI Quiz form section",
-                        ),
-                        weight="medium",
-                        font_family="Montserrat",
+
+# Component for a top banner that can be toggled on/off
+def top_banner(**props) -> rx.Component:
+    return rx.fragment(
+        # Apply the remembered choice as soon as the page loads
+        rx.script(
+            "if (localStorage.getItem('topBannerHidden') === '1') "
+            "document.documentElement.classList.add('banner-hidden');"
+        ),
+        rx.hstack(
+            rx.flex(
+                rx.badge(
+                    icon("circle-help", size=18, aria_label="Help icon"),
+                    padding="0.30rem",
+                    radius="full",
+                    color="#333333",
+                ),
+                rx.text(
+                    "Want To Try Our AI Quiz? - ",
+                    rx.link(
+                        "Try AI Quiz!",
+                        href="/resources/user-experiences#quiz-form",
+                        underline="always",
+                        display="inline",
+                        underline_offset="2px",
                         color="#333333",
+                        aria_label="Link to AI Quiz form section",
                     ),
-                    align="center",
-                    margin="auto",
-                    spacing="3",
-                    role="alert",  # Accessibility: mark banner as an alert
-                ),
-                rx.icon(
-                    "x",
-                    cursor="pointer",
-                    justify="end",
-                    flex_shrink=0,
-                    on_click=cls.toggle,  # Toggle banner on click
-                    color="#ffffff",
-                    aria_label="Dismiss banner",  # Accessibility label
-                    role="button",
-                    tab_index="0",  # Make it keyboard focusable
+                    weight="medium",
+                    font_family=font_stack("Montserrat"),
+                    color="#333333",
                 ),
-                wrap="nowrap",
-                justify="between",
-                width="100%",
                 align="center",
-                left="0",
-                padding="1rem",
-                background_color="rgba(255, 127, 80)",  # Coral background color
-                **props,
+                margin="auto",
+                spacing="3",
+                role="alert",  # Accessibility: mark banner as an alert
             ),
-            # Fallback: Show a button to toggle the banner back on
-            rx.icon_button(
-                rx.icon("eye", aria_label="Show banner"),
+            icon(
+                "x",
                 cursor="pointer",
-                on_click=cls.toggle,
-                aria_label="Show banner toggle button",
+                justify="end",
+                flex_shrink=0,
+                on_click=rx.call_script(TOGGLE_BANNER_SCRIPT),  # Hide banner on click
+                color="#ffffff",
+                aria_label="Dismiss banner",  # Accessibility label
+                role="button",
+                tab_index=0,  # Make it keyboard focusable
             ),
-        )
-
+            wrap="nowrap",
+            justify="between",
+            width="100%",
+            align="center",
+            left="0",
+            padding="1rem",
+            background_color="rgba(255, 127, 80)",  # Coral background color
+            class_name="top-banner",
+            **props,
+        ),
+        # Fallback: Show a button to toggle the banner back on
+        rx.icon_button(
+            icon("eye", aria_label="Show banner"),
+            cursor="pointer",
+            on_click=rx.call_script(TOGGLE_BANNER_SCRIPT),
+            aria_label="Show banner toggle button",
+            class_name="top-banner-show",
+        ),
+    )
 
 
 # Base styling for components
@@ -151,24 +201,24 @@ class ContactFormState(rx.State):
 def dark_mode_toggle() -> rx.Component:
     return rx.segmented_control.root(
         rx.segmented_control.item(
-            rx.icon(tag="monitor", size=20, aria_label="System Default Mode"),
+            icon(tag="monitor", size=20, aria_label="System Default Mode"),
             value="system",
             aria_label="System Default Mode",
         ),
         rx.segmented_control.item(
-            rx.icon(tag="sun", size=20, aria_label="Light Mode"),
+            icon(tag="sun", size=20, aria_label="Light Mode"),
             value="light",
             aria_label="Light Mode",
         ),
         rx.segmented_control.item(
-            rx.icon(tag="moon", size=20, aria_label="Dark Mode"),
+            icon(tag="moon", size=20, aria_label="Dark Mode"),
             value="dark",
             aria_label="Dark Mode",
         ),
-        on_change=State.set_color_mode,
+        on_change=set_color_mode,  # Handled in the browser; no server round trip or state
         variant="classic",
         radius="large",
-        value=State.color_mode,
+        value=color_mode,
         role="radiogroup",
         aria_label="Toggle color mode",
     )
@@ -191,7 +241,7 @@ def breadcrumb_trail(crumbs: list[tuple[str, str]]) -> rx.Component:
         "color": "#270042",  #
         "transition": "color 0.3s ease",
         "text-decoration": "none",
-        "font-family": "Poppins",
+        "font-family": font_stack("Poppins"),
         "font-size": "16px",  
         "@media (max-width: 768px)": {
             "font-size": "14px",
@@ -261,7 +311,7 @@ def navbar_link(label: str, href: str):
             size="4",
             weight="medium",
             color="white",
-            font_family="Poppins",
+            font_family=font_stack("Poppins"),
         ),
         href=href,
         aria_label=f"Navigate to {label}",  # Descriptive for screen readers
@@ -270,61 +320,229 @@ def navbar_link(label: str, href: str):
 
 
 
+# Quiz content lives in module-level immutable tables so it is never copied
+# into (or serialized out of) per-session state.
+class QuizQuestion(NamedTuple):
+    prompt: str  # Question text
+    options: tuple  # Option labels, in display order
+    key: int  # Bitset of the correct options (bit i set for option i)
+    multi: bool = False  # Whether several options may be selected
+
+
+def option_bits(*indices) -> int:
+    """Bitset with the given option indices set."""
+    return sum(1 << index for index in set(indices))
+
+
+QUIZ_QUESTIONS = (
+    QuizQuestion(
+        "Which of the following is a key component of a neural network?",
+        ("Neurons", "Decision Trees", "Support Vector Machines", "K-Means Clustering"),
+        option_bits(0),
+    ),
+    QuizQuestion(
+        "What is the primary purpose of a loss function in machine learning?",
+        (
+            "To measure the accuracy of the model",
+            "To optimize the model's parameters",
+            "To evaluate the difference between predicted and actual values",
+            "To visualize the data",
+        ),
+        option_bits(2),
+    ),
+    QuizQuestion(
+        "Which of the following is a valid activation function used in neural networks?",
+        ("ReLU (Rectified Linear Unit)", "Sigmoid", "Tanh", "All of the above"),
+        option_bits(3),
+    ),
+    QuizQuestion(
+        "What is the main goal of reinforcement learning?",
+        (
+            "To classify data into predefined categories",
+            "To learn a policy that maximizes cumulative rewards",
+            "To cluster data into groups",
+            "To reduce the dimensionality of data",
+        ),
+        option_bits(1),
+    ),
+    QuizQuestion(
+        "Which of the following is a common application of Natural Language Processing (NLP)?",
+        ("Sentiment Analysis", "Image Recognition", "Speech Recognition", "Both 1 and 3"),
+        option_bits(3),
+    ),
+    QuizQuestion(
+        "Which of the following are examples of supervised learning tasks?",
+        (
+            "Spam detection from labelled emails",
+            "Customer segmentation with k-means",
+            "House price prediction",
+            "Image classification",
+        ),
+        option_bits(0, 2, 3),
+        multi=True,
+    ),
+    QuizQuestion(
+        "Which techniques help reduce overfitting?",
+        ("Dropout", "Adding more training data", "Increasing model size without regularization", "Early stopping"),
+        option_bits(0, 1, 3),
+        multi=True,
+    ),
+)
+UNANSWERED = 0  # Empty bitset: the question has not been answered yet
+
+
+def answer_label(question: QuizQuestion, answer: int) -> str:
+    """Option text for an answer bitset, with several selections comma-separated."""
+    return ", ".join(option for bit, option in enumerate(question.options) if answer >> bit & 1)
+
+
+def question_credit(question: QuizQuestion, answer: int) -> float:
+    """Credit for one answer bitset.
+
+    Single choice is all or nothing. Multi-select earns a share per correct
+    option picked, minus one per wrong option picked, floored at zero.
+    """
+    if not question.multi:
+        return float(answer == question.key)
+    hits = bin(answer & question.key).count("1")
+    wrong = bin(answer & ~question.key).count("1")
+    return max(hits - wrong, 0) / bin(question.key).count("1")
+
+
+def quiz_score(answers) -> int:
+    """Percentage score for a list of answer bitsets."""
+    if not QUIZ_QUESTIONS:
+        return 0  # Avoid division by zero
+    credit = sum(question_credit(q, answer) for q, answer in zip(QUIZ_QUESTIONS, answers))
+    return int(credit / len(QUIZ_QUESTIONS) * 100)
+
+
+QUIZ_VERSION = hashlib.blake2b(repr(QUIZ_QUESTIONS).encode(), digest_size=8).hexdigest()  # Changes with the bank
+
+
+def quiz_permutation(token: str) -> list:
+    """A session's display order: the question order, then each question's option order.
+
+    Seeded from the session token and quiz version, so it is recomputed in O(n)
+    whenever it is needed and never stored in the session. Answers always use canonical indices.
+    """
+    rnd = random.Random(f"{token}:{QUIZ_VERSION}")
+    orders = [list(range(len(QUIZ_QUESTIONS)))] + [list(range(len(q.options))) for q in QUIZ_QUESTIONS]
+    for order in orders:
+        rnd.shuffle(order)
+    return orders
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "4096"))  # Correctness patterns (and result pages) kept server-side
+
+
+def correctness_mask(answers) -> int:
+    """Bit i is set when question i was answered exactly right."""
+    mask = 0
+    for index, (answer, question) in enumerate(zip(answers, QUIZ_QUESTIONS)):
+        if answer == question.key:
+            mask |= 1 << index
+    return mask
+
+
+def build_result_view(mask: int, total: int) -> tuple:
+    """The per-question marks for one correctness pattern."""
+    return tuple("✅" if mask >> index & 1 else "❌" for index in range(total))
+
+
+# There are 2**n correctness patterns, so only the most frequent ones stay cached
+cached_result_view = functools.lru_cache(maxsize=RESULT_CACHE_SIZE)(build_result_view)
+
+
 # Main app state
 class State(rx.State):
     """The app state."""
 
-    default_answers = [None, None, None, None, None]  # Initialize with None for 5 questions
-    answers: List[Any] = default_answers  # User's answers
-    answer_key = [
-        "Neurons",  # Correct answer for Question 1
-        "To evaluate the difference between predicted and actual values",  # Correct answer for Question 2
-        "All of the above",  # Correct answer for Question 3
-        "To learn a policy that maximizes cumulative rewards",  # Correct answer for Question 4
-        "Both 1 and 3",  # Correct answer for Question 5
-    ]
+    answers: List[int] = [UNANSWERED] * len(QUIZ_QUESTIONS)  # User's answers, as option bitsets
     score: int = 0  # User's score
 
     # Reset answers when the page loads
     def onload(self):
-        self.answers = copy.deepcopy(self.default_answers)
+        self.answers = [UNANSWERED] * len(QUIZ_QUESTIONS)
+
+    # Update user's answers; anything the page could not have sent is ignored
+    def set_answers(self, answer: str, index: int):
+        if type(index) is not int or not 0 <= index < len(QUIZ_QUESTIONS):
+            return
+        q = QUIZ_QUESTIONS[index]
+        if q.multi or answer not in q.options:
+            return
+        self.answers[index] = 1 << q.options.index(answer)
 
-    # Update user's answers
-    def set_answers(self, answer, index, sub_index=None):
-        if sub_index is None:
-            self.answers[index] = answer
+    # Tick or untick one option of a multi-select question; ignores invalid input too
+    def set_option(self, checked: bool, index: int, option: int):
+        if type(index) is not int or not 0 <= index < len(QUIZ_QUESTIONS):
+            return
+        q = QUIZ_QUESTIONS[index]
+        if not q.multi or type(option) is not int or not 0 <= option < len(q.options):
+            return
+        if checked:
+            self.answers[index] |= 1 << option
         else:
-            self.answers[index][sub_index] = answer
+            self.answers[index] &= ~(1 << option)
 
     # Calculate score and redirect to results page
     def submit(self):
-        total, correct = 0, 0
-        for i in range(len(self.answers)):
-            if self.answers[i] == self.answer_key[i]:
-                correct += 1
-            total += 1
-
-        # Avoid division by zero
-        if total == 0:
-            self.score = 0
-        else:
-            self.score = int(correct / total * 100)
+        if not valid_answers(self.answers):
+            return  # Only reachable through Reflex's generic setvar, never from the page
+        self.score = quiz_score(self.answers)
+        log_responses(
+            self.router.session.client_token,
+            [(index, answer == q.key) for index, (answer, q) in enumerate(zip(self.answers, QUIZ_QUESTIONS)) if answer],
+        )
 
-        return rx.redirect("//resources/educational-resources/result")
+        # The permalink carries the answers, so the page needs no session to render
+        return rx.redirect(result_permalink(self.answers, quiz_permutation(self.router.session.client_token)[0]))
 
-    # Return score as a percentage string
-    @rx.var
-    def percent_score(self) -> str:
-        return f"{self.score}%"
+    # This session's question and option order, derived from the session token. Not
+    # cached: a cached var's value is pickled with the session, while this is recomputed
+    # in O(n) and sent with each delta instead, so the stored State never grows
+    @rx.var(cache=False)
+    def presentation(self) -> List[List[int]]:
+        return quiz_permutation(self.router.session.client_token)
 
-    color_mode: str = "light"  # Default to light mode
 
-    # Update color mode
-    def set_color_mode(self, color_mode: Union[str, List[str]]):
-        if isinstance(color_mode, list):
-            self.color_mode = color_mode[0]  # Use the first value
-        else:
-            self.color_mode = color_mode
+def benchmark_shuffle(session_counts=(100, 1000, 10000)) -> dict:
+    """Per-session cost of the seeded shuffle and of scoring, as sessions grow.
+
+    The order is recomputed rather than stored, so both should stay flat, and
+    a session's stored State is the same size before and after its order has
+    been sent. What it costs instead is `delta_bytes` of JSON on every event.
+    """
+    rnd = random.Random(0)
+    results = {}
+    for count in session_counts:
+        tokens = [f"bench-{i}" for i in range(count)]
+        submissions = [
+            [rnd.randrange(1 << len(q.options)) if q.multi else 1 << rnd.randrange(len(q.options)) for q in QUIZ_QUESTIONS]
+            for _ in range(count)
+        ]
+        start = time.perf_counter()
+        for token in tokens:
+            quiz_permutation(token)
+        shuffle = time.perf_counter() - start
+        start = time.perf_counter()
+        for answers in submissions:
+            correctness_mask(answers)
+            quiz_score(answers)
+        scoring = time.perf_counter() - start
+        results[count] = {"shuffle_us": shuffle / count * 1e6, "score_us": scoring / count * 1e6}
+    state = State(_reflex_internal_init=True)
+    fresh = len(state._serialize())
+    state.dict()  # Hydration sends every var, presentation included
+    state.get_delta()  # And so does every event
+    state._clean()
+    delta_bytes = len(rx_format.json_dumps(state.presentation))
+    return {
+        "sessions": results,
+        "state_bytes": fresh,
+        "state_bytes_after_delta": len(state._serialize()),  # Only pickle memo noise on top of state_bytes
+        "delta_bytes": delta_bytes,
+    }
 
 
 def header():
@@ -350,356 +568,378 @@ def header():
             color="black",
             style={"font-size": "16px", "@media (max-width: 768px)": {"font-size": "14px"}}
         ),
+        *(
+            [rx.link("Prefer fewer questions? Try the adaptive quiz.", href="/resources/user-experiences/adaptive")]
+            if IRT_AVAILABLE
+            else []
+        ),
         style=question_style,
     )
 
 
 
 
-def question1():
+def question(index: int, position) -> rx.Component:
+    """Question `index` of the bank, shown at display `position` with its options in session order."""
+    number = index + 1
+    q = QUIZ_QUESTIONS[index]
+    options = State.presentation[index + 1]  # Canonical option indices in display order
+    # This question's slices of the constant tables, so each is compiled into the page once
+    option_labels = rx.Var.create(q.options)
+    answer_labels = rx.Var.create(tuple(answer_label(q, answer) for answer in range(1 << len(q.options))))
     return rx.vstack(
         rx.heading(
-            "Question #1",
+            f"Question #{position + 1}",
             color="black",
             style={"font-size": "20px", "@media (max-width: 768px)": {"font-size": "18px"}},
-            id="question1-heading"
+            id=f"question{number}-heading"
         ),
         rx.text(
-            "Which of the following is a key component of a neural network?",
+            q.prompt,
             color="black",
             as_="label",
-            html_for="question1-radio-group",
-            id="question1-label",
+            html_for=f"question{number}-radio-group",
+            id=f"question{number}-label",
             style={"font-size": "16px", "@media (max-width: 768px)": {"font-size": "14px"}},
         ),
         rx.divider(**{"aria-hidden": "true"}),
         rx.box(
             rx.text(
-                "Select the correct answer:",
+                "Select all correct answers:" if q.multi else "Select the correct answer:",
                 color="black",
-                id="question1-desc",
+                id=f"question{number}-desc",
                 style={"font-size": "16px", "@media (max-width: 768px)": {"font-size": "14px"}},
             ),
-            rx.radio_group(
-                items=["Neurons", "Decision Trees", "Support Vector Machines", "K-Means Clustering"],
-                default_value=State.answers[0],
-                on_change=lambda answer: State.set_answers(answer, 0),
+            rx.vstack(
+                rx.foreach(
+                    options,
+                    lambda option: rx.checkbox(
+                        option_labels[option],
+                        # Uncontrolled, so ticking works even while offline
+                        default_checked=State.answers[index] // (2 ** option) % 2 == 1,  # Bit `option` of the answer
+                        on_change=lambda checked: State.set_option(checked, index, option),
+                        color="black",
+                        custom_attrs={"data-option": option},  # Read by the offline submit script
+                    ),
+                ),
+                role="group",
+                id=f"question{number}-radio-group",
+                **{
+                    "aria-labelledby": f"question{number}-label question{number}-desc",
+                },
+            )
+            if q.multi
+            else rx.radio_group.root(
+                rx.flex(
+                    rx.foreach(
+                        options,
+                        lambda option: rx.text(
+                            rx.flex(
+                                rx.radio_group.item(value=option_labels[option], custom_attrs={"data-option": option}),
+                                option_labels[option],
+                                spacing="2",
+                            ),
+                            as_="label",
+                        ),
+                    ),
+                    direction="row",
+                    spacing="2",
+                ),
+                default_value=answer_labels[State.answers[index]],  # Empty when unanswered
+                on_change=lambda answer: State.set_answers(answer, index),
                 color="black",
-                id="question1-radio-group",
+                id=f"question{number}-radio-group",
                 **{
-                    "aria-labelledby": "question1-label question1-desc",
+                    "aria-labelledby": f"question{number}-label question{number}-desc",
                 },
             ),
         ),
+        custom_attrs={"data-question": str(index)},  # Read by the offline submit script
     )
 
 
+# ---------------------------------------------------------------------------
+# Adaptive quiz (2PL item response theory)
+# ---------------------------------------------------------------------------
 
-def question2():
-    return rx.vstack(
-        rx.heading(
-            "Question #2",
-            color="black",
-            style={"font-size": "20px", "@media (max-width: 768px)": {"font-size": "18px"}},
-            id="question2-heading"
-        ),
-        rx.text(
-            "What is the primary purpose of a loss function in machine learning?",
-            color="black",
-            as_="label",  
-            html_for="question2-radio-group",  # Added association with radio group
-            id="question2-label",
-            style={"font-size": "16px", "@media (max-width: 768px)": {"font-size": "14px"}},
-        ),
-        rx.divider(**{"aria-hidden": "true"}),
-        rx.box(
-            rx.text(
-                "Select the correct answer:",
-                color="black",
-                id="question2-desc",
-                style={"font-size": "16px", "@media (max-width: 768px)": {"font-size": "14px"}},
-            ),
-            rx.radio_group(
-                items=[
-                    "To measure the accuracy of the model",
-                    "To optimize the model's parameters", 
-                    "To evaluate the difference between predicted and actual values",
-                    "To visualize the data",
-                ],
-                default_value=State.answers[1],
-                on_change=lambda answer: State.set_answers(answer, 1),
-                color="black",
-                id="question2-radio-group",  # Added ID to match html_for
-                **{
-                    "aria-labelledby": "question2-label question2-desc",  # Combined both references
-                },
-            ),
-        ),
-    )
+IRT_PARAMS = os.getenv("IRT_PARAMS", "")  # JSON from `calibrate-irt`; items start at a=1, b=0 without it
+IRT_RESPONSE_LOG = os.getenv("IRT_RESPONSE_LOG", "")  # JSON lines of graded responses, for calibration
+IRT_LOG_FLUSH_SECONDS = float(os.getenv("IRT_LOG_FLUSH_SECONDS", "5"))  # How often buffered responses are appended
+IRT_TARGET_SE = float(os.getenv("IRT_TARGET_SE", "0.5"))  # Stop once the ability estimate is this precise
+IRT_MAX_ITEMS = int(os.getenv("IRT_MAX_ITEMS", "20"))  # ...or after this many questions
+IRT_GRID = (-4.0, 4.0, 81)  # Ability quadrature points (start, stop, count)
+IRT_AVAILABLE = importlib.util.find_spec("numpy") is not None  # NumPy is optional; only this mode needs it
 
 
+class ItemBank:
+    """2PL item parameters as NumPy arrays, with vectorized scoring and selection.
 
-def question3():
-    return rx.vstack(
-        rx.heading(
-            "Question #3",
-            color="black",
-            style={"font-size": "20px", "@media (max-width: 768px)": {"font-size": "18px"}},
-            id="question3-heading"
-        ),
-        rx.text(
-            "Which of the following is a valid activation function used in neural networks?",
-            color="black",
-            as_="label",
-            html_for="question3-radio-group",
-            id="question3-label",
-            style={"font-size": "16px", "@media (max-width: 768px)": {"font-size": "14px"}},
-        ),
-        rx.divider(**{"aria-hidden": "true"}),
-        rx.box(
-            rx.text(
-                "Select the correct answer:",
-                color="black",
-                id="question3-desc",
-                style={"font-size": "16px", "@media (max-width: 768px)": {"font-size": "14px"}}
-            ),
-            rx.radio_group(
-                items=["ReLU (Rectified Linear Unit)", "Sigmoid", "Tanh", "All of the above"],
-                default_value=State.answers[2],
-                on_change=lambda answer: State.set_answers(answer, 2),
-                color="black",
-                id="question3-radio-group",
-                **{
-                    "aria-labelledby": "question3-label question3-desc",
-                },
-            ),
-        ),
-    )
+    P(correct | theta) = 1 / (1 + exp(-a * (theta - b))) for an item with
+    discrimination a and difficulty b.
+    """
 
-def question4():
-    return rx.vstack(
-        rx.heading(
-            "Question #4",
-            color="black",
-            style={"font-size": "20px", "@media (max-width: 768px)": {"font-size": "18px"}},
-            id="question4-heading"
-        ),
-        rx.text(
-            "What is the main goal of reinforcement learning?",
-            color="black",
-            as_="label",
-            html_for="question4-radio-group",
-            id="question4-label",
-            style={"font-size": "16px", "@media (max-width: 768px)": {"font-size": "14px"}},
-        ),
-        rx.divider(**{"aria-hidden": "true"}),
-        rx.box(
-            rx.text(
-                "Select the correct answer:",
-                color="black",
-                id="question4-desc",
-                style={"font-size": "16px", "@media (max-width: 768px)": {"font-size": "14px"}}
-            ),
-            rx.radio_group(
-                items=[
-                    "To classify data into predefined categories",
-                    "To learn a policy that maximizes cumulative rewards",
-                    "To cluster data into groups",
-                    "To reduce the dimensionality of data",
-                ],
-                default_value=State.answers[3],
-                on_change=lambda answer: State.set_answers(answer, 3),
-                color="black",
-                id="question4-radio-group",
-                **{
-                    "aria-labelledby": "question4-label question4-desc",
-                },
-            ),
-        ),
-    )
+    def __init__(self, a, b):
+        import numpy as np  # Optional; imported on first use
 
-def question5():
-    return rx.vstack(
-        rx.heading(
-            "Question #5",
-            color="black",
-            style={"font-size": "20px", "@media (max-width: 768px)": {"font-size": "18px"}},
-            id="question5-heading"
-        ),
-        rx.text(
-            "Which of the following is a common application of Natural Language Processing (NLP)?",
-            color="black",
-            as_="label",
-            html_for="question5-radio-group",
-            id="question5-label",
-            style={"font-size": "16px", "@media (max-width: 768px)": {"font-size": "14px"}},
-        ),
-        rx.divider(**{"aria-hidden": "true"}),
-        rx.box(
-            rx.text(
-                "Select the correct answer:",
-                color="black",
-                id="question5-desc",
-                style={"font-size": "16px", "@media (max-width: 768px)": {"font-size": "14px"}}
-            ),
-            rx.radio_group(
-                items=["Sentiment Analysis", "Image Recognition", "Speech Recognition", "Both 1 and 3"],
-                default_value=State.answers[4],
-                on_change=lambda answer: State.set_answers(answer, 4),
-                color="black",
-                id="question5-radio-group",
-                **{
-                    "aria-labelledby": "question5-label question5-desc",
-                },
-            ),
-        ),
-    )
+        self.np = np
+        self.a = np.asarray(a, dtype=np.float64)
+        self.b = np.asarray(b, dtype=np.float64)
+        self.grid = np.linspace(*IRT_GRID)
+        self.log_prior = -0.5 * self.grid**2  # Standard normal ability prior
 
+    def __len__(self):
+        return len(self.a)
 
-    
-def render_answer(State, index):
-    return rx.table.row(
-        rx.table.cell(index + 1),
-        rx.table.cell(
-            rx.cond(
-                State.answers[index].to_string() == State.answer_key[index].to_string(),
-                rx.icon(tag="check", color="green"),
-                rx.icon(tag="x", color="red"),
-            )
-        ),
-        rx.table.cell(State.answers[index].to_string()),
-        rx.table.cell(State.answer_key[index].to_string()),
-    )
+    def estimate(self, items, responses: int) -> tuple:
+        """EAP ability estimate and its standard error.
 
+        `responses` has bit k set when items[k] was answered correctly.
+        """
+        np = self.np
+        items = np.asarray(items, dtype=np.intp)
+        correct = np.array([responses >> k & 1 for k in range(len(items))], dtype=bool)
+        logits = self.a[items, None] * (self.grid - self.b[items, None])
+        # log P = -log(1 + e^-x) for a right answer, log(1 - P) = -log(1 + e^x) for a wrong one
+        log_posterior = self.log_prior - np.logaddexp(0, np.where(correct[:, None], -logits, logits)).sum(axis=0)
+        weights = np.exp(log_posterior - log_posterior.max())
+        weights /= weights.sum()
+        theta = float(weights @ self.grid)
+        return theta, float(np.sqrt(weights @ (self.grid - theta) ** 2))
 
-# Results component
-def results():
-    """The results view."""
-    button_style = {
-        "position": "relative",
-        "display": "block",  # Full-width button
-        "width": "100%",
-        "text_align": "center",
-        "font_size": "16px",
-        "letter_spacing": "1px",
-        "text_decoration": "none",
-        "color": "#333333",
-        "background": "#ffffff",
-        "border": "3px solid #333333",
-        "cursor": "pointer",
-        "transition": "ease-out 0.5s",
-        "border_radius": "0",
-        "&:after": {
-            "position": "absolute",
-            "content": '""',
-            "width": "0",
-            "height": "0",
-            "transition": "0.5s",
-            "top": "-3px",
-            "left": "-3px",
-            "border_top": "3px solid transparent",
-            "border_left": "3px solid transparent",
-        },
-        "&:before": {
-            "position": "absolute",
-            "content": '""',
-            "width": "0",
-            "height": "0",
-            "transition": "0.5s",
-            "bottom": "-3px",
-            "right": "-3px",
-            "border_bottom": "3px solid transparent",
-            "border_right": "3px solid transparent",
-        },
-        "&:hover": {
-            "color": "#333333",
-            "text-decoration": "none",
-        },
-        "&:hover:after": {
-            "width": "calc(50% + 3px)",
-            "height": "calc(50% + 3px)",
-            "border_color": "#00bfff",  # Blue border on hover
-        },
-        "&:hover:before": {
-            "width": "calc(50% + 3px)",
-            "height": "calc(50% + 3px)",
-            "border_color": "#00bfff",  # Blue border on hover
-        },
-    }
-    
-    def centered_item(item):
-        return rx.center(item, width="100%")
-
-    def render_answer(answer, index):
-        """Render a row in the results table."""
-        return rx.table.row(
-            rx.table.cell(index + 1),  # Question number
-            rx.table.cell(
-                rx.cond(
-                    answer == State.answer_key[index],  # Condition
-                    "✅",  # True case
-                    "❌",  # False case
-                )
-            ),  # Result
-            rx.table.cell(answer),  # User's answer
-            rx.table.cell(State.answer_key[index]),  # Correct answer
-        )
+    def select(self, theta: float, administered) -> int:
+        """The item not yet administered with the most Fisher information at `theta`."""
+        np = self.np
+        p = 1 / (1 + np.exp(-self.a * (theta - self.b)))
+        information = self.a**2 * p * (1 - p)
+        information[list(administered)] = -1.0
+        return int(information.argmax())
 
-    return rx.center(
-        rx.vstack(
-            rx.heading("Results", color="black"),
-            rx.text("Below are the results of the quiz.", color="black"),
-            rx.divider(),
-            rx.text(f"Your score: {State.percent_score}", color="black"),  # Display score as text
-            rx.table.root(
-                rx.table.header(
-                    rx.table.row(
-                        rx.table.column_header_cell("#", color="black"),
-                        rx.table.column_header_cell("Result", color="black"),
-                        rx.table.column_header_cell("Your Answer", color="black"),
-                        rx.table.column_header_cell("Correct Answer", color="black"),
-                    ),
-                ),
-                rx.table.body(
-                    rx.foreach(State.answers, lambda answer, index: render_answer(answer, index)),  # Render each answer
-                ),
-            ),
-            centered_item(
-                rx.hstack(
-                    rx.link(
-                        rx.button("Back to Home", style=button_style),  # Apply button_style
-                        href="/",  # Link to the home page
-                    ),
-                    rx.link(
-                        rx.button("Want to try a different quiz?", style=button_style),  # Apply button_style
-                        href="https://www.proprofs.com/quiz-school/story.php?title=3dq-do-you-know-artificial-intelligence-ai",
-                        target="_blank",  # Opens the link in a new tab
-                    ),
-                    spacing="2",  # Adds spacing between the buttons
-                ),
-            ),
-            style=base_style,
-        ),
-        bg=page_background,
-        min_height="100vh",
-    )
-    
 
-def layout(content: rx.Component, breadcrumb_items: list[tuple[str, str]]) -> rx.Component:
-    current_path = os.getenv("PAGE_PATH", "/")
-    return rx.vstack(
-        rx.html('<script src="https://code.jquery.com/jquery-3.6.0.min.js"></script>'),
-        rx.html('<script src="https://kit.fontawesome.com/b89a958fe1.js" crossorigin="anonymous"></script>'),
+@functools.lru_cache(maxsize=1)
+def quiz_item_bank() -> ItemBank:
+    """The quiz's item bank, calibrated when IRT_PARAMS was fitted to this quiz version."""
+    a, b = [1.0] * len(QUIZ_QUESTIONS), [0.0] * len(QUIZ_QUESTIONS)
+    if IRT_PARAMS and os.path.exists(IRT_PARAMS):
+        with open(IRT_PARAMS) as f:
+            params = json.load(f)
+        if params.get("version") == QUIZ_VERSION:
+            a, b = params["a"], params["b"]
+    return ItemBank(a, b)
 
-        rx.script('''
-            function initBackToTopButton() {
-                var btn = $('#button');
 
-                $(window).scroll(function() {
-                    if ($(window).scrollTop() > 300) {
-                        btn.addClass('show');
-                    } else {
-                        btn.removeClass('show');
+_response_log_buffer: list = []  # Lines waiting for the next flush to IRT_RESPONSE_LOG
+
+
+def log_responses(token: str, graded) -> None:
+    """Queue (item, correct) pairs for IRT_RESPONSE_LOG, when set, for offline calibration.
+
+    Handlers run on the event loop, so lines are only buffered here and
+    response_log_lifespan writes them from a thread.
+    """
+    if not IRT_RESPONSE_LOG:
+        return
+    person = hashlib.blake2b(token.encode(), digest_size=6).hexdigest()  # Never keep raw tokens
+    _response_log_buffer.extend(
+        json.dumps({"version": QUIZ_VERSION, "person": person, "item": item, "correct": int(correct)}) + "\n"
+        for item, correct in graded
+    )
+
+
+def take_response_log() -> list:
+    lines = _response_log_buffer[:]
+    del _response_log_buffer[: len(lines)]
+    return lines
+
+
+def restore_response_log(lines) -> None:
+    _response_log_buffer[:0] = lines
+
+
+def flush_response_log(lines) -> None:
+    """Append `lines` with one write on an O_APPEND descriptor, so workers sharing the log never interleave."""
+    data = "".join(lines).encode()
+    fd = os.open(IRT_RESPONSE_LOG, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        while data:  # A regular file takes it all at once; the loop only guards a short write
+            data = data[os.write(fd, data) :]
+    finally:
+        os.close(fd)
+
+
+@contextlib.asynccontextmanager
+async def response_log_lifespan():
+    async with periodic_flush(
+        "response_log", IRT_LOG_FLUSH_SECONDS, take_response_log, flush_response_log, restore_response_log
+    ):
+        yield
+
+
+def calibrate_items(responses, n_items: int, iterations: int = 30, batch: int = 100_000) -> tuple:
+    """Fit 2PL (a, b) arrays to (person, item, correct) triples by marginal maximum likelihood.
+
+    EM over the ability grid: the E-step weighs each person's ability across
+    the grid, the M-step takes one Newton step for every item at once on the
+    expected attempts and right answers at each grid point. Responses are
+    processed in batches so memory stays bounded for large logs. Weak priors
+    (a ~ N(1, 1), intercept ~ N(0, 4)) keep rarely seen items near the defaults.
+    """
+    import numpy as np  # Optional; imported on first use
+
+    def scatter_add(out, index, values):
+        # out[index[i]] += values[i], one bincount per grid column (much faster than np.add.at)
+        for k in range(values.shape[1]):
+            out[:, k] += np.bincount(index, weights=values[:, k], minlength=len(out))
+
+    people: dict = {}
+    person = np.array([people.setdefault(p, len(people)) for p, _, _ in responses], dtype=np.intp)
+    item = np.array([i for _, i, _ in responses], dtype=np.intp)
+    correct = np.array([c for _, _, c in responses], dtype=bool)
+    grid = np.linspace(*IRT_GRID)
+    a, c = np.ones(n_items), np.zeros(n_items)  # logit = a * theta + c, so b = -c / a
+
+    for _ in range(iterations):
+        logits = a[:, None] * grid + c[:, None]
+        log_p, log_q = -np.logaddexp(0, -logits), -np.logaddexp(0, logits)
+        log_posterior = np.tile(-0.5 * grid**2, (len(people), 1))
+        for lo in range(0, len(item), batch):
+            rows = slice(lo, lo + batch)
+            scatter_add(log_posterior, person[rows], np.where(correct[rows, None], log_p[item[rows]], log_q[item[rows]]))
+        posterior = np.exp(log_posterior - log_posterior.max(axis=1, keepdims=True))
+        posterior /= posterior.sum(axis=1, keepdims=True)
+
+        attempts, rights = np.zeros((n_items, len(grid))), np.zeros((n_items, len(grid)))
+        for lo in range(0, len(item), batch):
+            rows = slice(lo, lo + batch)
+            weights = posterior[person[rows]]
+            scatter_add(attempts, item[rows], weights)
+            scatter_add(rights, item[rows], weights * correct[rows, None])
+
+        p = np.exp(log_p)
+        residual, weight = rights - attempts * p, attempts * p * (1 - p)
+        grad_a = (residual * grid).sum(axis=1) - (a - 1)
+        grad_c = residual.sum(axis=1) - c / 4
+        h_aa, h_ac, h_cc = (weight * grid**2).sum(axis=1) + 1, (weight * grid).sum(axis=1), weight.sum(axis=1) + 0.25
+        det = h_aa * h_cc - h_ac**2
+        a = np.clip(a + (h_cc * grad_a - h_ac * grad_c) / det, 0.2, 4.0)
+        c = c + (h_aa * grad_c - h_ac * grad_a) / det
+
+    return a, np.clip(-c / a, *IRT_GRID[:2])
+
+
+def calibrate_from_log(log_path: str, out_path: str, iterations: int = 30) -> int:
+    """Calibrate the quiz's items from a response log and write IRT_PARAMS JSON; returns responses used."""
+    with open(log_path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    responses = [(r["person"], r["item"], r["correct"]) for r in rows if r.get("version") == QUIZ_VERSION]
+    a, b = calibrate_items(responses, len(QUIZ_QUESTIONS), iterations)
+    with open(out_path, "w") as f:
+        json.dump({"version": QUIZ_VERSION, "a": a.round(4).tolist(), "b": b.round(4).tolist()}, f)
+    return len(responses)
+
+
+class AdaptiveState(State):
+    """Adaptive quiz: one question at a time, each chosen to be most informative."""
+
+    items: List[int] = []  # Questions asked so far, in order
+    responses: int = 0  # Bit k set when items[k] was answered right
+    current: int = 0  # Question being shown
+    ability: float = 0.0  # Ability estimate, rounded for display
+    ability_se: float = 0.0  # Its standard error, rounded for display
+    percentile: int = 50  # Share of takers the estimate is above, under the N(0, 1) prior
+    done: bool = False
+
+    def start(self):
+        self.answers = [UNANSWERED] * len(QUIZ_QUESTIONS)
+        self.items, self.responses, self.done = [], 0, False
+        bank = quiz_item_bank()
+        theta, se = bank.estimate([], 0)
+        self.ability, self.ability_se = round(theta, 2), round(se, 2)
+        self.current = bank.select(theta, [])
+
+    # Grade the shown question, update the estimate and pick the next one or stop
+    def next_question(self):
+        correct = self.answers[self.current] == QUIZ_QUESTIONS[self.current].key
+        self.responses |= int(correct) << len(self.items)
+        self.items.append(self.current)
+        log_responses(self.router.session.client_token, [(self.current, correct)])
+
+        bank = quiz_item_bank()
+        theta, se = bank.estimate(self.items, self.responses)
+        self.ability, self.ability_se = round(theta, 2), round(se, 2)
+        if se <= IRT_TARGET_SE or len(self.items) >= min(IRT_MAX_ITEMS, len(bank)):
+            self.percentile = int(statistics.NormalDist().cdf(theta) * 100)
+            self.done = True
+        else:
+            self.current = bank.select(theta, self.items)
+
+
+def benchmark_adaptive(bank_sizes=(100, 1000, 10000), takers: int = 200, max_items: int = 60) -> dict:
+    """Selection/estimation cost per step and test length, adaptive vs. fixed order.
+
+    Uses synthetic banks (a ~ U(0.5, 2), b ~ N(0, 1)) and simulated takers with
+    abilities drawn from N(0, 1); both tests stop at IRT_TARGET_SE.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    results = {}
+    for size in bank_sizes:
+        bank = ItemBank(rng.uniform(0.5, 2.0, size), rng.normal(0.0, 1.0, size))
+        administered = list(rng.choice(size, 20, replace=False))
+        rounds = 1000
+        start = time.perf_counter()
+        for _ in range(rounds):
+            bank.select(0.3, administered)
+        select_us = (time.perf_counter() - start) / rounds * 1e6
+        start = time.perf_counter()
+        for _ in range(rounds):
+            bank.estimate(administered, 0b1011011101)
+        estimate_us = (time.perf_counter() - start) / rounds * 1e6
+
+        lengths = {"adaptive": [], "fixed": []}
+        errors = {"adaptive": [], "fixed": []}
+        for true_theta in rng.normal(0.0, 1.0, takers):
+            p_right = 1 / (1 + np.exp(-bank.a * (true_theta - bank.b)))
+            answers_right = rng.random(size) < p_right  # Each taker's answer to every item
+            fixed_order = rng.permutation(size)
+            for mode in lengths:
+                items, responses, theta = [], 0, 0.0
+                while len(items) < min(max_items, size):
+                    item = bank.select(theta, items) if mode == "adaptive" else int(fixed_order[len(items)])
+                    responses |= int(answers_right[item]) << len(items)
+                    items.append(item)
+                    theta, se = bank.estimate(items, responses)
+                    if se <= IRT_TARGET_SE:
+                        break
+                lengths[mode].append(len(items))
+                errors[mode].append((theta - true_theta) ** 2)
+        results[size] = {
+            "select_us": select_us,
+            "estimate_us": estimate_us,
+            **{f"{mode}_items": float(np.mean(lengths[mode])) for mode in lengths},
+            **{f"{mode}_rmse": float(np.sqrt(np.mean(errors[mode]))) for mode in errors},
+        }
+    return results
+
+
+def layout(content: rx.Component, breadcrumb_items: list[tuple[str, str]], route: str = "") -> rx.Component:
+    return rx.vstack(
+        rx.html('<script src="https://code.jquery.com/jquery-3.6.0.min.js"></script>'),
+        rx.html('<script src="https://kit.fontawesome.com/b89a958fe1.js" crossorigin="anonymous"></script>'),
+        rx.script(SERVICE_WORKER_CLIENT_SCRIPT),  # Offline support; see build_service_worker()
+        rx.script(ANALYTICS_CLIENT_SCRIPT),  # Batched page-view beacons; see Analytics
+        rx.script(VITALS_CLIENT_SCRIPT),  # Web Vitals samples per route; see Vitals
+        rx.html(ICON_SPRITE) if ICON_SPRITE else rx.fragment(),  # Symbols for icon(); see build_icon_sprite()
+
+        rx.script('''
+            function initBackToTopButton() {
+                var btn = $('#button');
+
+                $(window).scroll(function() {
+                    if ($(window).scrollTop() > 300) {
+                        btn.addClass('show');
+                    } else {
+                        btn.removeClass('show');
                     }
                 });
 
@@ -718,37 +958,14 @@ def layout(content: rx.Component, breadcrumb_items: list[tuple[str, str]]) -> rx
             });
         '''),
 
-        rx.html('''
-            <style>
-                .hover-link::after {
-                    content: '';
-                    display: block;
-                    width: 0;
-                    height: 2px;
-                    background: #ff7f50;
-                    transition: width .3s;
-                }
-
-                .hover-link:hover::after {
-                    width: 100%;
-                    transition: width .3s;
-                }
-
-                #button {
-                    transition: opacity 0.3s ease;
-                }
-                #button.show {
-                    opacity: 1 !important;
-                }
-            </style>
-        '''),
+        # Hover, back-to-top and banner rules live in assets/styles.css (loaded through app stylesheets)
 
         # Header section
         rx.box(
             rx.desktop_only(
                 rx.hstack(
                     rx.hstack(
-                        rx.heading("WebEducateAI", size="7", color="#F3F4F6", font_family="Montserrat", as_="h1"),
+                        rx.heading("WebEducateAI", size="7", color="#F3F4F6", font_family=font_stack("Montserrat"), as_="h1"),
                         align_items="center",
                     ),
                     rx.hstack(
@@ -756,16 +973,16 @@ def layout(content: rx.Component, breadcrumb_items: list[tuple[str, str]]) -> rx
                         rx.menu.root(
                             rx.menu.trigger(
                                 rx.button(
-                                    rx.text("Resources", size="4", weight="medium", color="white", font_family="Poppins"),
-                                    rx.icon("chevron-down", color="white"),
+                                    rx.text("Resources", size="4", weight="medium", color="white", font_family=font_stack("Poppins")),
+                                    icon("chevron-down", color="white"),
                                     weight="medium", variant="ghost", size="3",
                                     aria_label="Resources menu"
                                 ),
                             ),
                             rx.menu.content(
-                                rx.menu.item(rx.link("User Experiences", href="/resources/user-experiences", color="white", font_family="Poppins", class_name="hover-link")),
-                                rx.menu.item(rx.link("Educational Resources", href="/resources/educational-resources", color="white", font_family="Poppins", class_name="hover-link")),
-                                rx.menu.item(rx.link("AI Academia", href="/resources/ai-academics", color="white", font_family="Poppins", class_name="hover-link")),
+                                rx.menu.item(rx.link("User Experiences", href="/resources/user-experiences", color="white", font_family=font_stack("Poppins"), class_name="hover-link")),
+                                rx.menu.item(rx.link("Educational Resources", href="/resources/educational-resources", color="white", font_family=font_stack("Poppins"), class_name="hover-link")),
+                                rx.menu.item(rx.link("AI Academia", href="/resources/ai-academics", color="white", font_family=font_stack("Poppins"), class_name="hover-link")),
                                 bg="#00bfff",  
                                 border_radius="md", box_shadow="md",
                             ),
@@ -782,20 +999,20 @@ def layout(content: rx.Component, breadcrumb_items: list[tuple[str, str]]) -> rx
             rx.mobile_and_tablet(
                 rx.hstack(
                     rx.hstack(
-                        rx.heading("WebEducateAI", size="7", color="white", font_family="Montserrat", as_="h1"),
+                        rx.heading("WebEducateAI", size="7", color="white", font_family=font_stack("Montserrat"), as_="h1"),
                         align_items="center",
                     ),
                     rx.menu.root(
                         rx.menu.trigger(
-                            rx.icon("menu", size=30, color="white"),
+                            icon("menu", size=30, color="white"),
                         ),
                         rx.menu.content(
-                            rx.menu.item(rx.link("Home", href="/", color="white", font_family="Poppins", class_name="hover-link")),
-                            rx.menu.item(rx.link("User Experiences", href="/resources/user-experiences", color="white", font_family="Poppins", class_name="hover-link")),
-                            rx.menu.item(rx.link("Educational Resources", href="/resources/educational-resources", color="white", font_family="Poppins", class_name="hover-link")),
-                            rx.menu.item(rx.link("AI Academia", href="/resources/ai-academics", color="white", font_family="Poppins", class_name="hover-link")),
-                            rx.menu.item(rx.link("Contact Us", href="/contact-us", color="white", font_family="Poppins", class_name="hover-link")),
-                            rx.menu.item(rx.link("About Us", href="/about-us", color="white", font_family="Poppins", class_name="hover-link")),
+                            rx.menu.item(rx.link("Home", href="/", color="white", font_family=font_stack("Poppins"), class_name="hover-link")),
+                            rx.menu.item(rx.link("User Experiences", href="/resources/user-experiences", color="white", font_family=font_stack("Poppins"), class_name="hover-link")),
+                            rx.menu.item(rx.link("Educational Resources", href="/resources/educational-resources", color="white", font_family=font_stack("Poppins"), class_name="hover-link")),
+                            rx.menu.item(rx.link("AI Academia", href="/resources/ai-academics", color="white", font_family=font_stack("Poppins"), class_name="hover-link")),
+                            rx.menu.item(rx.link("Contact Us", href="/contact-us", color="white", font_family=font_stack("Poppins"), class_name="hover-link")),
+                            rx.menu.item(rx.link("About Us", href="/about-us", color="white", font_family=font_stack("Poppins"), class_name="hover-link")),
                             rx.menu.item(dark_mode_toggle()),
                             bg="#00bfff", border_radius="md", box_shadow="md",
                         ),
@@ -810,7 +1027,7 @@ def layout(content: rx.Component, breadcrumb_items: list[tuple[str, str]]) -> rx
         ),
 
         breadcrumb_trail(breadcrumb_items),
-        rx.cond(current_path == "/", TopBannerBasic.create(), None),
+        top_banner() if route in BANNER_ROUTES else rx.fragment(),
 
         # Main section
         rx.box(
@@ -820,16 +1037,16 @@ def layout(content: rx.Component, breadcrumb_items: list[tuple[str, str]]) -> rx
             ),
             as_="main", role="main",
             flex="1", width="100%", padding="2em",
-            color=rx.cond(State.color_mode == "dark", "white", "black"),
-            font_family="Poppins",
-            background_color=rx.cond(State.color_mode == "dark", "#333333", "#F3F4F6"),
+            color=rx.color_mode_cond("black", "white"),
+            font_family=font_stack("Poppins"),
+            background_color=rx.color_mode_cond("#F3F4F6", "#333333"),
             display="flex", align_content="center",
             flex_direction="column", flex_wrap="wrap",
         ),
 
         # Back-to-top button with accessibility
         rx.box(
-            rx.icon(tag="arrow-up", color="white", size=24),
+            icon(tag="arrow-up", color="white", size=24),
             id="button",
             position="fixed", bottom="20px", right="20px",
             bg="#00bfff", padding="10px", border_radius="50%",
@@ -839,7 +1056,7 @@ def layout(content: rx.Component, breadcrumb_items: list[tuple[str, str]]) -> rx
             role="button", aria_label="Back to top",
         ),
 
-        background_color=rx.cond(State.color_mode == "dark", "#333333", "#F3F4F6"),
+        background_color=rx.color_mode_cond("#F3F4F6", "#333333"),
     )
 
 def navbar_link(text: str, href: str, class_name: str = "") -> rx.Component:
@@ -847,7 +1064,7 @@ def navbar_link(text: str, href: str, class_name: str = "") -> rx.Component:
         text,
         href=href,
         color="white",
-        font_family="Poppins",
+        font_family=font_stack("Poppins"),
         class_name=class_name,
         _hover={"text_decoration": "none"},
         role="link",
@@ -952,7 +1169,7 @@ def home() -> rx.Component:
                     # Card 1 - Introduction to AI
                     rx.card(
                         rx.vstack(
-                            rx.icon(tag=icons[0], size=50, color="black", aria_label="Artificial Intelligence icon"),
+                            icon(tag=icons[0], size=50, color="black", aria_label="Artificial Intelligence icon"),
                             rx.heading("Introduction To AI", size="4", margin_top="0.5rem", color="#333333"),
                             rx.text(
                                 "Explore what Artificial Intelligence is, its history, and its real-world applications.",
@@ -979,7 +1196,7 @@ def home() -> rx.Component:
                                             text_align="center",
                                             padding="1rem",
                                             margin="0",
-                                            font_family="Montserrat",
+                                            font_family=font_stack("Montserrat"),
                                             aria_level="2"
                                         ),
                                         background_color="#4b0082",
@@ -1006,7 +1223,7 @@ def home() -> rx.Component:
                                                 rx.table.cell(
                                                     rx.button(
                                                         "Download",
-                                                        on_click=rx.download(url="/ai_history.pdf"),
+                                                        on_click=download_asset("/ai_history.pdf"),
                                                         background_color="transparent",
                                                         color="darkgreen",
                                                         text_decoration="underline",
@@ -1028,7 +1245,7 @@ def home() -> rx.Component:
                                                 rx.table.cell(
                                                     rx.button(
                                                         "Download",
-                                                        on_click=rx.download(url="/ai_ethics.pdf"),
+                                                        on_click=download_asset("/ai_ethics.pdf"),
                                                         background_color="transparent",
                                                         color="darkgreen",
                                                         text_decoration="underline",
@@ -1050,7 +1267,7 @@ def home() -> rx.Component:
                                                 rx.table.cell(
                                                     rx.button(
                                                         "Download",
-                                                        on_click=rx.download(url="/ai_research.pdf"),
+                                                        on_click=download_asset("/ai_research.pdf"),
                                                         background_color="transparent",
                                                         color="darkgreen",
                                                         text_decoration="underline",
@@ -1096,7 +1313,7 @@ def home() -> rx.Component:
                     # Card 2 - Machine Learning Basics
                     rx.card(
                         rx.vstack(
-                            rx.icon(tag=icons[1], size=50, color="black", aria_label="Machine Learning icon"),
+                            icon(tag=icons[1], size=50, color="black", aria_label="Machine Learning icon"),
                             rx.heading("Machine Learning Basics", size="4", margin_top="0.5rem", color="#333333"),
                             rx.text(
                                 "Learn the fundamentals of Machine Learning, including key concepts like supervised and unsupervised learning.",
@@ -1123,7 +1340,7 @@ def home() -> rx.Component:
                                             text_align="center",
                                             padding="1rem",
                                             margin="0",
-                                            font_family="Montserrat",
+                                            font_family=font_stack("Montserrat"),
                                             aria_level="2"
                                         ),
                                         background_color="#4b0082",
@@ -1150,7 +1367,7 @@ def home() -> rx.Component:
                                                 rx.table.cell(
                                                     rx.button(
                                                         "Download",
-                                                        on_click=rx.download(url="/ai_machine_basics.pdf"),
+                                                        on_click=download_asset("/ai_machine_basics.pdf"),
                                                         background_color="transparent",
                                                         color="darkgreen",
                                                         text_decoration="underline",
@@ -1172,7 +1389,7 @@ def home() -> rx.Component:
                                                 rx.table.cell(
                                                     rx.button(
                                                         "Download",
-                                                        on_click=rx.download(url="/ai_machine_algorithms.pdf"),
+                                                        on_click=download_asset("/ai_machine_algorithms.pdf"),
                                                         background_color="transparent",
                                                         color="darkgreen",
                                                         text_decoration="underline",
@@ -1194,7 +1411,7 @@ def home() -> rx.Component:
                                                 rx.table.cell(
                                                     rx.button(
                                                         "Download",
-                                                        on_click=rx.download(url="/ai_machine_python.pdf"),
+                                                        on_click=download_asset("/ai_machine_python.pdf"),
                                                         background_color="transparent",
                                                         color="darkgreen",
                                                         text_decoration="underline",
@@ -1240,7 +1457,7 @@ def home() -> rx.Component:
                     # Card 3 - Deep Learning Explained
                     rx.card(
                         rx.vstack(
-                            rx.icon(tag=icons[2], size=50, color="black", aria_label="Deep Learning icon"),
+                            icon(tag=icons[2], size=50, color="black", aria_label="Deep Learning icon"),
                             rx.heading("Deep Learning Explained", size="4", margin_top="0.5rem", color="#333333"),
                             rx.text(
                                 "Dive into Deep Learning, neural networks, and how they power advanced AI systems like image and speech recognition.",
@@ -1267,7 +1484,7 @@ def home() -> rx.Component:
                                             text_align="center",
                                             padding="1rem",
                                             margin="0",
-                                            font_family="Montserrat",
+                                            font_family=font_stack("Montserrat"),
                                             aria_level="2"
                                         ),
                                         background_color="#4b0082",
@@ -1294,7 +1511,7 @@ def home() -> rx.Component:
                                                 rx.table.cell(
                                                     rx.button(
                                                         "Download",
-                                                        on_click=rx.download(url="/ai_deep_concepts.pdf"),
+                                                        on_click=download_asset("/ai_deep_concepts.pdf"),
                                                         background_color="transparent",
                                                         color="darkgreen",
                                                         text_decoration="underline",
@@ -1316,7 +1533,7 @@ def home() -> rx.Component:
                                                 rx.table.cell(
                                                     rx.button(
                                                         "Download",
-                                                        on_click=rx.download(url="/ai_deep_systematic.pdf"),
+                                                        on_click=download_asset("/ai_deep_systematic.pdf"),
                                                         background_color="transparent",
                                                         color="darkgreen",
                                                         text_decoration="underline",
@@ -1338,7 +1555,7 @@ def home() -> rx.Component:
                                                 rx.table.cell(
                                                     rx.button(
                                                         "Download",
-                                                        on_click=rx.download(url="/ai_deep_comprehensive.pdf"),
+                                                        on_click=download_asset("/ai_deep_comprehensive.pdf"),
                                                         background_color="transparent",
                                                         color="darkgreen",
                                                         text_decoration="underline",
@@ -1507,33 +1724,32 @@ def home() -> rx.Component:
         background_color="#F3F4F6",
     ),
         breadcrumb_items=[("Home", "/")],
-        
+        route="/",
     )
   
-def timeline() -> rx.Component:
+# AI evolution timeline, one (title, summary) pair per era. Set TIMELINE_DATA
+# to a JSON file of [title, summary] pairs to load a different set of eras.
+TIMELINE_ERAS = (
+    ("Rule-Based Systems (1950s - 1980s)", "The earliest AI systems were based on rule-based programming or expert systems..."),
+    ("Machine Learning (1990s - Early 2000s)", "In this stage, AI began evolving with machine learning (ML) techniques..."),
+    ("Deep Learning and Neural Networks (2010s - Present)", "The introduction of deep learning marked a revolutionary leap in AI..."),
+    ("Reinforcement Learning and Autonomous Systems (2015 - Present)", "During this phase, AI moved towards reinforcement learning (RL)..."),
+    ("General AI and Ethical Considerations (Future)", "The next stage in AI's evolution is General AI, or AGI..."),
+)
+if os.getenv("TIMELINE_DATA"):
+    with open(os.environ["TIMELINE_DATA"]) as f:
+        TIMELINE_ERAS = tuple((title, summary) for title, summary in json.load(f))
+
+
+def timeline(eras=TIMELINE_ERAS) -> rx.Component:
+    # Unrolled at build time: every card is plain markup, with no per-render conditionals
     return rx.box(
-        rx.foreach(
-            rx.Var.range(5),  # Generates 5 timeline cards
-            lambda i: rx.box(
+        *[
+            rx.box(
                 rx.box(
                     # Individual heading for each timeline item
                     rx.heading(
-                        rx.cond(
-                            i == 0, "Rule-Based Systems (1950s - 1980s)",
-                            rx.cond(
-                                i == 1, "Machine Learning (1990s - Early 2000s)",
-                                rx.cond(
-                                    i == 2, "Deep Learning and Neural Networks (2010s - Present)",
-                                    rx.cond(
-                                        i == 3, "Reinforcement Learning and Autonomous Systems (2015 - Present)",
-                                        rx.cond(
-                                            i == 4, "General AI and Ethical Considerations (Future)",
-                                            "General AI and Ethical Considerations (Future)"  # Default for anything else
-                                        )
-                                    )
-                                )
-                            )
-                        ),
+                        title,
                         class_name="title",
                         style={"font-size": "24px", "@media (max-width: 768px)": {"font-size": "20px"}},
                         aria_level="2",  # Proper heading level for screen readers
@@ -1541,22 +1757,7 @@ def timeline() -> rx.Component:
                     ),
                     # Individual text box for each timeline item
                     rx.text(
-                        rx.cond(
-                            i == 0, "The earliest AI systems were based on rule-based programming or expert systems...",
-                            rx.cond(
-                                i == 1, "In this stage, AI began evolving with machine learning (ML) techniques...",
-                                rx.cond(
-                                    i == 2, "The introduction of deep learning marked a revolutionary leap in AI...",
-                                    rx.cond(
-                                        i == 3, "During this phase, AI moved towards reinforcement learning (RL)...",
-                                        rx.cond(
-                                            i == 4, "The next stage in AI's evolution is General AI, or AGI...",
-                                            "General AI and Ethical Considerations (Future)"
-                                        )
-                                    )
-                                )
-                            )
-                        ),
+                        summary,
                         class_name="info",
                         style={"font-size": "16px", "@media (max-width: 768px)": {"font-size": "14px"}},
                         aria_labelledby=f"timeline-heading-{i}",  # Associate text with heading
@@ -1565,15 +1766,16 @@ def timeline() -> rx.Component:
                     ),
                     class_name="info",
                     role="article",  # Each timeline item is a self-contained article
-                    aria_label=f"AI Evolution Timeline Item {i+1} of 5",  # Context for screen readers
+                    aria_label=f"AI Evolution Timeline Item {i + 1} of {len(eras)}",  # Context for screen readers
                 ),
-                class_name=rx.cond((i % 2) == 0, "card even", "card odd"),
+                class_name="card even" if i % 2 == 0 else "card odd",
                 role="listitem",  # Each item is part of a list
-                aria_posinset=str(i+1),  # Position in set (1-based index)
-                aria_setsize="5",  # Total number of items in the set
+                aria_posinset=str(i + 1),  # Position in set (1-based index)
+                aria_setsize=str(len(eras)),  # Total number of items in the set
                 tab_index=0,  # Make each item focusable
-            ),
-        ),
+            )
+            for i, (title, summary) in enumerate(eras)
+        ],
         class_name="timeline",
         display="flex",
         flex_direction="column",
@@ -1585,8 +1787,64 @@ def timeline() -> rx.Component:
     )
 
 
+def benchmark_timeline(sizes=(5, 50, 500)) -> dict:
+    """Compile time, DOM elements and runtime conditionals of the timeline per era count."""
+    results = {}
+    for size in sizes:
+        eras = [(f"Era {i}", f"Summary of era {i}.") for i in range(size)]
+        start = time.perf_counter()
+        code = str(timeline(eras))
+        results[size] = {
+            "compile_ms": (time.perf_counter() - start) * 1000,
+            "elements": code.count("jsx("),
+            "conditionals": code.count(" ? "),
+            "bytes": len(code),
+        }
+    return results
+
+
+# Records when the first timeline card is in the DOM, whether parsed from the
+# exported HTML or rendered by React
+TIMELINE_RENDER_PROBE = """
+new MutationObserver((_, observer) => {
+  if (document.querySelector(".timeline [role=listitem]")) {
+    window.timelineRenderedAt = performance.now();
+    observer.disconnect();
+  }
+}).observe(document, {childList: true, subtree: true});
+"""
+
+
+def measure_timeline_page(url: str, runs: int = 5) -> dict:
+    """DOM nodes and time until the timeline is in the DOM on a running site, in headless Chromium.
+
+    Needs Playwright (`pip install playwright && playwright install chromium`).
+    """
+    from playwright.sync_api import sync_playwright  # Optional; only this measurement needs it
+
+    rendered, loaded = [], []
+    with sync_playwright() as playwright:
+        browser = playwright.chromium.launch()
+        for _ in range(runs):
+            page = browser.new_page()
+            page.add_init_script(TIMELINE_RENDER_PROBE)
+            page.goto(url, wait_until="networkidle")
+            page.wait_for_function("window.timelineRenderedAt !== undefined")
+            rendered.append(page.evaluate("window.timelineRenderedAt"))
+            loaded.append(page.evaluate('performance.getEntriesByType("navigation")[0].loadEventEnd'))
+            counts = page.evaluate(
+                '[document.getElementsByTagName("*").length, document.querySelectorAll(".timeline *").length + 1]'
+            )
+            page.close()
+        browser.close()
+    return {
+        "dom_nodes": counts[0],
+        "timeline_nodes": counts[1],
+        "timeline_ms": statistics.median(rendered),
+        "load_ms": statistics.median(loaded),
+    }
+
 
-    
 def ux() -> rx.Component:
     button_style = {
         "position": "relative",
@@ -1648,20 +1906,19 @@ def ux() -> rx.Component:
                     header(),
                     rx.form(  # Wrap the questions in a form element
                         rx.vstack(
-                            question1(),
-                            rx.divider(**{"aria-hidden": "true"}),
-                            question2(),
-                            rx.divider(**{"aria-hidden": "true"}),
-                            question3(),
-                            rx.divider(**{"aria-hidden": "true"}),
-                            question4(),
-                            rx.divider(**{"aria-hidden": "true"}),
-                            question5(),
+                            rx.foreach(
+                                State.presentation[0],  # Questions in this session's order
+                                lambda index, position: rx.fragment(
+                                    rx.cond(position > 0, rx.divider(**{"aria-hidden": "true"})),
+                                    rx.match(index, *[(i, question(i, position)) for i in range(len(QUIZ_QUESTIONS))]),
+                                ),
+                            ),
                             rx.center(
                                 rx.button(
                                     "Submit",
                                     style=button_style,
                                     width="6em",
+                                    # Offline clicks never reach this: see SERVICE_WORKER_CLIENT_SCRIPT
                                     on_click=State.submit,
                                     aria_label="Submit quiz answers",
                                     id="quiz-submit-button",
@@ -1706,6 +1963,62 @@ def ux() -> rx.Component:
             ("Home", "/"),
             ("Quiz", "/quiz"),
         ],
+        route="/resources/user-experiences",
+    )
+
+
+def adaptive_quiz() -> rx.Component:
+    return layout(
+        rx.center(
+            rx.vstack(
+                rx.heading("Adaptive AI Quiz", color="black", id="adaptive-heading"),
+                rx.text(
+                    "Each question is picked from your previous answers, and the quiz stops "
+                    "as soon as your level is known precisely enough.",
+                    color="black",
+                ),
+                rx.divider(**{"aria-hidden": "true"}),
+                rx.cond(
+                    AdaptiveState.done,
+                    rx.vstack(
+                        rx.text(
+                            f"Estimated ability: {AdaptiveState.ability} ± {AdaptiveState.ability_se}",
+                            color="black",
+                        ),
+                        rx.text(f"That is above {AdaptiveState.percentile}% of quiz takers.", color="black"),
+                        rx.text(f"Questions used: {AdaptiveState.items.length()}", color="black"),
+                        rx.link(rx.button("Back to Home"), href="/"),
+                    ),
+                    rx.vstack(
+                        rx.match(
+                            AdaptiveState.current,
+                            *[(i, question(i, AdaptiveState.items.length())) for i in range(len(QUIZ_QUESTIONS))],
+                        ),
+                        rx.button(
+                            "Next",
+                            on_click=AdaptiveState.next_question,
+                            disabled=State.answers[AdaptiveState.current] == UNANSWERED,
+                            aria_label="Submit this answer and continue",
+                        ),
+                    ),
+                ),
+                style=question_style,
+                background_color="white",
+                padding="20px",
+                border_radius="10px",
+                role="region",
+                aria_labelledby="adaptive-heading",
+            ),
+            padding_y="2em",
+            min_height="100vh",
+            role="main",
+        ),
+        breadcrumb_items=[
+            ("Home", "/"),
+            ("Quiz", "/quiz"),
+            ("Adaptive Quiz", "/resources/user-experiences/adaptive"),
+        ],
+        route="/resources/user-experiences/adaptive",
     )
    
 
@@ -1778,7 +2091,7 @@ def educational() -> rx.Component:
                             rx.vstack(
                                 rx.box(
                                     rx.image(
-                                        src=img_url,
+                                        src=asset_url(img_url),
                                         alt=f"Decorative image representing: {title}",
                                         width="250px",  # Original fixed width
                                         height="200px",
@@ -1816,7 +2129,7 @@ def educational() -> rx.Component:
                                                 color="#4b0082",
                                                 class_name="hover:text-[#4b0082]",
                                             ),
-                                            rx.icon(tag="arrow-right", color="#4b0082", margin_left="8px")
+                                            icon(tag="arrow-right", color="#4b0082", margin_left="8px")
                                         ),
                                         href=link,
                                         text_decoration="none",
@@ -1879,7 +2192,8 @@ def educational() -> rx.Component:
             ("Home", "/"),
             ("Resources", "/resources"),
             ("Educational Resources", "/resources/educational-resources")
-        ]
+        ],
+        route="/resources/educational-resources",
     )
     
 
@@ -1965,6 +2279,7 @@ def about() -> rx.Component:
             ("Home", "/"),
             ("About Us", "/about-us")
         ],
+        route="/about-us",
     )
 
 
@@ -2172,6 +2487,7 @@ def contact() -> rx.Component:
             ("Home", "/"),
             ("Contact Us", "/contact"),
         ],
+        route="/contact-us",
     )
     
 def sad_face_emoji():
@@ -2190,7 +2506,7 @@ def custom_404() -> rx.Component:
                     "color": "#00bfff",
                     "text_decoration": "none",
                     "transition": "0.3s",
-                    "font_family": "Lora, serif",
+                    "font_family": font_stack("Lora"),
             }),
             spacing="2",
             align="center",
@@ -2263,6 +2579,7 @@ def academics() -> rx.Component:
             ("Resources", "/resources"),
             ("AI Academia", "/resources/ai-academics"),
         ],
+        route="/resources/ai-academics",
         content=rx.vstack(
             rx.heading(
                 "AI Academic Papers",
@@ -2306,7 +2623,7 @@ def academics() -> rx.Component:
                             rx.vstack(
                                 rx.box(
                                     rx.image(
-                                        src=img_src,
+                                        src=asset_url(img_src),
                                         alt=f"Preview image for {title}",
                                         border_radius="md",
                                         box_shadow="lg",
@@ -2316,7 +2633,7 @@ def academics() -> rx.Component:
                                 ),
                                 rx.button(
                                     f"Download PDF ({file_size}MB)",
-                                    on_click=rx.download(url=pdf_url),
+                                    on_click=download_asset(pdf_url),
                                     style=button_style,
                                     aria_label=f"Download PDF of {title}",
                                     tab_index=0,
@@ -2375,22 +2692,3816 @@ def academics() -> rx.Component:
 
     
     
-app = rx.App(
-    stylesheets=["/styles.css"],  # Correct way to load external CSS
-    
-)
-app.add_page(home, route="/")
-app.add_page(ux, route="/resources/user-experiences")
-app.add_page(educational, route="/resources/educational-resources")
-app.add_page(about, route="/about-us")      
-app.add_page(contact, route="/contact-us")
-app.add_page(results, route="/resources/educational-resources/result")
-app.add_page(academics, route="/resources/ai-academics")
-app.add_page(custom_404 , route="/404")
+# ---------------------------------------------------------------------------
+# Event handler metrics
+# ---------------------------------------------------------------------------
+
+# Histogram bucket upper bounds for handler latency (seconds)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Histogram bucket upper bounds for serialized state delta size (bytes)
+DELTA_SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536)
+
+
+class Histogram:
+    """A histogram with fixed, pre-computed buckets (Prometheus `le` semantics)."""
+
+    __slots__ = ("bounds", "counts", "total")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Last slot is the +Inf bucket
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+
+class HandlerMetrics:
+    """Counters and histograms for a single event handler."""
+
+    __slots__ = ("calls", "errors", "latency", "delta_bytes")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.delta_bytes = Histogram(DELTA_SIZE_BUCKETS)
+
 
+class MetricsRegistry:
+    """Process-wide metrics, rendered in the Prometheus text format.
+
+    Every update happens on the event loop thread, so the counters are plain
+    integers with no locking in the hot path.
+    """
+
+    def __init__(self, prefix: str = "webeducateai"):
+        self.prefix = prefix
+        self.handlers: dict[str, HandlerMetrics] = {}
+        self.counters: dict[str, int] = {}  # Free-form counters (name -> value)
+        self.gauges: dict[str, Any] = {}  # Gauges (name -> zero-argument callable)
+
+    def handler(self, label: str) -> HandlerMetrics:
+        metrics = self.handlers.get(label)
+        if metrics is None:
+            metrics = self.handlers[label] = HandlerMetrics()
+        return metrics
+
+    def inc(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def render(self) -> str:
+        p = self.prefix
+        lines = []
+
+        def histogram(name, help_text, attr):
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} histogram")
+            for label, metrics in sorted(self.handlers.items()):
+                hist = getattr(metrics, attr)
+                cumulative = 0
+                for bound, count in zip(hist.bounds + ("+Inf",), hist.counts):
+                    cumulative += count
+                    lines.append(f'{p}_{name}_bucket{{handler="{label}",le="{bound}"}} {cumulative}')
+                lines.append(f'{p}_{name}_sum{{handler="{label}"}} {hist.total}')
+                lines.append(f'{p}_{name}_count{{handler="{label}"}} {cumulative}')
+
+        lines.append(f"# HELP {p}_event_calls_total Event handler invocations.")
+        lines.append(f"# TYPE {p}_event_calls_total counter")
+        for label, metrics in sorted(self.handlers.items()):
+            lines.append(f'{p}_event_calls_total{{handler="{label}"}} {metrics.calls}')
+        lines.append(f"# HELP {p}_event_errors_total Event handler invocations that raised.")
+        lines.append(f"# TYPE {p}_event_errors_total counter")
+        for label, metrics in sorted(self.handlers.items()):
+            lines.append(f'{p}_event_errors_total{{handler="{label}"}} {metrics.errors}')
+        histogram("event_latency_seconds", "Event handler latency.", "latency")
+        histogram("event_delta_bytes", "Serialized state delta size per event.", "delta_bytes")
+
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE {p}_{name} counter")
+            lines.append(f"{p}_{name} {value}")
+        for name, read in sorted(self.gauges.items()):
+            lines.append(f"# TYPE {p}_{name} gauge")
+            lines.append(f"{p}_{name} {read()}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+# ---------------------------------------------------------------------------
+# Background flushing
+# ---------------------------------------------------------------------------
+
+async def flush_batch(name: str, take, write, restore) -> None:
+    """Take a batch on the event loop and write it from a thread.
+
+    If the write fails the error is logged and counted, and the batch is
+    handed back to `restore` so the next flush retries it.
+    """
+    batch = take()
+    if not batch:
+        return
+    try:
+        await asyncio.to_thread(write, batch)
+    except Exception:
+        restore(batch)
+        metrics.inc(f"{name}_flush_errors_total")
+        print(f"{name} flush failed; kept for the next one\n{traceback.format_exc()}", file=sys.stderr, flush=True)
+
+
+@contextlib.asynccontextmanager
+async def periodic_flush(name: str, seconds: float, take, write, restore):
+    """Run flush_batch every `seconds` while the app runs, and once more at shutdown."""
+    metrics.inc(f"{name}_flush_errors_total", 0)  # Listed in /metrics before the first failure
+
+    async def loop():
+        while True:
+            await asyncio.sleep(seconds)
+            await flush_batch(name, take, write, restore)
+
+    task = asyncio.create_task(loop())
+    try:
+        yield
+    finally:
+        task.cancel()
+        await flush_batch(name, take, write, restore)
+
+
+# ---------------------------------------------------------------------------
+# Slow-event flight recorder
+# ---------------------------------------------------------------------------
+
+FLIGHT_RECORDER_SIZE = int(os.getenv("FLIGHT_RECORDER_SIZE", "256"))  # Events kept in the ring buffer
+SLOW_EVENT_SECONDS = float(os.getenv("SLOW_EVENT_SECONDS", "1.0"))  # Stack-sample events slower than this
+FLIGHT_RECORDER_DUMP = os.getenv("FLIGHT_RECORDER_DUMP", "")  # File for SIGUSR1 dumps (default: stderr)
+STACK_SAMPLE_DEPTH = 40  # Innermost frames kept per stack sample
+WATCHDOG_POLL_SECONDS = SLOW_EVENT_SECONDS / 10  # Slow events are sampled at most this late
+EVENT_TRACE_EXPIRY_SECONDS = float(os.getenv("EVENT_TRACE_EXPIRY_SECONDS", "300"))  # In-flight events older than this are closed
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # Bearer token for the /admin routes; unset disables them
+
+
+class EventTrace:
+    """Bookkeeping for the event a task is currently processing."""
+
+    __slots__ = ("label", "token_hash", "started_at", "start", "delta_bytes", "stack", "profile")
+
+    def __init__(self, label: str, token: str):
+        self.label = label
+        self.token_hash = hashlib.blake2b(token.encode(), digest_size=6).hexdigest()  # Never keep raw tokens
+        self.started_at = time.time()  # Wall clock, for the dump
+        self.start = time.perf_counter()  # Monotonic, for durations
+        self.delta_bytes = 0
+        self.stack = None  # Filled in by the watchdog if the event runs long
+        self.profile = None  # SamplingProfile when this event is being profiled
+
+
+class FlightRecorder:
+    """Fixed-size ring buffer of the most recent events.
+
+    The slots are allocated up front and overwritten in place, so memory use
+    does not depend on traffic. A watchdog thread samples the event loop's
+    stack whenever an event runs past SLOW_EVENT_SECONDS, which catches
+    synchronous handlers (e.g. the SMTP call in ContactFormState.handle_submit)
+    while they are still blocking the loop.
+    """
+
+    def __init__(self, size: int):
+        self.slots: list = [None] * size
+        self.recorded = 0  # Total events recorded; the next slot is recorded % size
+        self.in_flight: dict[int, EventTrace] = {}
+        self.loop_thread_id = None
+        self._stop = threading.Event()
+
+    def begin(self, trace: EventTrace):
+        self.in_flight[id(trace)] = trace
+
+    def end(self, trace: EventTrace):
+        if self.in_flight.pop(id(trace), None) is None:
+            return  # Already expired
+        duration = time.perf_counter() - trace.start
+        self.slots[self.recorded % len(self.slots)] = (
+            trace.label, trace.token_hash, trace.started_at, trace.started_at + duration,
+            trace.delta_bytes, trace.stack,
+        )
+        self.recorded += 1
+
+    def sample_slow_events(self):
+        # Runs on the watchdog thread; the loop thread may be blocked
+        now = time.perf_counter()
+        for trace in tuple(self.in_flight.values()):
+            if trace.stack is None and now - trace.start > SLOW_EVENT_SECONDS:
+                frame = sys._current_frames().get(self.loop_thread_id)
+                if frame is not None:
+                    trace.stack = traceback.format_stack(frame, limit=STACK_SAMPLE_DEPTH)
+
+    def expire_stale(self):
+        # Events whose update stream was abandoned (e.g. the client disconnected)
+        # never reach postprocess; close them so in_flight stays bounded
+        cutoff = time.perf_counter() - EVENT_TRACE_EXPIRY_SECONDS
+        for trace in tuple(self.in_flight.values()):
+            if trace.start < cutoff:
+                self.end(trace)
+                metrics.inc("event_traces_expired_total")
+
+    def watch(self):
+        while not self._stop.wait(WATCHDOG_POLL_SECONDS):
+            self.sample_slow_events()
+
+    def dump(self) -> dict:
+        def entry(label, token_hash, start, end, delta_bytes, stack):
+            return {
+                "handler": label,
+                "session": token_hash,
+                "start": start,
+                "end": end,
+                "duration": None if end is None else end - start,
+                "delta_bytes": delta_bytes,
+                "stack": stack,
+            }
+
+        size = len(self.slots)
+        oldest = self.recorded % size
+        recent = [slot for slot in self.slots[oldest:] + self.slots[:oldest] if slot is not None]
+        return {
+            "in_flight": [
+                entry(t.label, t.token_hash, t.started_at, None, t.delta_bytes, t.stack)
+                for t in tuple(self.in_flight.values())
+            ],
+            "recent": [entry(*slot) for slot in recent],
+        }
+
+
+flight_recorder = FlightRecorder(FLIGHT_RECORDER_SIZE)
+metrics.inc("event_traces_expired_total", 0)  # Listed in /metrics before the first expiry
+
+# EventTrace of the event being processed by the current task
+_current_event: contextvars.ContextVar = contextvars.ContextVar("current_event", default=None)
+
+
+@functools.lru_cache(maxsize=256)
+def handler_label(event_name: str) -> str:
+    """Turn a full event name into a readable label such as `State.submit`."""
+    state_path, _, handler = event_name.rpartition(".")
+    try:
+        state_cls = rx.State.get_class_substate(state_path)
+    except Exception:
+        return event_name
+    # ComponentState instances get numbered classes (Name_n1, Name_n2, ...)
+    return f"{re.sub(r'_n[0-9]+$', '', state_cls.__name__)}.{handler}"
+
+
+class EventMetricsMiddleware(Middleware):
+    """Records metrics and a flight-recorder entry for every event handler."""
+
+    async def preprocess(self, app, state, event):
+        trace = EventTrace(handler_label(event.name), event.token)
+        _current_event.set(trace)
+        flight_recorder.begin(trace)
+        trace.profile = profiler.start_for_event(trace.label, event.router_data.get("headers") or {})
+        return None
+
+    async def postprocess(self, app, state, event, update):
+        trace = _current_event.get()
+        if trace is None:
+            return update
+        handler = metrics.handler(trace.label)
+        if update.delta:
+            size = len(rx_format.json_dumps(update.delta))
+            handler.delta_bytes.observe(size)
+            trace.delta_bytes += size
+        if update.final:
+            handler.calls += 1
+            handler.latency.observe(time.perf_counter() - trace.start)
+            flight_recorder.end(trace)
+            if trace.profile is not None:
+                trace.profile.stop()
+            _current_event.set(None)
+        return update
+
+
+def backend_exception_handler(exception: Exception) -> EventSpec:
+    # Count the failure against the handler that raised, then show the usual toast
+    trace = _current_event.get()
+    if trace is not None:
+        metrics.handler(trace.label).errors += 1
+    return default_backend_exception_handler(exception)
+
+
+def admin_authorized(request) -> bool:
+    # Admin routes are disabled unless ADMIN_TOKEN is set
+    supplied = request.headers.get("authorization", "").removeprefix("Bearer ")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(supplied, ADMIN_TOKEN)
+
+
+async def metrics_endpoint(request):
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+async def flight_recorder_endpoint(request):
+    if not admin_authorized(request):
+        return PlainTextResponse("Not Found", status_code=404)
+    return JSONResponse(flight_recorder.dump())
+
+
+def dump_flight_recorder(signum=None, frame=None):
+    # SIGUSR1 handler: runs on the main thread even while a handler is blocking the loop
+    flight_recorder.sample_slow_events()
+    text = json.dumps(flight_recorder.dump(), indent=2)
+    if FLIGHT_RECORDER_DUMP:
+        with open(FLIGHT_RECORDER_DUMP, "w") as f:
+            f.write(text)
+    else:
+        print(text, file=sys.stderr, flush=True)
+
+
+@contextlib.asynccontextmanager
+async def flight_recorder_lifespan():
+    async def expire():
+        while True:
+            await asyncio.sleep(EVENT_TRACE_EXPIRY_SECONDS / 4)
+            flight_recorder.expire_stale()
+
+    flight_recorder.loop_thread_id = threading.get_ident()
+    flight_recorder._stop.clear()
+    task = asyncio.create_task(expire())
+    watchdog = threading.Thread(target=flight_recorder.watch, name="flight-recorder", daemon=True)
+    watchdog.start()
+    if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, dump_flight_recorder)
+    try:
+        yield
+    finally:
+        task.cancel()
+        flight_recorder._stop.set()
 
 
+# ---------------------------------------------------------------------------
+# On-demand sampling profiler
+# ---------------------------------------------------------------------------
 
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")  # Where profile files are written
+PROFILE_FORMAT = os.getenv("PROFILE_FORMAT", "collapsed")  # "collapsed" (flamegraph.pl) or "speedscope"
+PROFILE_SAMPLE_HZ = float(os.getenv("PROFILE_SAMPLE_HZ", "200"))  # Stack samples per second
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "1"))  # Profiles allowed to run at once
+PROFILE_SECRET = os.getenv("PROFILE_SECRET", "")  # Key for profile_token cookies; unset disables them
+
+
+class SamplingProfile:
+    """Samples one thread's stack on a background thread until stopped."""
+
+    def __init__(self, name: str, thread_id: int, on_done):
+        self.name = name
+        self.thread_id = thread_id
+        self.samples: dict[tuple, int] = {}  # Stack (outermost first) -> sample count
+        self._on_done = on_done
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"profile-{name}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        interval = 1.0 / PROFILE_SAMPLE_HZ
+        try:
+            while not self._stop.wait(interval):
+                frame = sys._current_frames().get(self.thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                key = tuple(reversed(stack))
+                self.samples[key] = self.samples.get(key, 0) + 1
+            self.write()
+        finally:
+            self._on_done()
+
+    def write(self) -> str:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{re.sub(r'[^A-Za-z0-9_.-]', '_', self.name)}")
+        if PROFILE_FORMAT == "speedscope":
+            path = base + ".speedscope.json"
+            index, samples, weights = {}, [], []
+            for stack, count in self.samples.items():
+                samples.append([index.setdefault(f, len(index)) for f in stack])
+                weights.append(count)
+            frames = [{"name": name} for name in index]
+            document = {
+                "$schema": "https://www.speedscope.app/file-format-schema.json",
+                "shared": {"frames": frames},
+                "profiles": [{
+                    "type": "sampled",
+                    "name": self.name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights) / PROFILE_SAMPLE_HZ,
+                    "samples": samples,
+                    "weights": [w / PROFILE_SAMPLE_HZ for w in weights],
+                }],
+            }
+            with open(path, "w") as f:
+                json.dump(document, f)
+        else:
+            path = base + ".collapsed"
+            with open(path, "w") as f:
+                for stack, count in self.samples.items():
+                    f.write(f"{';'.join(stack)} {count}\n")
+        return path
+
+
+class Profiler:
+    """Decides which events and page compilations to profile.
+
+    Profiling is armed through /admin/profile (the next N events, optionally
+    filtered by handler label, and the next N page compilations), through the
+    PROFILE_EVENTS / PROFILE_PAGES environment variables at startup. With
+    `token_only`, only connections carrying a signed profile_token cookie
+    draw from the event budget, so a live site can be profiled from one
+    browser.
+    """
+
+    def __init__(self):
+        self.pending_events = int(os.getenv("PROFILE_EVENTS", "0"))
+        self.pending_pages = int(os.getenv("PROFILE_PAGES", "0"))
+        self.handler_filter = os.getenv("PROFILE_HANDLER", "")  # e.g. "State.submit"; empty matches all
+        self.token_only = False
+        self._slots = threading.BoundedSemaphore(PROFILE_MAX_CONCURRENT)
+
+    def _start(self, name: str):
+        if not self._slots.acquire(blocking=False):
+            return None  # At the concurrency cap; skip rather than pile up samplers
+        return SamplingProfile(name, threading.get_ident(), self._slots.release).start()
+
+    def start_for_event(self, label: str, headers: dict):
+        if self.pending_events <= 0 or (self.handler_filter and label != self.handler_filter):
+            return None
+        if self.token_only and not verify_profile_token(profile_cookie(headers)):
+            return None
+        profile = self._start(label)
+        if profile is not None:
+            self.pending_events -= 1
+        return profile
+
+    def start_for_page(self, name: str):
+        if self.pending_pages <= 0:
+            return None
+        profile = self._start(f"page-{name}")
+        if profile is not None:
+            self.pending_pages -= 1
+        return profile
+
+
+profiler = Profiler()
+
+
+def sign_profile_token(ttl: int = 300) -> str:
+    """Create a profile_token cookie value valid for `ttl` seconds."""
+    expiry = str(int(time.time()) + ttl)
+    return f"{expiry}.{hmac.new(PROFILE_SECRET.encode(), expiry.encode(), hashlib.sha256).hexdigest()}"
+
+
+def profile_cookie(headers: dict) -> str:
+    # Browsers cannot set headers on the websocket, but send cookies with its handshake
+    match = re.search(r"(?:^|;)\s*profile_token=([^;]*)", headers.get("cookie", ""))
+    return match.group(1) if match else ""
+
+
+def verify_profile_token(token: str) -> bool:
+    if not PROFILE_SECRET or "." not in token:
+        return False
+    expiry, _, signature = token.partition(".")
+    expected = hmac.new(PROFILE_SECRET.encode(), expiry.encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(signature, expected) and expiry.isdigit() and int(expiry) > time.time()
+
+
+def profiled_page(page):
+    """Wrap a page function so its compilation can be profiled on demand."""
+
+    @functools.wraps(page)
+    def wrapper():
+        profile = profiler.start_for_page(page.__name__)
+        try:
+            return page()
+        finally:
+            if profile is not None:
+                profile.stop()
+
+    return wrapper
+
+
+async def profile_endpoint(request):
+    if not admin_authorized(request):
+        return PlainTextResponse("Not Found", status_code=404)
+    if request.method == "POST":
+        # e.g. POST /admin/profile?events=5&handler=State.submit&pages=1&token_only=1
+        params = request.query_params
+        try:
+            events = int(params.get("events", profiler.pending_events))
+            pages = int(params.get("pages", profiler.pending_pages))
+        except ValueError:
+            return JSONResponse({"error": "events and pages must be integers"}, status_code=400)
+        if events < 0 or pages < 0:
+            return JSONResponse({"error": "events and pages must not be negative"}, status_code=400)
+        profiler.pending_events, profiler.pending_pages = events, pages
+        profiler.handler_filter = params.get("handler", profiler.handler_filter)
+        token_only = params.get("token_only", "1" if profiler.token_only else "0") == "1"
+        if token_only and not PROFILE_SECRET:
+            return JSONResponse({"error": "token_only needs PROFILE_SECRET"}, status_code=400)
+        profiler.token_only = token_only
+    return JSONResponse({
+        "pending_events": profiler.pending_events,
+        "pending_pages": profiler.pending_pages,
+        "handler": profiler.handler_filter,
+        "token_only": profiler.token_only,
+        "profile_token": sign_profile_token() if PROFILE_SECRET else None,  # Set as a cookie in the browser to profile
+        "directory": os.path.abspath(PROFILE_DIR),
+    })
+
+
+# ---------------------------------------------------------------------------
+# Per-session state audit
+# ---------------------------------------------------------------------------
+
+def walk_states(state):
+    yield state
+    for substate in state.substates.values():
+        yield from walk_states(substate)
+
+
+def audit_state_sizes(root_states=None) -> dict:
+    """Average serialized bytes per session for each State class.
+
+    `pickle` is what a state manager keeps per session; `json` is what the
+    client receives when the state is hydrated. Without `root_states` a fresh
+    session is measured.
+    """
+    if not root_states:
+        root_states = [rx.State(_reflex_internal_init=True)]
+    totals: dict[str, list] = {}
+    for root in root_states:
+        for state in walk_states(root):
+            cls = type(state)
+            name = f"{cls.__module__.rpartition('.')[2]}.{re.sub(r'_n[0-9]+$', '', cls.__name__)}"
+            entry = totals.setdefault(name, [0, 0, 0])
+            entry[0] += len(state._serialize())
+            entry[1] += len(rx_format.json_dumps({var: getattr(state, var) for var in state.base_vars}))
+            entry[2] += 1
+    return {
+        name: {"pickle": pickled / count, "json": as_json / count, "sessions": count}
+        for name, (pickled, as_json, count) in totals.items()
+    }
+
+
+async def state_audit_endpoint(request):
+    if not admin_authorized(request):
+        return PlainTextResponse("Not Found", status_code=404)
+    # Measure the sessions the memory or disk state manager holds in memory
+    live = getattr(app.state_manager, "states", None) or {}
+    return JSONResponse(audit_state_sizes(list(live.values())))
+
+
+# ---------------------------------------------------------------------------
+# Bounded session store
+# ---------------------------------------------------------------------------
+
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "1800"))  # Seconds before an idle session is dropped
+SESSION_MEMORY_CAP = int(float(os.getenv("SESSION_MEMORY_CAP_MB", "64")) * 1024 * 1024)  # Bytes of session state kept
+SESSION_SWEEP_SECONDS = float(os.getenv("SESSION_SWEEP_SECONDS", "60"))  # How often idle sessions are swept
+SESSION_MEASURE_EVERY = int(os.getenv("SESSION_MEASURE_EVERY", "16"))  # Re-measure a session's size every Nth write
+
+
+@dataclasses.dataclass
+class SessionBounds:
+    """An idle TTL and an LRU memory cap for the sessions a state manager holds in `states`.
+
+    Mixed into Reflex's memory and disk managers. Session size is the
+    pickled size of the session's state tree, measured on the session's
+    first write and then on every SESSION_MEASURE_EVERY-th, so most events
+    skip the pickling.
+    """
+
+    idle_ttl: float = SESSION_IDLE_TTL
+    memory_cap: int = SESSION_MEMORY_CAP
+
+    # Client token -> last access time, least recently used first
+    _last_access: collections.OrderedDict = dataclasses.field(default_factory=collections.OrderedDict, init=False)
+    # Client token -> measured session size in bytes
+    _sizes: dict[str, int] = dataclasses.field(default_factory=dict, init=False)
+    # Client token -> writes since the size was last measured
+    _writes: dict[str, int] = dataclasses.field(default_factory=dict, init=False)
+    _total_bytes: int = dataclasses.field(default=0, init=False)
+
+    async def get_state(self, token: str) -> rx.State:
+        client_token = _split_substate_key(token)[0]
+        state = await super().get_state(token)
+        self._last_access[client_token] = time.monotonic()
+        self._last_access.move_to_end(client_token)
+        return state
+
+    async def set_state(self, token: str, state: rx.State):
+        await super().set_state(token, state)
+        client_token = _split_substate_key(token)[0]
+        writes = self._writes.get(client_token, 0)
+        self._writes[client_token] = (writes + 1) % SESSION_MEASURE_EVERY
+        if writes and client_token in self._sizes:
+            return  # Not sampled; keep the last measured size
+        size = sum(len(substate._serialize()) for substate in walk_states(state))
+        self._total_bytes += size - self._sizes.get(client_token, 0)
+        self._sizes[client_token] = size
+        self.evict_over_cap(keep=client_token)
+
+    def in_use(self, token: str) -> bool:
+        lock = self._states_locks.get(token)
+        return lock is not None and (lock.locked() or bool(getattr(lock, "_waiters", None)))
+
+    def evict(self, token: str, reason: str):
+        self.states.pop(token, None)
+        self._states_locks.pop(token, None)
+        self._last_access.pop(token, None)
+        self._total_bytes -= self._sizes.pop(token, 0)
+        self._writes.pop(token, None)
+        metrics.inc(f"session_evictions_{reason}_total")
+
+    def evict_over_cap(self, keep: str = ""):
+        while self._total_bytes > self.memory_cap:
+            victim = next(
+                (token for token in self._last_access if token != keep and not self.in_use(token)), None
+            )
+            if victim is None:
+                break
+            self.evict(victim, "lru")
+
+    def evict_idle(self):
+        cutoff = time.monotonic() - self.idle_ttl
+        for token, last_access in list(self._last_access.items()):
+            if last_access > cutoff:
+                break  # Ordered by last access, so everything after this is newer
+            if not self.in_use(token):
+                self.evict(token, "ttl")
+
+
+@dataclasses.dataclass
+class BoundedStateManager(SessionBounds, StateManagerMemory):
+    """Reflex's in-memory state manager, bounded.
+
+    An evicted session is simply forgotten: its next event finds no state,
+    Reflex asks the client to reload, and the session starts again from the
+    defaults.
+    """
 
 
+@dataclasses.dataclass
+class BoundedDiskStateManager(SessionBounds, StateManagerDisk):
+    """Reflex's disk state manager (the default mode), bounded.
 
+    It keeps every session it has loaded in memory as well as on disk, so
+    only the memory copy is evicted; the next event reloads the session from
+    disk as after a restart.
+    """
+
+
+# ---------------------------------------------------------------------------
+# Shared Redis state backend
+# ---------------------------------------------------------------------------
+
+STATE_REDIS_URL = os.getenv("STATE_REDIS_URL", "")  # redis://... or fakeredis:// to share state between workers
+STATE_TOKEN_TTL = int(os.getenv("STATE_TOKEN_TTL", "3600"))  # Seconds a session lives in Redis after its last write
+STATE_CACHE_SIZE = int(os.getenv("STATE_CACHE_SIZE", "10000"))  # Sessions kept in each worker's local cache
+STATE_LOCK_MS = int(os.getenv("STATE_LOCK_MS", "10000"))  # Session lock lifetime, renewed while an event runs
+STATE_LOCK_POLL_SECONDS = (0.001, 0.05)  # First and longest wait between attempts to take a busy session lock
+STATE_VERSION_FIELD = "__version__"  # Hash field holding the session's write counter
+
+
+def connect_state_redis(url: str):
+    if url.startswith("fakeredis://"):
+        import fakeredis  # Optional; only needed for the in-process fake
+
+        return fakeredis.FakeAsyncRedis()
+    from redis.asyncio import Redis  # Only needed when STATE_REDIS_URL is set
+
+    return Redis.from_url(url)
+
+
+@dataclasses.dataclass
+class SharedStateManager(StateManager):
+    """State manager that keeps every session in Redis so any worker can serve it.
+
+    Each session is one hash, with a field per substate (pickled) plus a
+    version counter. modify_state holds a per-session Redis lock (SET NX PX,
+    renewed while the event runs), so events for one session are serialized
+    across workers just as Reflex's StateManagerRedis does. Reads go through
+    a local cache: a cached session is reused when its version still matches
+    Redis (one HGET), otherwise the whole hash is fetched with a single
+    HGETALL. Writes only send touched substates, in one MULTI/EXEC
+    transaction guarded by WATCH on the version. A version that moved under
+    us means the lock was lost: the write is dropped, counted as a conflict,
+    and LockExpiredError is raised, as Reflex does.
+    """
+
+    redis: Any = None
+    token_expiration: int = STATE_TOKEN_TTL
+    cache_size: int = STATE_CACHE_SIZE
+    lock_ms: int = STATE_LOCK_MS
+
+    # Client token -> (version, root state), least recently used first
+    _cache: collections.OrderedDict = dataclasses.field(default_factory=collections.OrderedDict, init=False)
+    # Client token -> lock serializing this worker's events for the session
+    _locks: weakref.WeakValueDictionary = dataclasses.field(default_factory=weakref.WeakValueDictionary, init=False)
+
+    def _key(self, client_token: str) -> str:
+        return f"webeducateai:state:{client_token}"
+
+    def _lock_key(self, client_token: str) -> str:
+        return f"webeducateai:lock:{client_token}"
+
+    async def _if_locked(self, lock_key: str, lock_id: bytes, action) -> bool:
+        """Run `action(pipe)` in a transaction only while `lock_id` still holds the lock."""
+        from redis.exceptions import WatchError
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(lock_key)
+                if await pipe.get(lock_key) != lock_id:
+                    return False
+                pipe.multi()
+                action(pipe)
+                await pipe.execute()
+                return True
+            except WatchError:
+                return False
+
+    @contextlib.asynccontextmanager
+    async def _redis_lock(self, client_token: str):
+        lock_key, lock_id = self._lock_key(client_token), os.urandom(16)
+        delay, longest = STATE_LOCK_POLL_SECONDS
+        while not await self.redis.set(lock_key, lock_id, px=self.lock_ms, nx=True):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, longest)
+
+        async def renew():
+            while True:
+                await asyncio.sleep(self.lock_ms / 3000)
+                if not await self._if_locked(lock_key, lock_id, lambda pipe: pipe.pexpire(lock_key, self.lock_ms)):
+                    return
+
+        renewer = asyncio.create_task(renew())
+        try:
+            yield
+        finally:
+            renewer.cancel()
+            await self._if_locked(lock_key, lock_id, lambda pipe: pipe.delete(lock_key))
+
+    def _load_tree(self, blobs: dict):
+        def splice(fresh, parent):
+            instance = fresh
+            data = blobs.get(fresh.get_full_name().encode())
+            if data is not None:
+                try:
+                    instance = rx.State._deserialize(data)
+                except Exception:
+                    instance = fresh  # Schema changed since it was written; start over
+                else:
+                    instance.substates = fresh.substates
+                    if parent is not None:
+                        parent.substates[fresh.get_name()] = instance
+            instance.parent_state = parent
+            for child in list(instance.substates.values()):
+                splice(child, instance)
+            return instance
+
+        return splice(self.state(_reflex_internal_init=True), None)
+
+    async def _read(self, client_token: str):
+        key = self._key(client_token)
+        cached = self._cache.get(client_token)
+        if cached is not None:
+            version = await self.redis.hget(key, STATE_VERSION_FIELD)
+            if version is not None and int(version) == cached[0]:
+                metrics.inc("state_cache_hits_total")
+                self._cache.move_to_end(client_token)
+                return cached
+        metrics.inc("state_cache_misses_total")
+        blobs = await self.redis.hgetall(key)
+        version = int(blobs.pop(STATE_VERSION_FIELD.encode(), 0))
+        return version, self._load_tree(blobs)
+
+    async def _write(self, client_token: str, state, expected_version):
+        key = self._key(client_token)
+        changed = {}
+        for substate in walk_states(state):
+            if substate._get_was_touched():
+                changed[substate.get_full_name()] = substate._serialize()
+                substate._was_touched = False
+        if not changed:
+            return expected_version
+        from redis.exceptions import WatchError
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(key)
+                current = int(await pipe.hget(key, STATE_VERSION_FIELD) or 0)
+                if expected_version is not None and current != expected_version:
+                    raise WatchError
+                pipe.multi()
+                pipe.hset(key, mapping=changed)
+                pipe.hincrby(key, STATE_VERSION_FIELD, 1)
+                pipe.expire(key, self.token_expiration)
+                version = (await pipe.execute())[1]
+            except WatchError:
+                # Another worker wrote the session, so our lock had expired; its update stands
+                metrics.inc("state_conflicts_total")
+                self._cache.pop(client_token, None)
+                raise LockExpiredError(f"Session lock expired for {client_token}; raise STATE_LOCK_MS") from None
+        self._cache[client_token] = (version, state)
+        self._cache.move_to_end(client_token)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return version
+
+    async def get_state(self, token: str) -> rx.State:
+        return (await self._read(_split_substate_key(token)[0]))[1]
+
+    async def set_state(self, token: str, state: rx.State):
+        await self._write(_split_substate_key(token)[0], state, None)
+
+    @contextlib.asynccontextmanager
+    async def modify_state(self, token: str):
+        client_token = _split_substate_key(token)[0]
+        lock = self._locks.get(client_token)
+        if lock is None:
+            lock = self._locks[client_token] = asyncio.Lock()
+        async with lock, self._redis_lock(client_token):
+            version, state = await self._read(client_token)
+            yield state
+            await self._write(client_token, state, version)
+
+
+def _benchmark_state_worker(url: str, events: int, sessions: int, seed: int):
+    async def run():
+        manager = SharedStateManager(state=rx.State, redis=connect_state_redis(url))
+        rnd = random.Random(seed)
+        for _ in range(events):
+            async with manager.modify_state(f"bench-{rnd.randrange(sessions)}") as root:
+                root.substates[State.get_name()].score += 1
+
+    asyncio.run(run())
+
+
+def benchmark_state_backend(url: str, workers=(1, 2, 4, 8), events: int = 4000, sessions: int = 500):
+    """Events per second through SharedStateManager as the worker count grows.
+
+    Needs a real Redis server (e.g. redis://localhost:6379/15), since the
+    in-process fake is not shared between worker processes.
+    """
+    import multiprocessing
+
+    results = {}
+    for count in workers:
+        with multiprocessing.Pool(count) as pool:
+            start = time.perf_counter()
+            pool.starmap(_benchmark_state_worker, [(url, events // count, sessions, seed) for seed in range(count)])
+            results[count] = events / (time.perf_counter() - start)
+    return results
+
+
+@contextlib.asynccontextmanager
+async def session_store_lifespan():
+    # Share sessions through Redis when configured, otherwise bound the memory or disk store
+    if STATE_REDIS_URL:
+        app._state_manager = SharedStateManager(
+            state=app._state_manager.state, redis=connect_state_redis(STATE_REDIS_URL)
+        )
+    elif type(app._state_manager) is StateManagerMemory:
+        app._state_manager = BoundedStateManager(state=app._state_manager.state)
+    elif type(app._state_manager) is StateManagerDisk:
+        app._state_manager = BoundedDiskStateManager(
+            state=app._state_manager.state, token_expiration=app._state_manager.token_expiration
+        )
+    manager = app._state_manager
+    if isinstance(manager, SessionBounds):
+        for reason in ("lru", "ttl"):
+            metrics.inc(f"session_evictions_{reason}_total", 0)  # Listed in /metrics before the first eviction
+        metrics.gauges["sessions"] = lambda: len(manager.states)
+        metrics.gauges["session_bytes"] = lambda: manager._total_bytes
+
+    async def sweep():
+        while True:
+            await asyncio.sleep(SESSION_SWEEP_SECONDS)
+            manager.evict_idle()
+
+    if not isinstance(manager, (SessionBounds, SharedStateManager)):  # Redis sessions expire by TTL instead
+        print(f"{type(manager).__name__} is not bounded; SESSION_* limits do not apply", file=sys.stderr, flush=True)
+    sweeper = asyncio.create_task(sweep()) if isinstance(manager, SessionBounds) else None
+    try:
+        yield
+    finally:
+        if sweeper is not None:
+            sweeper.cancel()
+
+
+# ---------------------------------------------------------------------------
+# State delta encodings
+# ---------------------------------------------------------------------------
+
+# Encodings compared by `bench-transport`. Only measured: the stock Reflex
+# client decodes nothing but its JSON frames, so the app keeps sending those.
+DELTA_CODECS = ("json", "msgpack", "cbor")
+
+
+@functools.cache
+def _delta_codec(codec: str):
+    """(encode, decode) functions for a codec; msgpack and cbor2 are optional."""
+    if codec == "msgpack":
+        import msgpack
+
+        return (
+            functools.partial(msgpack.packb, default=serialize),
+            functools.partial(msgpack.unpackb, strict_map_key=False),
+        )
+    if codec == "cbor":
+        import cbor2
+
+        return (
+            functools.partial(cbor2.dumps, default=lambda encoder, value: encoder.encode(serialize(value))),
+            cbor2.loads,
+        )
+    return (lambda obj: rx_format.json_dumps(obj).encode()), json.loads
+
+
+def delta_codec_available(codec: str) -> bool:
+    try:
+        _delta_codec(codec)
+    except ImportError:
+        return False
+    return codec in DELTA_CODECS
+
+
+def patch_lists(delta: dict, previous: dict) -> dict:
+    """Replace list values with `{"$patch": [[index, value], ...]}` where that is smaller.
+
+    `previous` holds the last list sent for each (state, var) on this
+    connection. A patch is only sent when the length is unchanged and the
+    patch is clearly shorter than the list; otherwise the full list goes out.
+    """
+    patched = {}
+    for state_name, fields in delta.items():
+        out = {}
+        for var, value in fields.items():
+            if isinstance(value, list):
+                key = (state_name, var)
+                old = previous.get(key)
+                previous[key] = list(value)
+                if old is not None and len(old) == len(value):
+                    changes = [[i, new] for i, (was, new) in enumerate(zip(old, value)) if was != new]
+                    if 2 * len(changes) + 4 < len(value):
+                        out[var] = {"$patch": changes}
+                        continue
+            out[var] = value
+        patched[state_name] = out
+    return patched
+
+
+def encode_update(update, codec: str, previous: dict | None = None) -> bytes:
+    delta = update.delta if previous is None else patch_lists(update.delta, previous)
+    payload = {
+        "delta": delta,
+        "events": [dataclasses.asdict(event) for event in update.events],
+        "final": update.final,
+    }
+    return _delta_codec(codec)[0](payload)
+
+
+def benchmark_transport(rounds: int = 20000) -> dict:
+    """Bytes on the wire and encode/decode CPU per event for each codec.
+
+    Uses State.set_answers deltas (the answers list with one index changed,
+    for this quiz and for a 50-question bank) and a
+    ContactFormState.handle_submit delta (the status string). `deflate`
+    is what permessage-deflate with context takeover would make of each
+    frame, modelled as one raw deflate stream per connection. Whether the
+    server negotiates it depends on the ASGI server; this app does not
+    configure it.
+    """
+    from reflex.state import StateUpdate
+
+    state_name = State.get_full_name()
+    updates = []
+    for size in (len(QUIZ_QUESTIONS), 50):
+        answers = [UNANSWERED] * size
+        for index in range(size):
+            answers = list(answers)
+            answers[index] = 1 << index % 4
+            updates.append(StateUpdate(delta={state_name: {"answers": answers}}))
+    updates.append(StateUpdate(delta={ContactFormState.get_full_name(): {"status": "Suggestion submitted successfully!"}}))
+
+    results = {}
+    for codec in DELTA_CODECS:
+        if not delta_codec_available(codec):
+            continue
+        for patched in (False, True):
+            encode, decode = _delta_codec(codec)
+            previous = {} if patched else None
+            frames = [encode_update(update, codec, previous) for update in updates]
+            deflater = zlib.compressobj(wbits=-15)
+            deflated = sum(len(deflater.compress(frame) + deflater.flush(zlib.Z_SYNC_FLUSH)) - 4 for frame in frames)
+            start = time.process_time()
+            for i in range(rounds):
+                encode_update(updates[i % len(updates)], codec, previous)
+            encode_cpu = (time.process_time() - start) / rounds
+            start = time.process_time()
+            for i in range(rounds):
+                decode(frames[i % len(frames)])
+            decode_cpu = (time.process_time() - start) / rounds
+            results[f"{codec}{'+patch' if patched else ''}"] = {
+                "bytes": sum(map(len, frames)) / len(frames),
+                "deflate": deflated / len(frames),
+                "encode_us": encode_cpu * 1e6,
+                "decode_us": decode_cpu * 1e6,
+            }
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Signed result permalinks
+# ---------------------------------------------------------------------------
+
+RESULT_SIGNING_KEY_FILE = os.getenv("RESULT_SIGNING_KEY_FILE", ".result_signing_key")  # Generated key used in development
+
+
+@functools.cache
+def result_signing_key() -> bytes:
+    """RESULT_SIGNING_KEY, required in production; in development a generated key kept on disk.
+
+    Result links and analytics visitor hashes must verify on every worker and
+    across restarts, so the key can never be per process. Loaded on first use,
+    so CLI commands that never sign anything neither need nor create it.
+    """
+    key = os.getenv("RESULT_SIGNING_KEY", "")
+    if key:
+        return key.encode()
+    if environment.REFLEX_ENV_MODE.get() == rx.constants.Env.PROD:
+        raise RuntimeError("RESULT_SIGNING_KEY must be set in production, with the same value on every worker")
+    try:
+        with open(RESULT_SIGNING_KEY_FILE, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    # Link a fully written file into place, so concurrent workers all end up with the first key
+    scratch = f"{RESULT_SIGNING_KEY_FILE}.{os.getpid()}"
+    with open(scratch, "wb") as f:
+        f.write(os.urandom(32))
+    try:
+        os.link(scratch, RESULT_SIGNING_KEY_FILE)
+        print(f"RESULT_SIGNING_KEY is not set; generated one in {RESULT_SIGNING_KEY_FILE}", file=sys.stderr, flush=True)
+    except FileExistsError:
+        pass
+    finally:
+        os.unlink(scratch)
+    with open(RESULT_SIGNING_KEY_FILE, "rb") as f:
+        return f.read()
+
+
+RESULT_MAC_BYTES = 8  # Truncated HMAC length in each token
+RESULT_TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_-]+")  # Unpadded URL-safe base64, nothing else
+RESULT_CACHE_SECONDS = int(os.getenv("RESULT_CACHE_SECONDS", str(365 * 24 * 3600)))  # A token's page never changes
+
+# Tokens are bound to the question bank, so editing the quiz invalidates old links
+# instead of showing them against the wrong questions.
+QUIZ_FINGERPRINT = bytes.fromhex(QUIZ_VERSION)
+
+
+class ResultToken(NamedTuple):
+    answers: list  # One option bitset per question
+    order: list  # Question order the taker saw
+    offline: bool  # Signed by the plain HTTP endpoint, which anyone can call
+
+
+def _result_mac(payload: bytes, offline: bool = False) -> bytes:
+    key = result_signing_key()
+    if offline:  # A key of its own, so an offline token can never pass as a session's
+        key = hmac.new(key, b"offline", hashlib.sha256).digest()
+    return hmac.new(key, QUIZ_FINGERPRINT + payload, hashlib.sha256).digest()[:RESULT_MAC_BYTES]
+
+
+def sign_result_token(answers, order=None, offline: bool = False) -> str:
+    """Encode answer bitsets (one byte each, up to eight options), the question order
+    the taker saw (one byte each, omitted when canonical) and an HMAC as a URL-safe token."""
+    payload = bytes(answers) + (bytes(order) if order is not None and list(order) != sorted(order) else b"")
+    return base64.urlsafe_b64encode(payload + _result_mac(payload, offline)).rstrip(b"=").decode()
+
+
+def decode_result_token(token: str):
+    """A ResultToken, or None if the token is malformed or not ours.
+
+    Only the exact string sign_result_token produces is accepted, so a result
+    has one token: it is the page's cache key, ETag and leaderboard identity.
+    """
+    if not isinstance(token, str) or not RESULT_TOKEN_PATTERN.fullmatch(token):
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (ValueError, TypeError):
+        return None
+    payload, mac = raw[:-RESULT_MAC_BYTES], raw[-RESULT_MAC_BYTES:]
+    size = len(QUIZ_QUESTIONS)
+    if len(payload) not in (size, 2 * size):
+        return None
+    if hmac.compare_digest(mac, _result_mac(payload)):
+        offline = False
+    elif hmac.compare_digest(mac, _result_mac(payload, offline=True)):
+        offline = True
+    else:
+        return None
+    answers, order = list(payload[:size]), list(payload[size:]) or list(range(size))
+    if not valid_answers(answers) or not valid_order(order) or sign_result_token(answers, order, offline) != token:
+        return None  # Also rejects stray padding bits and an explicit canonical order
+    return ResultToken(answers, order, offline)
+
+
+def verify_result_token(token: str):
+    """The answer bitsets in a token, or None if it is malformed or not ours."""
+    decoded = decode_result_token(token)
+    return None if decoded is None else decoded.answers
+
+
+def valid_answers(answers) -> bool:
+    """Whether `answers` is one bitset per question, naming only options that exist."""
+    if not isinstance(answers, list) or len(answers) != len(QUIZ_QUESTIONS):
+        return False
+    for answer, q in zip(answers, QUIZ_QUESTIONS):
+        if type(answer) is not int or answer < 0 or answer >> len(q.options):
+            return False
+        if not q.multi and answer & (answer - 1):
+            return False  # Several picks for a single-choice question
+    return True
+
+
+def valid_order(order) -> bool:
+    return isinstance(order, list) and all(type(i) is int for i in order) and sorted(order) == list(range(len(QUIZ_QUESTIONS)))
+
+
+def result_permalink(answers, order=None, offline: bool = False) -> str:
+    return f"{config.api_url}/results/{sign_result_token(answers, order, offline)}"
+
+
+@functools.lru_cache(maxsize=RESULT_CACHE_SIZE)
+def render_result_page(token: str) -> str:
+    """The results page for a verified token, as a standalone HTML document."""
+    answers, order, offline = decode_result_token(token)
+    marks = cached_result_view(correctness_mask(answers), len(QUIZ_QUESTIONS))
+    rows = "".join(  # Numbered in the order the taker saw the questions
+        f"<tr><td>{position + 1}</td><td>{marks[index]}</td>"
+        f"<td>{html.escape(answer_label(QUIZ_QUESTIONS[index], answers[index]))}</td>"
+        f"<td>{html.escape(answer_label(QUIZ_QUESTIONS[index], QUIZ_QUESTIONS[index].key))}</td></tr>"
+        for position, index in enumerate(order)
+    )
+    join = (
+        "<p>Results submitted offline cannot join the leaderboard.</p>"
+        if offline
+        else f'<form method="post" action="/results/{html.escape(token)}/leaderboard">'
+        f'<input name="name" maxlength="{LEADERBOARD_NAME_LENGTH}" required placeholder="Display name" '
+        'aria-label="Display name"> <button>Add me to the leaderboard</button></form>'
+    )
+    return (
+        '<!DOCTYPE html><html lang="en"><head><meta charset="utf-8">'
+        '<meta name="viewport" content="width=device-width, initial-scale=1">'
+        "<title>AI Quiz Results</title><style>"
+        "body{font-family:sans-serif;background:#F3F4F6;color:black;display:flex;justify-content:center}"
+        "main{max-width:50em;padding:2em}table{border-collapse:collapse;width:100%}"
+        "th,td{border-bottom:1px solid #ccc;padding:.5em;text-align:left}"
+        "</style></head><body><main><h1>Results</h1><p>Below are the results of the quiz.</p><hr>"
+        f"<p>Your score: {quiz_score(answers)}%</p><table><thead><tr><th>#</th><th>Result</th><th>Your Answer</th>"
+        f"<th>Correct Answer</th></tr></thead><tbody>{rows}</tbody></table>"
+        # Rank and the top N are fetched separately so this page itself stays immutable
+        f'<section id="leaderboard"><h2>Leaderboard</h2><p id="rank"></p><ol id="top"></ol>{join}</section>'
+        "<script>"
+        f"fetch({json.dumps('/leaderboard/rank/' + token)})"
+        '.then(r=>r.json()).then(r=>{document.getElementById("rank")'
+        '.textContent=`This score ranks #${r.rank} of ${r.entries}, ahead of ${r.percentile}% of entries.`});'
+        'fetch("/leaderboard").then(r=>r.json()).then(b=>{const top=document.getElementById("top");'
+        'for(const [name,score] of b.top){const li=document.createElement("li");'
+        'li.textContent=`${name}: ${score}%`;top.append(li)}});'
+        "</script>"
+        f'<p><a href="{html.escape(config.deploy_url or "/")}">Back to Home</a> · '
+        '<a href="https://www.proprofs.com/quiz-school/story.php?title=3dq-do-you-know-artificial-intelligence-ai" '
+        'target="_blank">Want to try a different quiz?</a></p></main></body></html>'
+    )
+
+
+async def result_endpoint(request):
+    token = request.path_params["token"]
+    if verify_result_token(token) is None:
+        return PlainTextResponse("Unknown result link\n", status_code=404, headers={"Cache-Control": "no-store"})
+    etag = f'"{token}"'
+    headers = {"Cache-Control": f"public, max-age={RESULT_CACHE_SECONDS}, immutable", "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(render_result_page(token), headers=headers)
+
+
+def benchmark_result_page(requests: int = 5000, sessions: int = 500) -> dict:
+    """Result page loads per second from a signed token vs. from session state.
+
+    The session path does what the Reflex results page costs per load: fetch
+    the session from the state manager and serialize the state it hydrates.
+    """
+    rnd = random.Random(0)
+    submissions = [
+        [rnd.randrange(1 << len(q.options)) if q.multi else 1 << rnd.randrange(len(q.options)) for q in QUIZ_QUESTIONS]
+        for _ in range(sessions)
+    ]
+    tokens = [sign_result_token(answers) for answers in submissions]
+    results = {}
+
+    render_result_page.cache_clear()
+    start = time.perf_counter()
+    for i in range(requests):
+        token = tokens[i % sessions]
+        if verify_result_token(token) is not None:  # As result_endpoint does
+            render_result_page(token)
+    results["token"] = {"pages_per_s": requests / (time.perf_counter() - start), "session_bytes": 0}
+
+    async def run_sessions():
+        manager = StateManagerMemory(state=rx.State)
+        for i, answers in enumerate(submissions):
+            async with manager.modify_state(f"bench-{i}") as root:
+                quiz = root.substates[State.get_name()]
+                quiz.answers = answers
+                quiz.submit()
+        start = time.perf_counter()
+        for i in range(requests):
+            async with manager.modify_state(f"bench-{i % sessions}") as root:
+                rx_format.json_dumps(root.dict())
+        elapsed = time.perf_counter() - start
+        held = sum(len(root._serialize()) for root in manager.states.values()) / sessions
+        return {"pages_per_s": requests / elapsed, "session_bytes": held}
+
+    results["session"] = asyncio.run(run_sessions())
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Opt-in leaderboard
+# ---------------------------------------------------------------------------
+
+LEADERBOARD_DB = os.getenv("LEADERBOARD_DB", "leaderboard.db")  # SQLite file holding every entry
+LEADERBOARD_SHOW = int(os.getenv("LEADERBOARD_SHOW", "10"))  # Entries shown on result pages
+LEADERBOARD_FLUSH_SECONDS = float(os.getenv("LEADERBOARD_FLUSH_SECONDS", "2"))  # Batch insert interval
+LEADERBOARD_NAME_LENGTH = 24  # Longest display name accepted
+
+
+class Leaderboard:
+    """Leaderboard over integer scores 0-100, with SQLite as the only source of truth.
+
+    Every entry lives in SQLite with an index on (score, id), and a table of
+    entry counts per score is kept in step in the same transaction, so a
+    rank is a sum over at most 101 rows and the top N is one indexed query.
+    All workers therefore agree on ranks and on the top N. Joins are queued
+    and written in batches by the flush task; the UNIQUE entry column makes
+    duplicate joins from any worker a no-op. A flush that lets an entry into
+    the top N bumps a version row, and each worker only re-reads and
+    re-serializes the top N when that version moves.
+    """
+
+    def __init__(self, path: str = LEADERBOARD_DB):
+        self.path = path
+        self.pending: dict = {}  # Entry key -> (name, score, created) not yet written
+        self._view: tuple = (-1, b"", "")  # (top N version, serialized top N, ETag)
+        self._reader = None  # Connection kept open for top(), whose cached path is one tiny query
+        self._reader_lock = threading.Lock()
+
+    def _connect(self):
+        db = sqlite3.connect(self.path)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS leaderboard "
+            "(id INTEGER PRIMARY KEY, entry TEXT UNIQUE, name TEXT, score INTEGER, created REAL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS leaderboard_score ON leaderboard (score DESC, id)")
+        db.execute("CREATE TABLE IF NOT EXISTS leaderboard_counts (score INTEGER PRIMARY KEY, count INTEGER)")
+        db.execute("CREATE TABLE IF NOT EXISTS leaderboard_top (id INTEGER PRIMARY KEY CHECK (id = 0), version INTEGER)")
+        return db
+
+    def load(self):
+        """Create the tables, and rebuild the per-score counts if they disagree with the entries."""
+        with contextlib.closing(self._connect()) as db, db:
+            db.execute("BEGIN IMMEDIATE")
+            counted = db.execute("SELECT COALESCE(SUM(count), 0) FROM leaderboard_counts").fetchone()[0]
+            if counted != db.execute("SELECT COUNT(*) FROM leaderboard").fetchone()[0]:
+                db.execute("DELETE FROM leaderboard_counts")
+                db.execute("INSERT INTO leaderboard_counts SELECT score, COUNT(*) FROM leaderboard GROUP BY score")
+
+    def stored(self, entry: str) -> bool:
+        with contextlib.closing(self._connect()) as db:
+            return db.execute("SELECT 1 FROM leaderboard WHERE entry = ?", (entry,)).fetchone() is not None
+
+    def add(self, entry: str, name: str, score: int) -> bool:
+        """Queue an entry for the next flush; False if `entry` is already queued."""
+        if entry in self.pending:
+            return False
+        self.pending[entry] = (name, score, time.time())
+        return True
+
+    def take(self) -> dict:
+        batch, self.pending = self.pending, {}
+        return batch
+
+    def restore(self, batch: dict):
+        """Queue a batch that failed to write again; an entry queued since keeps the newer join."""
+        for entry, queued in batch.items():
+            self.pending.setdefault(entry, queued)
+
+    def flush(self) -> int:
+        return self.write(self.take())
+
+    def write(self, batch: dict) -> int:
+        """Write a batch of queued entries in one transaction; returns how many were new."""
+        written = 0
+        if batch:
+            with contextlib.closing(self._connect()) as db, db:
+                db.execute("BEGIN IMMEDIATE")
+                last = db.execute(  # The entry a newcomer has to beat to show up in the top N
+                    "SELECT score FROM leaderboard ORDER BY score DESC, id LIMIT 1 OFFSET ?", (LEADERBOARD_SHOW - 1,)
+                ).fetchone()
+                changes_top = False
+                for entry, (name, score, created) in batch.items():
+                    inserted = db.execute(
+                        "INSERT OR IGNORE INTO leaderboard (entry, name, score, created) VALUES (?, ?, ?, ?)",
+                        (entry, name, score, created),
+                    ).rowcount
+                    if inserted:
+                        db.execute(
+                            "INSERT INTO leaderboard_counts VALUES (?, 1) "
+                            "ON CONFLICT (score) DO UPDATE SET count = count + 1",
+                            (score,),
+                        )
+                        written += 1
+                        changes_top = changes_top or last is None or score > last[0]  # Ties rank by id, so stay below
+                if changes_top:
+                    db.execute(
+                        "INSERT INTO leaderboard_top VALUES (0, 1) ON CONFLICT (id) DO UPDATE SET version = version + 1"
+                    )
+        return written
+
+    def rank(self, score: int) -> dict:
+        """Where `score` places: 1 + entries scoring higher, and the share scoring lower."""
+        with contextlib.closing(self._connect()) as db:
+            above, below, total = db.execute(
+                "SELECT COALESCE(SUM(CASE WHEN score > ? THEN count END), 0), "
+                "COALESCE(SUM(CASE WHEN score < ? THEN count END), 0), COALESCE(SUM(count), 0) FROM leaderboard_counts",
+                (score, score),
+            ).fetchone()
+        percentile = int(below / total * 100) if total else 0  # Avoid division by zero
+        return {"rank": above + 1, "entries": total, "percentile": percentile}
+
+    def top(self) -> tuple:
+        """The top LEADERBOARD_SHOW entries as JSON plus its ETag, re-read only after the top N changed."""
+        cached, view, etag = self._view
+        with self._reader_lock:
+            if self._reader is None:
+                self._reader = sqlite3.connect(self.path, check_same_thread=False)  # Only used under the lock
+            db = self._reader
+            version = db.execute("SELECT COALESCE(MAX(version), 0) FROM leaderboard_top").fetchone()[0]
+            if version != cached:
+                best = db.execute(
+                    "SELECT name, score FROM leaderboard ORDER BY score DESC, id LIMIT ?", (LEADERBOARD_SHOW,)
+                ).fetchall()
+                view = json.dumps({"top": [list(row) for row in best]}).encode()
+                etag = f'"lb-{hashlib.blake2b(view, digest_size=8).hexdigest()}"'  # Same data, same tag on every worker
+                self._view = (version, view, etag)
+        return view, etag
+
+
+leaderboard = Leaderboard()
+
+
+def leaderboard_entry(answers, order) -> str:
+    return hashlib.blake2b(bytes(answers) + bytes(order), digest_size=8).hexdigest()  # One entry per result, whatever the key
+
+
+async def leaderboard_endpoint(request):
+    view, etag = await asyncio.to_thread(leaderboard.top)
+    headers = {"Cache-Control": "public, max-age=5", "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(view, media_type="application/json", headers=headers)
+
+
+async def leaderboard_rank_endpoint(request):
+    answers = verify_result_token(request.path_params["token"])
+    if answers is None:
+        return JSONResponse({"error": "unknown result link"}, status_code=404)
+    rank = await asyncio.to_thread(leaderboard.rank, quiz_score(answers))
+    return JSONResponse(rank, headers={"Cache-Control": "no-store"})
+
+
+async def leaderboard_join_endpoint(request):
+    token = request.path_params["token"]
+    decoded = decode_result_token(token)
+    if decoded is None:
+        return PlainTextResponse("Unknown result link\n", status_code=404)
+    name = " ".join(str((await request.form()).get("name", "")).split())[:LEADERBOARD_NAME_LENGTH]
+    if not name:
+        return PlainTextResponse("Please enter a display name\n", status_code=400)
+    if decoded.offline:
+        return PlainTextResponse("Results submitted offline cannot join the leaderboard\n", status_code=403)
+    entry = leaderboard_entry(decoded.answers, decoded.order)
+    # Say so rather than drop it: identical answers in the same order make the same result
+    if await asyncio.to_thread(leaderboard.stored, entry) or not leaderboard.add(entry, name, quiz_score(decoded.answers)):
+        return PlainTextResponse("This result is already on the leaderboard\n", status_code=409)
+    return RedirectResponse(f"/results/{token}#leaderboard", status_code=303)
+
+
+@contextlib.asynccontextmanager
+async def leaderboard_lifespan():
+    await asyncio.to_thread(leaderboard.load)
+    async with periodic_flush(
+        "leaderboard", LEADERBOARD_FLUSH_SECONDS, leaderboard.take, leaderboard.write, leaderboard.restore
+    ):
+        yield
+
+
+def benchmark_leaderboard(entries: int = 100_000) -> dict:
+    """Queue, batch write, count check, rank and top-N read costs for `entries` scores."""
+    rnd = random.Random(0)
+    scores = [min(100, max(0, int(rnd.gauss(60, 20)))) for _ in range(entries)]
+    with tempfile.TemporaryDirectory() as directory:
+        board = Leaderboard(os.path.join(directory, "bench.db"))
+        board.load()
+        timings = {}
+        start = time.perf_counter()
+        for i, score in enumerate(scores):
+            board.add(f"bench-{i}", "bench", score)
+        timings["add_us"] = (time.perf_counter() - start) / entries * 1e6
+        start = time.perf_counter()
+        board.flush()
+        timings["flush_ms"] = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        board.load()
+        timings["load_ms"] = (time.perf_counter() - start) * 1000
+
+        rounds = 2_000
+        start = time.perf_counter()
+        for i in range(rounds):
+            board.rank(scores[i % entries])
+        timings["rank_us"] = (time.perf_counter() - start) / rounds * 1e6
+        start = time.perf_counter()
+        for _ in range(rounds):
+            board._view = (-1, b"", "")
+            board.top()
+        timings["top_query_us"] = (time.perf_counter() - start) / rounds * 1e6
+        start = time.perf_counter()
+        for _ in range(rounds):
+            board.top()
+        timings["top_cached_us"] = (time.perf_counter() - start) / rounds * 1e6
+    return timings
+
+
+# ---------------------------------------------------------------------------
+# Offline service worker
+# ---------------------------------------------------------------------------
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")  # Served from the site root
+SERVICE_WORKER_FILE = "sw.js"  # Generated by `build-sw` into ASSETS_DIR
+PDF_CACHE_MAX_MB = float(os.getenv("PDF_CACHE_MAX_MB", "50"))  # Browser-side PDF cache quota
+
+# The worker itself. Placeholders are filled in by build_service_worker().
+SERVICE_WORKER_TEMPLATE = """\
+// Generated by `python diss_website.py build-sw`; do not edit.
+const MANIFEST = __MANIFEST__;  // [url, content hash] for every page shell and static asset
+const PDF_QUOTA = __PDF_QUOTA__;  // Bytes of PDFs kept for offline reading
+const SUBMIT_URL = __SUBMIT_URL__;  // Plain HTTP quiz submission endpoint
+const PRECACHE = "precache", RUNTIME = "runtime", PDFS = "pdfs", PDF_INDEX = "/__pdf-index__";
+
+// Cache keys carry the content hash, so a deployment only refetches what changed
+const precached = new Map(MANIFEST.map(([url, hash]) => [url, `${url}?__rev=${hash}`]));
+
+self.addEventListener("install", (event) => {
+  event.waitUntil((async () => {
+    const cache = await caches.open(PRECACHE);
+    await Promise.all([...precached].map(async ([url, key]) => {
+      if (await cache.match(key)) return;
+      const response = await fetch(url, {cache: "reload"});
+      if (response.ok) await cache.put(key, response);
+    }));
+    await self.skipWaiting();
+  })());
+});
+
+self.addEventListener("activate", (event) => {
+  event.waitUntil((async () => {
+    const cache = await caches.open(PRECACHE);
+    const keep = new Set([...precached.values()].map((key) => new URL(key, self.location.origin).href));
+    for (const request of await cache.keys()) if (!keep.has(request.url)) await cache.delete(request);
+    await caches.delete(RUNTIME);  // Build chunks are per deployment
+    await self.clients.claim();
+  })());
+});
+
+self.addEventListener("fetch", (event) => {
+  const request = event.request;
+  const url = new URL(request.url);
+  if (request.method === "POST" && request.url === SUBMIT_URL) return event.respondWith(submitOrQueue(request));
+  if (request.method !== "GET" || url.origin !== self.location.origin) return;
+  if (url.pathname.toLowerCase().endsWith(".pdf")) return event.respondWith(pdf(event, url.href));
+  if (url.pathname.startsWith("/_next/static/")) return event.respondWith(cacheFirst(request));
+  const key = precached.get(url.pathname.replace(/(.)\\/$/, "$1"));
+  if (key) event.respondWith(caches.match(key).then((cached) => cached || fetch(request)));
+});
+
+async function cacheFirst(request) {
+  const cache = await caches.open(RUNTIME);
+  const cached = await cache.match(request);
+  if (cached) return cached;
+  const response = await fetch(request);
+  if (response.ok) await cache.put(request, response.clone());
+  return response;
+}
+
+// PDFs: stale-while-revalidate, kept under PDF_QUOTA by evicting the least recently read
+let pdfIndexQueue = Promise.resolve();
+function withPdfIndex(update) {
+  pdfIndexQueue = pdfIndexQueue.then(async () => {
+    const cache = await caches.open(PDFS);
+    const stored = await cache.match(PDF_INDEX);
+    const index = stored ? await stored.json() : {};
+    await update(cache, index);
+    await cache.put(PDF_INDEX, new Response(JSON.stringify(index)));
+  }).catch(() => {});
+  return pdfIndexQueue;
+}
+
+async function storePdf(url, response) {
+  const size = (await response.clone().blob()).size;
+  if (size > PDF_QUOTA) return;
+  await withPdfIndex(async (cache, index) => {
+    await cache.put(url, response);
+    index[url] = {size, used: Date.now()};
+    let total = Object.values(index).reduce((sum, entry) => sum + entry.size, 0);
+    for (const [other] of Object.entries(index).sort((a, b) => a[1].used - b[1].used)) {
+      if (total <= PDF_QUOTA) break;
+      if (other === url) continue;
+      await cache.delete(other);
+      total -= index[other].size;
+      delete index[other];
+    }
+  });
+}
+
+async function pdf(event, url) {
+  const cached = await (await caches.open(PDFS)).match(url);
+  const refresh = fetch(url).then(async (response) => {
+    if (response.status === 200) await storePdf(url, response.clone());
+    return response;
+  }).catch(() => null);
+  if (!cached) return (await refresh) || Response.error();
+  event.waitUntil(refresh);
+  event.waitUntil(withPdfIndex(async (cache, index) => { if (index[url]) index[url].used = Date.now(); }));
+  return cached;
+}
+
+// Quiz submissions made offline wait in IndexedDB until the network is back
+function submissions(mode, action) {
+  return new Promise((resolve, reject) => {
+    const open = indexedDB.open("quiz-queue", 1);
+    open.onupgradeneeded = () => open.result.createObjectStore("submissions", {autoIncrement: true});
+    open.onerror = () => reject(open.error);
+    open.onsuccess = () => {
+      const transaction = open.result.transaction("submissions", mode);
+      const request = action(transaction.objectStore("submissions"));
+      transaction.oncomplete = () => resolve(request.result);
+      transaction.onerror = () => reject(transaction.error);
+    };
+  });
+}
+
+async function submitOrQueue(request) {
+  const body = await request.clone().text();
+  try {
+    return await fetch(request);
+  } catch (error) {
+    await submissions("readwrite", (store) => store.add(body));
+    if (self.registration.sync) await self.registration.sync.register("quiz-submit").catch(() => {});
+    return new Response(JSON.stringify({queued: true}), {status: 202, headers: {"Content-Type": "application/json"}});
+  }
+}
+
+async function replaySubmissions() {
+  for (const key of await submissions("readonly", (store) => store.getAllKeys())) {
+    const body = await submissions("readonly", (store) => store.get(key));
+    let response;
+    try {
+      response = await fetch(SUBMIT_URL, {method: "POST", headers: {"Content-Type": "application/json"}, body});
+    } catch (error) {
+      return;  // Still offline; try again on the next sync
+    }
+    await submissions("readwrite", (store) => store.delete(key));
+    if (!response.ok) continue;
+    const {result} = await response.json();
+    for (const client of await self.clients.matchAll()) client.postMessage({type: "quiz-submitted", result});
+  }
+}
+
+self.addEventListener("sync", (event) => {
+  if (event.tag === "quiz-submit") event.waitUntil(replaySubmissions());
+});
+
+self.addEventListener("message", (event) => {
+  if (event.data.type === "online") event.waitUntil(replaySubmissions());
+  // Pages report the build chunks they loaded before this worker took control
+  if (event.data.type === "warm") {
+    event.waitUntil(Promise.all(event.data.urls.map((url) => cacheFirst(new Request(url)).catch(() => {}))));
+  }
+});
+"""
+
+# Registers the worker from every page, and submits the quiz over HTTP when offline
+SERVICE_WORKER_CLIENT_SCRIPT = f"""
+if ("serviceWorker" in navigator && !window.serviceWorkerStarted) {{
+  window.serviceWorkerStarted = true;
+  navigator.serviceWorker.register("/{SERVICE_WORKER_FILE}").then(() => navigator.serviceWorker.ready).then((registration) => {{
+    const urls = performance.getEntriesByType("resource").map((entry) => entry.name)
+      .filter((url) => url.startsWith(location.origin + "/_next/static/"));
+    registration.active.postMessage({{type: "warm", urls}});
+    registration.active.postMessage({{type: "online"}});
+  }}).catch(() => {{}});
+  window.addEventListener("online", () => {{
+    if (navigator.serviceWorker.controller) navigator.serviceWorker.controller.postMessage({{type: "online"}});
+  }});
+  navigator.serviceWorker.addEventListener("message", (event) => {{
+    if (event.data.type === "quiz-submitted" && location.pathname.startsWith("/resources/user-experiences")) {{
+      location.href = event.data.result;
+    }}
+  }});
+}}
+window.submitQuizOffline = function () {{
+  const answers = new Array({len(QUIZ_QUESTIONS)}).fill(0), order = [];
+  for (const question of document.querySelectorAll("[data-question]")) {{
+    order.push(Number(question.dataset.question));  // Rendered in this session's order
+    for (const option of question.querySelectorAll('[data-option][data-state="checked"]')) {{
+      answers[Number(question.dataset.question)] |= 1 << Number(option.dataset.option);
+    }}
+  }}
+  const body = JSON.stringify({{answers, order}});
+  fetch("{config.api_url}/quiz/submit", {{method: "POST", headers: {{"Content-Type": "application/json"}}, body}})
+    .then((response) => response.json())
+    .then((body) => body.result ? (location.href = body.result)
+      : alert("You are offline. Your answers are saved and will be submitted when you reconnect."));
+}};
+// Offline, Reflex events only sit in the socket buffer (and block the event queue, so
+// a call_script would wait behind them too); take the click before React sees it
+if (!window.quizSubmitGuard) {{
+  window.quizSubmitGuard = true;
+  window.addEventListener("click", (event) => {{
+    if (navigator.onLine || !event.target.closest || !event.target.closest("#quiz-submit-button")) return;
+    event.preventDefault();
+    event.stopImmediatePropagation();
+    window.submitQuizOffline();
+  }}, true);
+}}
+"""
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def precache_manifest() -> list:
+    """[url, content hash] for every registered page shell and every static asset except PDFs.
+
+    Page hashes are taken from the compiled page code. Reflex derives some
+    generated names from `random` and object hashes and iterates sets, so those
+    names are renumbered before hashing and builds need a fixed PYTHONHASHSEED
+    (the `build-sw` command sets it).
+    """
+    from reflex.compiler import compiler
+
+    entries = []
+    saved = random.getstate()
+    for route, page in app._unevaluated_pages.items():
+        random.seed(route)  # Same generated names on every build
+        component = page.component() if callable(page.component) else page.component
+        code = compiler.compile_page(route, component, rx.State)[1]
+        names: dict = {}
+        code = re.sub(
+            r"\b([A-Za-z]\w*?)_[0-9a-f]{16,32}\b",
+            lambda match: names.setdefault(match.group(0), f"{match.group(1)}_{len(names)}"),
+            code,
+        )
+        entries.append(["/" if route == "index" else f"/{route}", content_hash(code.encode())])
+    random.setstate(saved)
+    fingerprinted = load_asset_manifest()["files"]  # Run `fingerprint-assets` first
+    for name in sorted(os.listdir(ASSETS_DIR)):
+        path = os.path.join(ASSETS_DIR, name)
+        if name in (SERVICE_WORKER_FILE, ASSET_MANIFEST_FILE) or name.lower().endswith(".pdf") or not os.path.isfile(path):
+            continue  # PDFs are cached on first download instead
+        with open(path, "rb") as f:
+            # The pages reference the hashed name, so that is the URL worth caching
+            entries.append([fingerprinted.get(f"/{name}", f"/{name}"), content_hash(f.read())])
+    return entries
+
+
+def build_service_worker() -> dict:
+    """Write assets/sw.js with a fresh precache manifest."""
+    manifest = precache_manifest()
+    script = (
+        SERVICE_WORKER_TEMPLATE.replace("__MANIFEST__", json.dumps(manifest))
+        .replace("__PDF_QUOTA__", str(int(PDF_CACHE_MAX_MB * 1024 * 1024)))
+        .replace("__SUBMIT_URL__", json.dumps(f"{config.api_url}/quiz/submit"))
+    )
+    with open(os.path.join(ASSETS_DIR, SERVICE_WORKER_FILE), "w") as f:
+        f.write(script)
+    asset_bytes = sum(
+        os.path.getsize(os.path.join(ASSETS_DIR, url.lstrip("/")))
+        for url, _ in manifest
+        if os.path.isfile(os.path.join(ASSETS_DIR, url.lstrip("/")))
+    )
+    return {"entries": len(manifest), "asset_bytes": asset_bytes, "worker_bytes": len(script)}
+
+
+async def quiz_submit_endpoint(request):
+    """Score answers posted over HTTP (submissions queued while offline) and return their permalink.
+
+    Nothing ties this request to a quiz session, so it would sign any answers
+    anyone posts; its tokens are marked offline and cannot join the leaderboard.
+    """
+    try:
+        body = await request.json()
+        answers, order = body["answers"], body.get("order")
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JSONResponse({"error": 'expected {"answers": [...], "order": [...]}'}, status_code=400)
+    if not valid_answers(answers) or not (order is None or valid_order(order)):
+        return JSONResponse({"error": "invalid answers"}, status_code=400)
+    return JSONResponse({"result": result_permalink(answers, order, offline=True), "score": quiz_score(answers)})
+
+
+# ---------------------------------------------------------------------------
+# Precompressed static files
+# ---------------------------------------------------------------------------
+
+STATIC_EXPORT_DIR = os.path.join(".web", "_static")  # Where `reflex export` puts the built frontend
+PRECOMPRESS_DIRS = (STATIC_EXPORT_DIR, "CV_refinement", "assets")  # Directories `precompress` walks by default
+PRECOMPRESS_EXTENSIONS = frozenset(
+    {".html", ".js", ".mjs", ".css", ".json", ".map", ".svg", ".txt", ".xml", ".ico", ".webmanifest"}
+)  # Text-like files worth compressing; images and PDFs are already compressed
+PRECOMPRESS_MIN_BYTES = 256  # Smaller files are not worth a second request header
+PRECOMPRESSED_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))  # In order of preference
+
+
+def _brotli():
+    try:
+        import brotli  # Optional; without it only .gz siblings are written
+    except ImportError:
+        return None
+    return brotli
+
+
+def _encoders(data: bytes, brotli) -> dict:
+    """Deferred compressors for `data`, at the settings used for every precompressed variant."""
+    encoders = {"gzip": lambda: gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli:
+        encoders["br"] = lambda: brotli.compress(data, quality=11)
+    return encoders
+
+
+def precompress(directories=PRECOMPRESS_DIRS) -> dict:
+    """Write .br and .gz siblings at maximum compression next to every text asset.
+
+    Siblings that are not smaller than the original are skipped, and ones
+    already newer than their source are left alone.
+    """
+    brotli = _brotli()
+    totals = {"files": 0, "bytes": 0, "gzip": 0, "br": 0, "seconds": 0.0}
+    start = time.process_time()
+    for directory in directories:
+        for root, _, names in os.walk(directory):
+            for name in names:
+                path = os.path.join(root, name)
+                if os.path.splitext(name)[1].lower() not in PRECOMPRESS_EXTENSIONS:
+                    continue
+                with open(path, "rb") as f:
+                    data = f.read()
+                if len(data) < PRECOMPRESS_MIN_BYTES:
+                    continue
+                totals["files"] += 1
+                totals["bytes"] += len(data)
+                encoders = _encoders(data, brotli)
+                for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+                    sibling = path + suffix
+                    if encoding not in encoders:
+                        continue
+                    if os.path.exists(sibling) and os.path.getmtime(sibling) >= os.path.getmtime(path):
+                        totals[encoding] += os.path.getsize(sibling)
+                        continue
+                    compressed = encoders[encoding]()
+                    if len(compressed) >= len(data):
+                        continue
+                    with open(sibling, "wb") as f:
+                        f.write(compressed)
+                    totals[encoding] += len(compressed)
+    totals["seconds"] = time.process_time() - start
+    return totals
+
+
+def accepted_encodings(header: str) -> set:
+    """Content codings an Accept-Encoding header allows (q=0 excludes one)."""
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = params.strip().removeprefix("q=")
+        if coding and not (params and quality.replace(".", "", 1).isdigit() and float(quality) == 0):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that answers with a .br/.gz sibling when the client accepts it.
+
+    The file goes out as a FileResponse, so servers that support the ASGI
+    pathsend extension (e.g. Granian) send it without copying through Python.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+        response = None
+        for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+            sibling = f"{full_path}{suffix}"
+            if encoding not in accepted or not os.path.isfile(sibling):
+                continue
+            sibling_stat = os.stat(sibling)
+            if sibling_stat.st_mtime < stat_result.st_mtime:
+                continue  # Stale: the source changed after `precompress` ran
+            response = FileResponse(
+                sibling,
+                status_code=status_code,
+                stat_result=sibling_stat,
+                media_type=mimetypes.guess_type(str(full_path))[0] or "application/octet-stream",
+                headers={"Content-Encoding": encoding},
+            )
+            break
+        if response is None:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        response.headers["Vary"] = "Accept-Encoding"
+        if f"{os.sep}_v{os.sep}" in str(full_path):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL  # Fingerprinted; see fingerprint_assets()
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+async def asgi_get(asgi_app, path: str, headers: list, extensions: dict | None = None) -> int:
+    """Send one GET straight to an ASGI app and return the body bytes it sent, counting pathsend files."""
+    sent = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal sent
+        if message["type"] == "http.response.body":
+            sent += len(message.get("body", b""))
+        elif message["type"] == "http.response.pathsend":
+            sent += os.path.getsize(message["path"])
+
+    scope = {
+        "type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": headers, "http_version": "1.1",
+        "scheme": "http", "server": ("bench", 80), "client": ("bench", 1), "extensions": extensions or {},
+        "asgi": {"version": "3.0", "spec_version": "2.4"},  # No disconnect listener needed
+    }
+    await asgi_app(scope, receive, send)
+    return sent
+
+
+def benchmark_precompressed(directory: str = "CV_refinement", rounds: int = 200) -> dict:
+    """Server CPU per request and bytes sent, for on-the-fly gzip vs. precompressed siblings.
+
+    Run `precompress` first. Requests go straight into the ASGI app, so the
+    CPU is the server's own. The pathsend row is a server that sends files
+    itself, where Python only hands over the path.
+    """
+    from starlette.middleware import Middleware as StarletteMiddleware
+    from starlette.middleware.gzip import GZipMiddleware
+
+    names = [
+        name
+        for name in sorted(os.listdir(directory))
+        if os.path.splitext(name)[1].lower() in PRECOMPRESS_EXTENSIONS
+    ]
+    plain = Starlette(routes=[Mount("/", StaticFiles(directory=directory))])
+    on_the_fly = Starlette(
+        routes=[Mount("/", StaticFiles(directory=directory))], middleware=[StarletteMiddleware(GZipMiddleware)]
+    )
+    precompressed = Starlette(routes=[Mount("/", PrecompressedStaticFiles(directory=directory))])
+    setups = {
+        "identity": (plain, "identity", {}),
+        "gzip on the fly": (on_the_fly, "gzip", {}),
+        "precompressed gzip": (precompressed, "gzip", {}),
+        "precompressed br": (precompressed, "br, gzip", {}),
+        "precompressed br, pathsend": (precompressed, "br, gzip", {"http.response.pathsend": {}}),
+    }
+
+    async def run():
+        results = {}
+        for label, (static_app, accept, extensions) in setups.items():
+            sent = 0
+            start = time.process_time()
+            for _ in range(rounds):
+                for name in names:
+                    sent += await asgi_get(static_app, f"/{name}", [(b"accept-encoding", accept.encode())], extensions)
+            results[label] = {
+                "cpu_us": (time.process_time() - start) / (rounds * len(names)) * 1e6,
+                "bytes": sent / rounds,
+            }
+        return results
+
+    return asyncio.run(run())
+
+
+# ---------------------------------------------------------------------------
+# Self-hosted web fonts
+# ---------------------------------------------------------------------------
+
+FONT_SOURCE_DIR = os.getenv("FONT_SOURCE_DIR", "fonts")  # Upstream files, e.g. Poppins-Medium.ttf or Lora[wght].ttf
+FONT_OUTPUT_DIR = os.path.join(ASSETS_DIR, "fonts")  # Subsets, fonts.css and fonts.json; served from /fonts
+FONT_MANIFEST_FILE = "fonts.json"
+FONT_STYLESHEET_FILE = "fonts.css"
+FONT_FALLBACKS = {  # Self-hosted family -> (generic family, local face tuned to stand in while it loads)
+    "Poppins": ("sans-serif", "Arial"),
+    "Montserrat": ("sans-serif", "Arial"),
+    "Lora": ("serif", "Times New Roman"),
+}
+FALLBACK_FONT_METRICS = {  # hhea metrics and average character width of the local faces, in font units
+    "Arial": {"units_per_em": 2048, "ascent": 1854, "descent": -434, "line_gap": 67, "avg_width": 904},
+    "Times New Roman": {"units_per_em": 2048, "ascent": 1825, "descent": -443, "line_gap": 87, "avg_width": 819},
+}
+FONT_WEIGHT_NAMES = {
+    100: "Thin", 200: "ExtraLight", 300: "Light", 400: "Regular", 500: "Medium",
+    600: "SemiBold", 700: "Bold", 800: "ExtraBold", 900: "Black",
+}
+TEXT_WEIGHTS = {"light": 300, "regular": 400, "normal": 400, "medium": 500, "bold": 700}  # Radix weight names
+DYNAMIC_TEXT_GLYPHS = "".join(map(chr, range(0x20, 0x7F)))  # Printable ASCII, for text only known at runtime
+
+
+def font_stack(family: str) -> str:
+    """CSS font-family for a self-hosted face, with its metric-adjusted fallback."""
+    generic, _ = FONT_FALLBACKS[family]
+    return f'{family}, "{family} Fallback", {generic}'
+
+
+def _literal(var):
+    return getattr(var, "_var_value", None) if isinstance(var, rx.vars.LiteralVar) else var
+
+
+def font_runs(component, family=None, weight: int = 400, runs=None) -> list:
+    """(family, weight, text, dynamic) for every text node set in a self-hosted family.
+
+    Family and weight are inherited down the tree like CSS. Text held in state
+    vars is reported as dynamic, since only its character set can be guessed.
+    """
+    from reflex.components.base.bare import Bare
+    from reflex.components.radix.themes.typography.heading import Heading
+
+    runs = [] if runs is None else runs
+    stack = _literal(component.style.get("fontFamily"))
+    if isinstance(stack, str):
+        first = stack.split(",")[0].strip().strip("'\"")
+        family = first if first in FONT_FALLBACKS else None
+    declared = _literal(component.style.get("fontWeight", getattr(component, "weight", None)))
+    if declared is None and isinstance(component, Heading):
+        declared = "bold"  # Radix headings default to bold
+    if isinstance(declared, (str, int)):
+        weight = TEXT_WEIGHTS.get(str(declared), int(declared) if str(declared).isdigit() else weight)
+    if isinstance(component, Bare) and family is not None:
+        contents = component.contents
+        if isinstance(contents, rx.vars.LiteralVar) or not isinstance(contents, rx.Var):
+            runs.append((family, weight, str(_literal(contents)), False))
+        else:
+            runs.append((family, weight, DYNAMIC_TEXT_GLYPHS, True))
+    for child in [*component.children, *component._get_components_in_props()]:
+        if isinstance(child, rx.Component):
+            font_runs(child, family, weight, runs)
+    return runs
+
+
+def scan_font_usage() -> dict:
+    """{route: font runs} for every registered page."""
+    return {
+        "/" if route == "index" else f"/{route}": font_runs(page.component() if callable(page.component) else page.component)
+        for route, page in app._unevaluated_pages.items()
+    }
+
+
+def _source_font(directory: str, family: str, weight: int):
+    """Load the upstream face for (family, weight): a static file or an instance of a variable font."""
+    from fontTools.ttLib import TTFont
+
+    for extension in (".ttf", ".otf", ".woff2", ".woff"):
+        path = os.path.join(directory, f"{family}-{FONT_WEIGHT_NAMES[weight]}{extension}")
+        if os.path.exists(path):
+            return TTFont(path)
+    for extension in (".ttf", ".otf", ".woff2"):
+        path = os.path.join(directory, f"{family}[wght]{extension}")
+        if os.path.exists(path):
+            from fontTools.varLib import instancer
+
+            return instancer.instantiateVariableFont(TTFont(path), {"wght": weight})
+    return None
+
+
+def _unicode_range(chars) -> str:
+    points = sorted(map(ord, chars))
+    ranges = []
+    for point in points:
+        if ranges and point == ranges[-1][1] + 1:
+            ranges[-1][1] = point
+        else:
+            ranges.append([point, point])
+    return ",".join(f"U+{start:X}" if start == end else f"U+{start:X}-{end:X}" for start, end in ranges)
+
+
+def _woff2_bytes(font) -> bytes:
+    buffer = io.BytesIO()
+    font.flavor = "woff2"
+    font.save(buffer)
+    return buffer.getvalue()
+
+
+def build_fonts(source_dir: str = FONT_SOURCE_DIR) -> dict:
+    """Subset the faces the pages actually use into WOFF2 under assets/fonts.
+
+    Writes fonts.css (swap faces plus size-adjusted local fallbacks) and
+    fonts.json (the faces the shared header uses, for preloading). Returns per-page
+    font bytes before and after subsetting and, as a layout shift estimate, how
+    far the page's text width moves when each face swaps in for its fallback,
+    with plain and with size-adjusted fallbacks.
+    """
+    from fontTools import subset
+
+    pages = scan_font_usage()
+    faces: dict = {}
+    for runs in pages.values():
+        for family, weight, text, _ in runs:
+            faces.setdefault((family, weight), set()).update(text)
+    os.makedirs(FONT_OUTPUT_DIR, exist_ok=True)
+    built, missing, widths, metrics, css = {}, [], {}, {}, []
+    for (family, weight), chars in sorted(faces.items()):
+        font = _source_font(source_dir, family, weight)
+        if font is None:
+            missing.append(f"{family}-{FONT_WEIGHT_NAMES[weight]}")
+            continue
+        cmap, advances = font.getBestCmap(), font["hmtx"].metrics
+        widths[family, weight] = {char: advances[cmap[ord(char)]][0] for char in chars if ord(char) in cmap}
+        metrics[family, weight] = (font["head"].unitsPerEm, font["hhea"].ascent, font["hhea"].descent, font["hhea"].lineGap)
+        full = len(_woff2_bytes(font))
+        options = subset.Options()
+        options.flavor = "woff2"
+        subsetter = subset.Subsetter(options)
+        subsetter.populate(text="".join(sorted(chars)))
+        subsetter.subset(font)
+        data = _woff2_bytes(font)
+        name = f"{family}-{weight}.woff2"
+        with open(os.path.join(FONT_OUTPUT_DIR, name), "wb") as f:
+            f.write(data)
+        built[family, weight] = {"url": f"/fonts/{name}", "bytes": len(data), "full_bytes": full}
+        css.append(
+            f'@font-face{{font-family:"{family}";font-style:normal;font-weight:{weight};font-display:swap;'
+            f'src:url(/fonts/{name}) format("woff2");unicode-range:{_unicode_range(chars)}}}'
+        )
+
+    # One fallback per family, tuned to the face that sets the most text
+    adjust = {}
+    for family in sorted({family for family, _ in widths}):
+        face = max((key for key in widths if key[0] == family), key=lambda key: len(faces[key]))
+        units, ascent, descent, line_gap = metrics[face]
+        local = FALLBACK_FONT_METRICS[FONT_FALLBACKS[family][1]]
+        text = [char for runs in pages.values() for f, w, run, dynamic in runs if (f, w) == face and not dynamic for char in run]
+        average = sum(widths[face].get(char, 0) for char in text) / max(len(text), 1) / units
+        adjust[family] = size_adjust = average / (local["avg_width"] / local["units_per_em"])
+        css.append(
+            f'@font-face{{font-family:"{family} Fallback";src:local("{FONT_FALLBACKS[family][1]}");'
+            f"size-adjust:{size_adjust:.2%};ascent-override:{ascent / units / size_adjust:.2%};"
+            f"descent-override:{-descent / units / size_adjust:.2%};line-gap-override:{line_gap / units / size_adjust:.2%}}}"
+        )
+    with open(os.path.join(FONT_OUTPUT_DIR, FONT_STYLESHEET_FILE), "w") as f:
+        f.write("\n".join(css) + "\n")
+
+    header = {(family, weight) for family, weight, _, _ in font_runs(layout(rx.fragment(), []))}  # On every page
+    with open(os.path.join(FONT_OUTPUT_DIR, FONT_MANIFEST_FILE), "w") as f:
+        json.dump(
+            {
+                "stylesheet": f"/fonts/{FONT_STYLESHEET_FILE}",
+                "preload": sorted(built[face]["url"] for face in header if face in built),
+                "faces": [{"family": family, "weight": weight, **row} for (family, weight), row in sorted(built.items())],
+            },
+            f,
+            indent=1,
+        )
+
+    report = {}
+    for route, runs in pages.items():
+        used = {(family, weight) for family, weight, _, _ in runs} & built.keys()
+        web, fallback = collections.Counter(), collections.Counter()  # Text width in ems per face
+        for family, weight, text, dynamic in runs:
+            if (family, weight) in built and not dynamic:
+                local = FALLBACK_FONT_METRICS[FONT_FALLBACKS[family][1]]
+                web[family, weight] += sum(widths[family, weight].get(char, 0) for char in text) / metrics[family, weight][0]
+                fallback[family, weight] += len(text) * local["avg_width"] / local["units_per_em"]
+        total = sum(web.values())
+        shift = sum(abs(web[face] - fallback[face]) for face in web)
+        adjusted = sum(abs(web[face] - fallback[face] * adjust[face[0]]) for face in web)
+        report[route] = {
+            "faces": len(used),
+            "full_bytes": sum(built[face]["full_bytes"] for face in used),
+            "subset_bytes": sum(built[face]["bytes"] for face in used),
+            "width_shift": shift / total if total else 0.0,
+            "adjusted_width_shift": adjusted / total if total else 0.0,
+        }
+    return {"pages": report, "missing": missing}
+
+
+def load_font_manifest() -> dict:
+    """The manifest written by `build-fonts`, or an empty one before the first build."""
+    try:
+        with open(os.path.join(FONT_OUTPUT_DIR, FONT_MANIFEST_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"stylesheet": None, "preload": [], "faces": []}
+
+
+FONT_MANIFEST = load_font_manifest()
+
+
+# ---------------------------------------------------------------------------
+# Critical CSS
+# ---------------------------------------------------------------------------
+
+CRITICAL_FOLD_ELEMENTS = int(os.getenv("CRITICAL_FOLD_ELEMENTS", "150"))  # Leading <body> elements treated as above the fold
+FCP_MODEL_RTT_MS = 150  # Simulated mobile link (Lighthouse's throttling defaults)
+FCP_MODEL_KBPS = 1600
+CRITICAL_MARKER = "data-critical"  # On the inlined <style>, so pages are only processed once per export
+STYLESHEET_LINK = re.compile(r'<link(?=[^>]*\brel="stylesheet")[^>]*\bhref="([^"]+)"[^>]*/?>')
+PSEUDO_SELECTOR = re.compile(r"::?[\w-]+(\((?:[^()]|\([^()]*\))*\))?")
+
+
+def check_stylesheets(stylesheets=None) -> None:
+    """Raise if any local stylesheet the app references is missing from assets/."""
+    missing = [
+        sheet
+        for sheet in (app.stylesheets if stylesheets is None else stylesheets)
+        if not sheet.startswith(("http://", "https://")) and not os.path.exists(os.path.join(ASSETS_DIR, sheet.lstrip("/")))
+    ]
+    if missing:
+        raise FileNotFoundError(f"missing stylesheets in {ASSETS_DIR}: {', '.join(missing)}")
+
+
+class FoldScanner(html.parser.HTMLParser):
+    """Tags, ids, classes and attributes of the first `limit` elements in <body>."""
+
+    def __init__(self, limit: int):
+        super().__init__()
+        self.limit, self.seen, self.in_body = limit, 0, False
+        self.tags, self.ids, self.classes, self.attrs = {"html", "body", ":root"}, set(), set(), set()
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "body":
+            self.in_body = True
+        if not self.in_body or self.seen >= self.limit:
+            if tag == "html":  # Root classes such as banner-hidden matter before the fold is reached
+                self.classes.update(dict(attrs).get("class", "").split())
+            return
+        self.seen += 1
+        self.tags.add(tag)
+        for name, value in attrs:
+            self.attrs.update({name, (name, value)})
+            if name == "id":
+                self.ids.add(value)
+            elif name == "class":
+                self.classes.update((value or "").split())
+
+
+def _split_top_level(text: str, separator: str) -> list:
+    parts, depth, start = [], 0, 0
+    for index, char in enumerate(text):
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append(text[start:index])
+            start = index + 1
+    return [*parts, text[start:]]
+
+
+def selector_above_fold(selector: str, fold: FoldScanner) -> bool:
+    """Whether the key (rightmost) compound selector can match an element before the fold.
+
+    Ancestors and pseudo-classes are ignored, so this keeps too much rather than too little.
+    """
+    for part in _split_top_level(selector, ","):
+        key = re.split(r"\s*[\s>+~]\s*(?![^\[]*\])", PSEUDO_SELECTOR.sub("", part).strip())[-1] or "*"
+        tag = re.match(r"[\w*-]*", key).group(0)
+        if tag not in ("", "*") and tag.lower() not in fold.tags:
+            continue
+        if not set(re.findall(r"#([\w-]+)", key)) <= fold.ids:
+            continue
+        if not set(re.findall(r"\.([\w-]+)", key)) <= fold.classes:
+            continue
+        attributes = re.findall(r"\[\s*([\w-]+)\s*(?:([~|^$*]?=)\s*[\"']?([^\"'\]]*)[\"']?)?\s*\]", key)
+        if all(
+            ((name, value) if operator == "=" else name) in fold.attrs
+            for name, operator, value in attributes
+        ):
+            return True
+    return False
+
+
+def css_blocks(css: str) -> list:
+    """Top-level (prelude, body) pairs of a stylesheet; statements like @import have a body of None."""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    blocks, index = [], 0
+    while index < len(css):
+        brace, semicolon = css.find("{", index), css.find(";", index)
+        if brace < 0 or 0 <= semicolon < brace and css[index:semicolon].strip().startswith("@"):
+            if css[index:].strip():
+                blocks.append((css[index : semicolon if semicolon >= 0 else len(css)].strip(), None))
+            index = semicolon + 1 if semicolon >= 0 else len(css)
+            continue
+        depth, end = 0, brace
+        for end in range(brace, len(css)):
+            depth += {"{": 1, "}": -1}.get(css[end], 0)
+            if depth == 0:
+                break
+        blocks.append((css[index:brace].strip(), css[brace + 1 : end]))
+        index = end + 1
+    return blocks
+
+
+def critical_css(css: str, fold: FoldScanner) -> str:
+    """The rules of `css` that can style an element above the fold, plus every @font-face."""
+    kept = []
+    for prelude, body in css_blocks(css):
+        if body is None or prelude.startswith(("@keyframes", "@-webkit-keyframes")):
+            continue  # @import would block again; animations can wait for the full sheet
+        if prelude.startswith(("@media", "@supports", "@layer", "@container")):
+            inner = critical_css(body, fold)
+            if inner:
+                kept.append(f"{prelude}{{{inner}}}")
+        elif prelude.startswith("@font-face") or selector_above_fold(prelude, fold):
+            kept.append(re.sub(r"\s+", " ", f"{prelude}{{{body.strip()}}}"))
+    return "".join(kept)
+
+
+def simulated_fcp_ms(html_bytes: int, blocking_bytes: int, blocking_requests: int) -> float:
+    """First contentful paint on the model link: the document, then every render-blocking stylesheet."""
+    transfer_ms = (html_bytes + blocking_bytes) * 8 / FCP_MODEL_KBPS
+    return FCP_MODEL_RTT_MS * (2 + blocking_requests) + transfer_ms  # Connection + document + one round trip per sheet
+
+
+def inline_critical_css(directory: str = STATIC_EXPORT_DIR) -> dict:
+    """Inline each exported page's critical CSS and load its stylesheets asynchronously.
+
+    Fails before touching any page if the app or a page references a
+    stylesheet that is not on disk. Returns per page the render-blocking
+    bytes and the simulated first contentful paint before and after, using
+    gzip transfer sizes.
+    """
+    check_stylesheets()
+    pages, missing = {}, set()
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.endswith(".html"):
+                path = os.path.join(root, name)
+                with open(path) as f:
+                    page = f.read()
+                if CRITICAL_MARKER in page:
+                    continue
+                hrefs = [href for href in STYLESHEET_LINK.findall(page) if not href.startswith(("http://", "https://", "//"))]
+                missing.update(href for href in hrefs if not os.path.isfile(os.path.join(directory, href.lstrip("/"))))
+                pages[path] = (page, hrefs)
+    if missing:
+        raise FileNotFoundError(f"pages in {directory} reference missing stylesheets: {', '.join(sorted(missing))}")
+
+    report = {}
+    for path, (page, hrefs) in pages.items():
+        if not hrefs:
+            continue
+        sheets = {}
+        for href in hrefs:
+            with open(os.path.join(directory, href.lstrip("/"))) as f:
+                sheets[href] = f.read()
+        fold = FoldScanner(CRITICAL_FOLD_ELEMENTS)
+        fold.feed(page)
+        inline = "".join(critical_css(css, fold) for css in sheets.values())
+
+        def deferred(match):
+            href = match.group(1)
+            if href not in sheets:
+                return match.group(0)
+            return (
+                f'<link rel="preload" href="{href}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'">'
+                f'<noscript><link rel="stylesheet" href="{href}"></noscript>'
+            )
+
+        processed = STYLESHEET_LINK.sub(deferred, page).replace(
+            "</head>", f"<style {CRITICAL_MARKER}>{inline}</style></head>", 1
+        )
+        with open(path, "w") as f:
+            f.write(processed)
+        blocking = sum(len(gzip.compress(css.encode())) for css in sheets.values())
+        before = len(gzip.compress(page.encode()))
+        after = len(gzip.compress(processed.encode()))
+        route = "/" + os.path.relpath(path, directory).removesuffix(".html").removesuffix("index").rstrip("/")
+        report[route] = {
+            "blocking_bytes": blocking,
+            "inline_bytes": len(inline),
+            "fcp_before_ms": simulated_fcp_ms(before, blocking, len(sheets)),
+            "fcp_after_ms": simulated_fcp_ms(after, 0, 0),
+        }
+    return report
+
+
+# ---------------------------------------------------------------------------
+# Icon sprite
+# ---------------------------------------------------------------------------
+
+LUCIDE_DIR = os.path.join(".web", "node_modules", "lucide-react", "dist", "esm")  # Installed by Reflex with the frontend
+ICON_SPRITE_FILE = os.path.join(ASSETS_DIR, "icons.svg")  # Generated by `build-icons`, inlined by layout()
+LUCIDE_SYMBOL_ATTRS = (  # lucide-react's default <svg> attributes, minus the size
+    'viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round"'
+)
+
+
+class SvgUse(BaseHTML):
+    """SVG <use>, which rx.el does not provide."""
+
+    tag = "use"
+
+    href: rx.Var[str]
+
+
+def icon_name(tag: str) -> str:
+    """Lucide file name for an rx.icon tag: "circuit_board", "CircuitBoard" and "circuit-board" all give circuit-board."""
+    return rx_format.to_snake_case(tag).replace("_", "-")
+
+
+def load_icon_sprite() -> tuple:
+    """The sprite markup and the names it defines, or ("", empty set) before the first build."""
+    try:
+        with open(ICON_SPRITE_FILE) as f:
+            sprite = f.read()
+    except FileNotFoundError:
+        return "", frozenset()
+    return sprite, frozenset(re.findall(r'<symbol id="icon-([\w-]+)"', sprite))
+
+
+ICON_SPRITE, ICON_SPRITE_NAMES = load_icon_sprite()
+
+
+def icon(tag, size: int = 24, **props) -> rx.Component:
+    """rx.icon, drawn from the inline sprite once `build-icons` has added the tag to it."""
+    if not isinstance(tag, str) or icon_name(tag) not in ICON_SPRITE_NAMES:
+        return rx.icon(tag=tag, size=size, **props)
+    name = icon_name(tag)
+    if "aria_label" not in props:
+        props.setdefault("aria_hidden", "true")
+    return rx.el.svg(
+        SvgUse.create(href=f"#icon-{name}"),
+        width=size,
+        height=size,
+        class_name=f"lucide lucide-{name}",
+        custom_attrs={"data-icon": name},
+        **props,
+    )
+
+
+def collect_icons() -> dict:
+    """{route: icon names} for every registered page, from rx.icon tags and sprite references."""
+    from reflex.components.lucide.icon import Icon
+
+    def walk(component, names):
+        if isinstance(component, Icon):
+            names.add(icon_name(component.tag))
+        elif "data-icon" in component.custom_attrs:
+            names.add(str(_literal(component.custom_attrs["data-icon"])))
+        for child in [*component.children, *component._get_components_in_props()]:
+            if isinstance(child, rx.Component):
+                walk(child, names)
+        return names
+
+    return {
+        "/" if route == "index" else f"/{route}": walk(page.component() if callable(page.component) else page.component, set())
+        for route, page in app._unevaluated_pages.items()
+    }
+
+
+def lucide_icon_files(directory: str = LUCIDE_DIR) -> dict:
+    """{exported component name: icon module path}, including lucide's renamed aliases."""
+    with open(os.path.join(directory, "lucide-react.js")) as f:
+        index = f.read()
+    files = {}
+    for names, module in re.findall(r"export \{([^}]*)\} from '\./icons/([\w-]+)\.js'", index):
+        for name in re.findall(r"default as (\w+)", names):
+            files[name] = os.path.join(directory, "icons", f"{module}.js")
+    return files
+
+
+def lucide_symbol(path: str, name: str) -> str:
+    """A <symbol> with the shapes of one lucide-react icon module."""
+    with open(path) as f:
+        module = f.read()
+    shapes = []
+    for element, attributes in re.findall(r'\[\s*"(\w+)",\s*\{([^}]*)\}\s*\]', module):
+        pairs = [(key, value) for key, value in re.findall(r'(\w+):\s*"([^"]*)"', attributes) if key != "key"]
+        shapes.append(f"<{element} " + " ".join(f'{rx_format.to_kebab_case(key)}="{value}"' for key, value in pairs) + "/>")
+    return f'<symbol id="icon-{name}" {LUCIDE_SYMBOL_ATTRS}>{"".join(shapes)}</symbol>'
+
+
+def build_icon_sprite(directory: str = LUCIDE_DIR) -> dict:
+    """Write assets/icons.svg with a symbol for every icon the pages use.
+
+    Returns the icons, the sprite size and the lucide-react module bytes the
+    page bundles no longer import once every icon comes from the sprite.
+    """
+    names = sorted(set().union(*collect_icons().values()))
+    files = lucide_icon_files(directory)
+    by_name = {icon_name(component): path for component, path in files.items() if not component.endswith("Icon")}
+    missing = [name for name in names if name not in by_name]
+    if missing:
+        raise KeyError(f"lucide-react has no icons named {', '.join(missing)}")
+    sprite = (
+        '<svg xmlns="http://www.w3.org/2000/svg" width="0" height="0" style="position:absolute" aria-hidden="true">'
+        + "".join(lucide_symbol(by_name[name], name) for name in names)
+        + "</svg>"
+    )
+    with open(ICON_SPRITE_FILE, "w") as f:
+        f.write(sprite)
+    runtime = ["createLucideIcon.js", "Icon.js", "defaultAttributes.js", os.path.join("shared", "src", "utils.js")]
+    removed = sum(os.path.getsize(by_name[name]) for name in names) + sum(
+        os.path.getsize(os.path.join(directory, path)) for path in runtime if os.path.exists(os.path.join(directory, path))
+    )
+    return {"icons": names, "sprite_bytes": len(sprite), "module_bytes_removed": removed}
+
+
+# ---------------------------------------------------------------------------
+# Asset fingerprinting
+# ---------------------------------------------------------------------------
+
+CV_REFINEMENT_DIR = os.path.join(os.path.dirname(ASSETS_DIR), "CV_refinement")  # Static site published under /CV_refinement
+FINGERPRINT_DIR = os.path.join(ASSETS_DIR, "_v")  # Content-addressed copies, served from /_v
+ASSET_MANIFEST_FILE = "asset-manifest.json"
+ASSET_GRACE_SECONDS = float(os.getenv("ASSET_GRACE_SECONDS", str(7 * 24 * 3600)))  # How long retired hashes stay servable
+FINGERPRINT_SKIP = frozenset({SERVICE_WORKER_FILE, ASSET_MANIFEST_FILE, "styles.css", "icons.svg"})  # Fixed URLs, or bundled by Reflex
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def load_asset_manifest() -> dict:
+    """{"files": {url: fingerprinted url}, "retired": {fingerprinted url: unix time}}; empty before the first build."""
+    try:
+        with open(os.path.join(ASSETS_DIR, ASSET_MANIFEST_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"files": {}, "retired": {}}
+
+
+ASSET_MANIFEST = load_asset_manifest()
+
+
+def asset_url(path: str) -> str:
+    """The fingerprinted URL of a static file, or `path` itself when it has none."""
+    return ASSET_MANIFEST["files"].get(path, path)
+
+
+def download_asset(path: str) -> list:
+    """rx.download of a fingerprinted file, saved under its plain name and counted by analytics."""
+    return [
+        rx.call_script(f"window.webeducateTrack && webeducateTrack('download', {json.dumps(path)})"),
+        rx.download(url=asset_url(path), filename=os.path.basename(path)),
+    ]
+
+
+def _replace_readable(scratch: str, path: str) -> None:
+    """Move a NamedTemporaryFile (created 0600) over `path` with the mode open() would have given it."""
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(scratch, 0o666 & ~umask)  # 0644 under the usual umask, so a separate web server user can read it
+    os.replace(scratch, path)
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as f:
+        f.write(data)
+    _replace_readable(f.name, path)
+
+
+def rewrite_references(page: str, base: str, files: dict) -> str:
+    """Point href/src attributes that resolve (against the page URL `base`) to a fingerprinted file at its hashed URL."""
+
+    def replace(match):
+        url = urllib.parse.urljoin(base, match.group(2))
+        return f'{match.group(1)}="{files[url]}"' if url in files else match.group(0)
+
+    return re.sub(r'\b(href|src)="([^"#?]+)"', replace, page)
+
+
+def fingerprint_assets(now: float | None = None) -> dict:
+    """Copy assets/ and CV_refinement/ files to content-hashed names under assets/_v and write the manifest.
+
+    CV_refinement's pages keep their URLs: they are published to
+    assets/CV_refinement with href/src rewritten to the hashed names. Hashes
+    dropped by this build stay on disk for ASSET_GRACE_SECONDS, so pages from
+    replicas still on the old build keep working during a rolling deploy;
+    expired ones are deleted. Run it where assets/_v persists between builds,
+    and before `build-sw` so the service worker precaches the hashed names.
+
+    The long-lived immutable Cache-Control on /_v/ is only added by
+    `serve-static` (PrecompressedStaticFiles or PackedStaticFiles); behind
+    any other server, set IMMUTABLE_CACHE_CONTROL for /_v/ there.
+    """
+    now = time.time() if now is None else now
+    previous = load_asset_manifest()
+    sources = [(ASSETS_DIR, "/", name) for name in sorted(os.listdir(ASSETS_DIR))]
+    sources += [(CV_REFINEMENT_DIR, "/CV_refinement/", name) for name in sorted(os.listdir(CV_REFINEMENT_DIR))]
+    files, pages, copied = {}, [], 0
+    for directory, prefix, name in sources:
+        path = os.path.join(directory, name)
+        if not os.path.isfile(path) or name in FINGERPRINT_SKIP or name.endswith((".br", ".gz")):
+            continue
+        if directory == CV_REFINEMENT_DIR and name.endswith(".html"):
+            pages.append((path, f"{prefix}{name}"))
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        stem, extension = os.path.splitext(f"{prefix}{name}")
+        files[f"{prefix}{name}"] = hashed = f"/_v{stem}.{content_hash(data)}{extension}"
+        target = os.path.join(ASSETS_DIR, hashed.lstrip("/"))
+        if not os.path.exists(target):
+            _write_atomic(target, data)
+            copied += 1
+    for path, url in pages:
+        with open(path) as f:
+            page = rewrite_references(f.read(), url, files)
+        _write_atomic(os.path.join(ASSETS_DIR, url.lstrip("/")), page.encode())
+
+    live = set(files.values())
+    retired = {url: at for url, at in previous.get("retired", {}).items() if now - at < ASSET_GRACE_SECONDS}
+    retired.update({url: now for url in set(previous.get("files", {}).values()) - live - retired.keys()})
+    retired = {url: at for url, at in retired.items() if url not in live}
+    removed = 0
+    for root, _, names in os.walk(FINGERPRINT_DIR):
+        for name in names:
+            url = "/" + os.path.relpath(os.path.join(root, name), ASSETS_DIR).replace(os.sep, "/")
+            if url.removesuffix(".br").removesuffix(".gz") not in live | retired.keys():
+                os.remove(os.path.join(root, name))
+                removed += 1
+    manifest = {"files": files, "retired": retired}
+    _write_atomic(os.path.join(ASSETS_DIR, ASSET_MANIFEST_FILE), json.dumps(manifest, indent=1, sort_keys=True).encode())
+    return {"files": len(files), "copied": copied, "pages": len(pages), "retired": len(retired), "removed": removed}
+
+
+# ---------------------------------------------------------------------------
+# Static asset pack
+# ---------------------------------------------------------------------------
+
+STATIC_PACK_FILE = os.getenv("STATIC_PACK_FILE", "static.pack")  # Written by `build-pack`, replaced atomically on deploy
+STATIC_PACK_CHECK_SECONDS = float(os.getenv("STATIC_PACK_CHECK_SECONDS", "2"))  # How often to look for a new pack
+PACK_SOURCES = (("/", ASSETS_DIR), ("/CV_refinement/", CV_REFINEMENT_DIR))  # URL prefix -> directory
+PACK_MAGIC = b"DISSPAK1"
+PACK_HEADER = struct.Struct("<8sQ")  # Magic, then the length of the JSON index that follows
+
+
+def build_pack(sources=PACK_SOURCES, path: str = STATIC_PACK_FILE) -> dict:
+    """Concatenate every static file and its .br/.gz variants into one pack file.
+
+    The index maps each URL to its MIME type and, per content coding, the
+    (offset, length, ETag) of its bytes. Fresh siblings from `precompress`
+    are reused; other text files are compressed here. The pack replaces
+    `path` atomically, so running servers pick it up without a restart.
+    """
+    brotli = _brotli()
+    index, blobs, size = {}, [], 0
+    for prefix, directory in sources:
+        for root, _, names in os.walk(directory):
+            for name in sorted(names):
+                if name.endswith((".br", ".gz")):
+                    continue
+                file_path = os.path.join(root, name)
+                with open(file_path, "rb") as f:
+                    data = f.read()
+                variants = {"identity": data}
+                if os.path.splitext(name)[1].lower() in PRECOMPRESS_EXTENSIONS and len(data) >= PRECOMPRESS_MIN_BYTES:
+                    for encoding, compress in _encoders(data, brotli).items():
+                        sibling = file_path + dict(PRECOMPRESSED_ENCODINGS)[encoding]
+                        if os.path.exists(sibling) and os.path.getmtime(sibling) >= os.path.getmtime(file_path):
+                            with open(sibling, "rb") as f:
+                                variants[encoding] = f.read()
+                        else:
+                            variants[encoding] = compress()
+                url = prefix + os.path.relpath(file_path, directory).replace(os.sep, "/")
+                entry = {}
+                for encoding, blob in variants.items():
+                    if encoding == "identity" or len(blob) < len(data):
+                        entry[encoding] = [size, len(blob), f'"{content_hash(blob)}"']
+                        blobs.append(blob)
+                        size += len(blob)
+                index[url] = [mimetypes.guess_type(name)[0] or "application/octet-stream", entry]
+    encoded = json.dumps(index, separators=(",", ":")).encode()  # Offsets count from the end of the index
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(path)), delete=False) as f:
+        f.write(PACK_HEADER.pack(PACK_MAGIC, len(encoded)))
+        f.write(encoded)
+        for blob in blobs:
+            f.write(blob)
+    _replace_readable(f.name, path)
+    return {"files": len(index), "variants": len(blobs), "bytes": PACK_HEADER.size + len(encoded) + size}
+
+
+class StaticPack:
+    """A memory-mapped pack and its index. Slices are views into the mapping, never copies.
+
+    Responses acquire the pack while they send from it; a retired pack is
+    unmapped when the last of them releases it.
+    """
+
+    def __init__(self, path: str):
+        self.users = 0  # Responses still sending from this pack
+        self.retired = False
+        with open(path, "rb") as f:
+            self.identity = os.fstat(f.fileno())
+            self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mapping)
+        magic, length = PACK_HEADER.unpack_from(self.mapping)
+        if magic != PACK_MAGIC:
+            raise ValueError(f"{path} is not a static pack")
+        self.index = json.loads(bytes(self.view[PACK_HEADER.size : PACK_HEADER.size + length]))
+        for _, variants in self.index.values():
+            for location in variants.values():
+                location[0] += PACK_HEADER.size + length  # Absolute offsets, so requests only slice
+
+    def same_file(self, stat_result) -> bool:
+        return (stat_result.st_ino, stat_result.st_mtime_ns) == (self.identity.st_ino, self.identity.st_mtime_ns)
+
+    def acquire(self) -> None:
+        self.users += 1
+
+    def release(self) -> None:
+        self.users -= 1
+        if self.retired and not self.users:
+            self.close()
+
+    def retire(self) -> None:
+        """Close the pack now if nothing is sending from it, else when the last response releases it."""
+        self.retired = True
+        if not self.users:
+            self.close()
+
+    def close(self) -> None:
+        """Unmap the pack; only once no response is still sending a slice of it."""
+        self.view.release()
+        try:
+            self.mapping.close()
+        except BufferError:
+            pass  # A server still holds a body slice; the mapping goes when that slice does
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Whether an If-None-Match header lists `etag` (weak comparison) or is `*`."""
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+class PackedStaticFiles:
+    """ASGI static file server over a StaticPack: no open() or stat() per request.
+
+    A newer pack at the same path is swapped in at most every
+    STATIC_PACK_CHECK_SECONDS. The old one is retired: responses already
+    sending from it finish, and the last of them closes it.
+    """
+
+    def __init__(self, path: str = STATIC_PACK_FILE):
+        self.path = path
+        self.pack = StaticPack(path)
+        self.checked = time.monotonic()
+
+    def refresh(self) -> None:
+        now = time.monotonic()
+        if now - self.checked < STATIC_PACK_CHECK_SECONDS:
+            return
+        self.checked = now
+        try:
+            stat_result = os.stat(self.path)
+            if not self.pack.same_file(stat_result):
+                old, self.pack = self.pack, StaticPack(self.path)  # Requests see the old or new pack, never a mix
+                old.retire()
+        except (OSError, ValueError):
+            pass  # Keep serving the current pack until a valid one lands
+
+    def lookup(self, pack: StaticPack, path: str):
+        index = pack.index
+        for candidate in (path, f"{path}.html", f"{path.rstrip('/')}/index.html"):
+            if candidate in index:
+                return candidate, index[candidate]
+        return None, index.get("/404.html")
+
+    async def __call__(self, scope, receive, send):
+        if scope.get("method") not in ("GET", "HEAD"):
+            await PlainTextResponse("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})(scope, receive, send)
+            return
+        self.refresh()
+        pack = self.pack
+        pack.acquire()
+        try:
+            await self.respond(pack, scope, receive, send)
+        finally:
+            pack.release()
+
+    async def respond(self, pack: StaticPack, scope, receive, send):
+        request_headers = Headers(scope=scope)
+        url, found = self.lookup(pack, scope["path"])
+        if found is None:
+            await PlainTextResponse("Not Found", status_code=404)(scope, receive, send)
+            return
+        media_type, variants = found
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+        encoding = next((encoding for encoding, _ in PRECOMPRESSED_ENCODINGS if encoding in variants and encoding in accepted), "identity")
+        offset, length, etag = variants[encoding]
+        headers = [
+            (b"content-type", media_type.encode()),
+            (b"etag", etag.encode()),
+            (b"vary", b"Accept-Encoding"),
+            (b"accept-ranges", b"bytes"),
+        ]
+        if encoding != "identity":
+            headers.append((b"content-encoding", encoding.encode()))
+        if url is not None and url.startswith("/_v/"):
+            headers.append((b"cache-control", IMMUTABLE_CACHE_CONTROL.encode()))
+        status = 200 if url is not None else 404
+        if status == 200 and etag_matches(request_headers.get("if-none-match", ""), etag):
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        ranged = re.fullmatch(r"bytes=(\d*)-(\d*)", request_headers.get("range", ""))
+        if ranged and encoding == "identity" and status == 200 and ranged.group(0) != "bytes=-":
+            first, last = ranged.groups()
+            start = length - int(last) if not first else int(first)
+            end = length - 1 if not first or not last else min(int(last), length - 1)
+            if not 0 <= start <= end:
+                await send({"type": "http.response.start", "status": 416, "headers": [(b"content-range", f"bytes */{length}".encode())]})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            headers.append((b"content-range", f"bytes {start}-{end}/{length}".encode()))
+            status, offset, length = 206, offset + start, end - start + 1
+        headers.append((b"content-length", str(length).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        body = b"" if scope.get("method") == "HEAD" else pack.view[offset : offset + length]
+        await send({"type": "http.response.body", "body": body})
+
+
+def benchmark_pack(rounds: int = 200) -> dict:
+    """Server CPU per request for the pack vs. StaticFiles and PrecompressedStaticFiles over the same files.
+
+    Builds a pack of PACK_SOURCES in a temporary directory and requests every
+    file with `Accept-Encoding: br, gzip`, straight into each ASGI app.
+    """
+    with tempfile.TemporaryDirectory() as scratch:
+        pack_path = os.path.join(scratch, "static.pack")
+        build_pack(path=pack_path)
+        packed = PackedStaticFiles(pack_path)
+        urls = list(packed.pack.index)
+        routes = [Mount(prefix.rstrip("/") or "/", StaticFiles(directory=directory)) for prefix, directory in reversed(PACK_SOURCES)]
+        negotiated = [
+            Mount(prefix.rstrip("/") or "/", PrecompressedStaticFiles(directory=directory)) for prefix, directory in reversed(PACK_SOURCES)
+        ]
+        setups = {
+            "StaticFiles": Starlette(routes=routes),
+            "PrecompressedStaticFiles": Starlette(routes=negotiated),
+            "PackedStaticFiles": packed,
+        }
+        headers = [(b"accept-encoding", b"br, gzip")]
+
+        async def run():
+            results = {}
+            for label, asgi_app in setups.items():
+                sent = 0
+                start = time.process_time()
+                for _ in range(rounds):
+                    for url in urls:
+                        sent += await asgi_get(asgi_app, url, headers)
+                seconds = time.process_time() - start
+                results[label] = {
+                    "cpu_us": seconds / (rounds * len(urls)) * 1e6,
+                    "requests_per_s": rounds * len(urls) / seconds,
+                    "bytes": sent / rounds,
+                }
+            return results
+
+        results = asyncio.run(run())
+        packed.pack.close()  # Unmap before the scratch directory goes
+    return results
+
+
+# ---------------------------------------------------------------------------
+# PDF download shaping
+# ---------------------------------------------------------------------------
+
+DOWNLOAD_GLOBAL_LIMIT = int(os.getenv("DOWNLOAD_GLOBAL_LIMIT", "16"))  # PDF transfers sending at once
+DOWNLOAD_CLIENT_LIMIT = int(os.getenv("DOWNLOAD_CLIENT_LIMIT", "2"))  # ... per client address
+DOWNLOAD_QUEUE_LIMIT = int(os.getenv("DOWNLOAD_QUEUE_LIMIT", "64"))  # Transfers allowed to wait; more get a 503
+DOWNLOAD_QUEUE_SECONDS = float(os.getenv("DOWNLOAD_QUEUE_SECONDS", "30"))  # Longest wait for a slot before a 503
+DOWNLOAD_RATE_BYTES = float(os.getenv("DOWNLOAD_RATE_BYTES", str(8 * 1024 * 1024)))  # All PDF transfers together, per second
+DOWNLOAD_CLIENT_RATE_BYTES = float(os.getenv("DOWNLOAD_CLIENT_RATE_BYTES", str(1024 * 1024)))  # One client, per second
+DOWNLOAD_BURST_BYTES = 256 * 1024  # Token bucket depth, so short files are not paced at all
+DOWNLOAD_CHUNK_BYTES = 64 * 1024  # Body slice sent per token bucket draw
+DOWNLOAD_YIELD_SECONDS = 0.005  # Back-off while foreground work is running ...
+DOWNLOAD_YIELD_MAX_SECONDS = 0.25  # ... for at most this long per chunk, so downloads never starve
+
+
+class TokenBucket:
+    """`rate` bytes per second with `burst` bytes of credit.
+
+    Takers draw tokens up front and sleep off any debt, so concurrent takers
+    are paced in arrival order without a lock.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate, self.burst = rate, burst
+        self.tokens, self.updated = burst, time.monotonic()
+
+    async def take(self, amount: int):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate) - amount
+        self.updated = now
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+
+class DownloadManager:
+    """Admission and pacing for PDF transfers served by `serve-static`.
+
+    Transfers wait for a slot under the global and per-client caps, and a
+    freed slot is handed to the longest-waiting transfer that may take it,
+    so new arrivals never jump the queue. Transfers then send in chunks
+    drawn from a per-client and a global token bucket. Before each chunk
+    they back off while other requests to the same server are in flight.
+
+    Scope: this only shapes the static server. The Reflex backend serves
+    neither pages nor PDFs, runs in its own process and has its own
+    connections, so its websocket events are never queued behind a PDF and
+    are not prioritised here either.
+    """
+
+    def __init__(self):
+        self.active = 0
+        self.foreground = 0  # Non-PDF requests in flight through DownloadShaper
+        self.per_client: collections.Counter = collections.Counter()
+        self.client_buckets: dict[str, TokenBucket] = {}
+        self.bucket = TokenBucket(DOWNLOAD_RATE_BYTES, DOWNLOAD_BURST_BYTES)
+        self.waiters: collections.deque = collections.deque()  # (client, future) in arrival order
+
+    @property
+    def queued(self) -> int:
+        return len(self.waiters)
+
+    def has_slot(self, client: str) -> bool:
+        return self.active < DOWNLOAD_GLOBAL_LIMIT and self.per_client[client] < DOWNLOAD_CLIENT_LIMIT
+
+    def _take(self, client: str):
+        self.active += 1
+        self.per_client[client] += 1
+        if client not in self.client_buckets:
+            self.client_buckets[client] = TokenBucket(DOWNLOAD_CLIENT_RATE_BYTES, DOWNLOAD_BURST_BYTES)
+
+    def _hand_off(self):
+        # Oldest first; a waiter held back only by its own per-client cap does not block the rest
+        for waiter in list(self.waiters):
+            if self.active >= DOWNLOAD_GLOBAL_LIMIT:
+                break
+            client, future = waiter
+            if self.has_slot(client):
+                self.waiters.remove(waiter)
+                self._take(client)
+                future.set_result(True)
+
+    async def acquire(self, client: str) -> bool:
+        """Take a transfer slot for `client`; False when the queue is full or the wait times out."""
+        if self.has_slot(client):  # Any slot a waiter could use was already handed off in release()
+            self._take(client)
+            return True
+        if len(self.waiters) >= DOWNLOAD_QUEUE_LIMIT:
+            return False
+        waiter = (client, asyncio.get_running_loop().create_future())
+        self.waiters.append(waiter)
+        try:
+            # Not wait_for: it can swallow a cancel that lands after the hand-off
+            await asyncio.wait((waiter[1],), timeout=DOWNLOAD_QUEUE_SECONDS)
+        except asyncio.CancelledError:
+            if waiter[1].done():
+                self.release(client)  # Handed a slot, but the caller is gone
+            raise
+        finally:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+        return waiter[1].done()  # Done also when handed a slot just as the wait ran out
+
+    def release(self, client: str):
+        self.active -= 1
+        self.per_client[client] -= 1
+        if not self.per_client[client]:
+            del self.per_client[client], self.client_buckets[client]
+        self._hand_off()
+
+    async def pace(self, client: str, size: int):
+        deadline = time.monotonic() + DOWNLOAD_YIELD_MAX_SECONDS
+        while self.foreground and time.monotonic() < deadline:
+            await asyncio.sleep(DOWNLOAD_YIELD_SECONDS)
+        await self.client_buckets[client].take(size)
+        await self.bucket.take(size)
+        metrics.inc("download_bytes_total", size)
+
+
+download_manager = DownloadManager()
+metrics.gauges["downloads_active"] = lambda: download_manager.active
+metrics.gauges["downloads_queued"] = lambda: download_manager.queued
+
+
+class DownloadShaper:
+    """ASGI middleware in front of the `serve-static` handler: PDF GETs go through download_manager.
+
+    Other requests to the same server pass straight through and count as
+    foreground traffic; the Reflex backend is not behind it.
+    PDF bodies are re-sliced (as memoryviews) into paced chunks; pathsend is
+    withheld from them, since a file the server sends itself cannot be paced.
+    """
+
+    def __init__(self, asgi_app, manager: DownloadManager = download_manager):
+        self.app = asgi_app
+        self.manager = manager
+
+    async def __call__(self, scope, receive, send):
+        manager = self.manager
+        if scope["type"] != "http" or scope["method"] != "GET" or not scope["path"].lower().endswith(".pdf"):
+            if scope["type"] != "http":
+                return await self.app(scope, receive, send)
+            manager.foreground += 1
+            try:
+                return await self.app(scope, receive, send)
+            finally:
+                manager.foreground -= 1
+        client = (scope.get("client") or ("unknown",))[0]
+        extensions = {name: value for name, value in (scope.get("extensions") or {}).items() if name != "http.response.pathsend"}
+
+        async def paced_send(message):
+            body = message.get("body", b"")
+            if message["type"] != "http.response.body" or not body:
+                return await send(message)
+            view, more = memoryview(body), message.get("more_body", False)
+            for start in range(0, len(view), DOWNLOAD_CHUNK_BYTES):
+                chunk = view[start : start + DOWNLOAD_CHUNK_BYTES]
+                await manager.pace(client, len(chunk))
+                await send({"type": "http.response.body", "body": chunk, "more_body": more or start + len(chunk) < len(view)})
+
+        acquired = False
+        try:
+            acquired = await manager.acquire(client)
+            if not acquired:
+                metrics.inc("downloads_rejected_total")
+                response = PlainTextResponse("Too many downloads in progress", status_code=503, headers={"Retry-After": "10"})
+                return await response(scope, receive, send)
+            metrics.inc("downloads_total")
+            await self.app({**scope, "extensions": extensions}, receive, paced_send)
+        finally:
+            if acquired:
+                manager.release(client)
+
+
+# ---------------------------------------------------------------------------
+# First-party analytics
+# ---------------------------------------------------------------------------
+
+ANALYTICS_DB = os.getenv("ANALYTICS_DB", "analytics.db")  # SQLite file of per-bucket counters
+ANALYTICS_BUCKET_SECONDS = int(os.getenv("ANALYTICS_BUCKET_SECONDS", "3600"))  # Time bucket width
+ANALYTICS_FLUSH_SECONDS = float(os.getenv("ANALYTICS_FLUSH_SECONDS", "60"))  # How often buckets are merged into SQLite
+ANALYTICS_MAX_EVENTS = 50  # Events accepted per beacon
+ANALYTICS_BEACON_BYTES = 8192  # Largest beacon body read
+HLL_PRECISION = 10  # 2**10 one-byte registers per counter: about 3% error on unique counts
+ANALYTICS_KINDS = frozenset({"view", "download"})
+
+
+class HyperLogLog:
+    """HyperLogLog over 64-bit hashes: fixed-size registers, mergeable by taking the maximum."""
+
+    __slots__ = ("registers",)
+
+    def __init__(self, registers: bytes | None = None):
+        self.registers = bytearray(registers or bytes(1 << HLL_PRECISION))
+
+    def add(self, hashed: int):
+        rest_bits = 64 - HLL_PRECISION
+        rest = hashed & ((1 << rest_bits) - 1)
+        index = hashed >> rest_bits
+        self.registers[index] = max(self.registers[index], rest_bits - rest.bit_length() + 1)
+
+    def merge(self, other: "HyperLogLog"):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self) -> float:
+        size = len(self.registers)
+        raw = 0.7213 / (1 + 1.079 / size) * size * size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        return size * math.log(size / zeros) if raw <= 2.5 * size and zeros else raw  # Linear counting when small
+
+
+class Analytics:
+    """Page-view and download counts with unique visitors, per time bucket.
+
+    Events only touch in-memory counters keyed by (bucket, kind, path), where
+    paths are limited to registered routes and PDFs in assets/ (anything
+    else counts as "other"). Flushing merges them into SQLite and starts
+    over, so memory depends on the number of routes, never on visitors.
+    Visitors are a keyed hash of the day, address and user agent, which is
+    only ever folded into HyperLogLog registers.
+    """
+
+    def __init__(self, path: str = ANALYTICS_DB):
+        self.path = path
+        self.counters: dict = {}  # (bucket, kind, path) -> [count, HyperLogLog]
+        self._paths: dict = {}
+
+    def known_paths(self, kind: str) -> frozenset:
+        if not self._paths:
+            self._paths["view"] = frozenset("/" if route == "index" else f"/{route}" for route in app._unevaluated_pages)
+            self._paths["download"] = frozenset(f"/{name}" for name in os.listdir(ASSETS_DIR) if name.lower().endswith(".pdf"))
+        return self._paths[kind]
+
+    def _connect(self):
+        db = sqlite3.connect(self.path)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS analytics "
+            "(bucket INTEGER, kind TEXT, path TEXT, count INTEGER, visitors BLOB, PRIMARY KEY (bucket, kind, path))"
+        )
+        return db
+
+    def record(self, kind: str, path: str, visitor: int, at: float):
+        path = path.split("?")[0].rstrip("/") or "/"
+        if path not in self.known_paths(kind):
+            path = "other"
+        bucket = int(at) // ANALYTICS_BUCKET_SECONDS * ANALYTICS_BUCKET_SECONDS
+        for key in ((bucket, kind, path), (bucket, "site", "*")):
+            counter = self.counters.get(key)
+            if counter is None:
+                counter = self.counters[key] = [0, HyperLogLog()]
+            if key[1] != "site":  # The site-wide key only tracks visitors
+                counter[0] += 1
+            counter[1].add(visitor)
+
+    def take(self) -> dict:
+        batch, self.counters = self.counters, {}
+        return batch
+
+    def restore(self, batch: dict):
+        """Merge a batch that failed to write back into the counters, so memory stays one entry per key."""
+        for key, (count, visitors) in batch.items():
+            counter = self.counters.get(key)
+            if counter is None:
+                self.counters[key] = [count, visitors]
+            else:
+                counter[0] += count
+                counter[1].merge(visitors)
+
+    def flush(self) -> int:
+        return self.write(self.take())
+
+    def write(self, batch: dict) -> int:
+        """Merge a batch of counters into SQLite in one transaction; returns how many rows changed.
+
+        BEGIN IMMEDIATE takes the write lock before the registers are read,
+        so workers flushing the same key merge one after the other. The
+        batch itself is left as it was, so a failed write can be restored.
+        """
+        if batch:
+            with contextlib.closing(self._connect()) as db, db:
+                db.execute("BEGIN IMMEDIATE")
+                for key, (count, visitors) in batch.items():
+                    row = db.execute(
+                        "SELECT visitors FROM analytics WHERE bucket = ? AND kind = ? AND path = ?", key
+                    ).fetchone()
+                    if row is not None:
+                        stored = HyperLogLog(zlib.decompress(row[0]))
+                        stored.merge(visitors)
+                        visitors = stored
+                    db.execute(
+                        "INSERT INTO analytics VALUES (?, ?, ?, ?, ?) ON CONFLICT (bucket, kind, path) "
+                        "DO UPDATE SET count = count + excluded.count, visitors = excluded.visitors",
+                        (*key, count, zlib.compress(bytes(visitors.registers))),  # Sparse registers compress well
+                    )
+        return len(batch)
+
+    def pending(self) -> list:
+        """A copy of the counters not yet flushed (take it on the event loop)."""
+        return [(key, count, HyperLogLog(visitors.registers)) for key, (count, visitors) in self.counters.items()]
+
+    def summary(self, since: float, pending=()) -> dict:
+        """Counts and unique visitors per kind and path since `since`, from SQLite plus `pending`."""
+        start = int(since) // ANALYTICS_BUCKET_SECONDS * ANALYTICS_BUCKET_SECONDS
+        merged: dict = {}
+        with contextlib.closing(self._connect()) as db:
+            rows = db.execute("SELECT bucket, kind, path, count, visitors FROM analytics WHERE bucket >= ?", (start,))
+            stored = [((bucket, kind, path), count, HyperLogLog(zlib.decompress(blob))) for bucket, kind, path, count, blob in rows]
+        for (bucket, kind, path), count, visitors in [*stored, *pending]:
+            if bucket < start:
+                continue
+            total = merged.setdefault(kind, {}).setdefault(path, [0, HyperLogLog()])
+            total[0] += count
+            total[1].merge(visitors)
+        report = {
+            kind: {path: {"count": count, "visitors": round(visitors.estimate())} for path, (count, visitors) in sorted(paths.items())}
+            for kind, paths in merged.items()
+        }
+        site = report.pop("site", {}).get("*", {"visitors": 0})
+        return {"since": start, "visitors": site["visitors"], **report}
+
+
+analytics = Analytics()
+
+
+@functools.cache
+def analytics_key() -> bytes:
+    return hashlib.blake2b(result_signing_key(), person=b"analytics").digest()  # Same on every worker, like the signing key
+
+
+def visitor_hash(request, at: float) -> int:
+    """A per-day visitor key; addresses and user agents are never stored."""
+    day = int(at // 86400)
+    seed = f"{day}|{request.client.host if request.client else ''}|{request.headers.get('user-agent', '')}"
+    return int.from_bytes(hashlib.blake2b(seed.encode(), key=analytics_key(), digest_size=8).digest(), "big")
+
+
+async def analytics_beacon_endpoint(request):
+    """Record a batch of [kind, path] events sent with navigator.sendBeacon."""
+    body = b""
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > ANALYTICS_BEACON_BYTES:
+            return Response(status_code=413)
+    try:
+        events = json.loads(body)["events"][:ANALYTICS_MAX_EVENTS]
+    except (ValueError, KeyError, TypeError):
+        return Response(status_code=400)
+    now = time.time()
+    visitor = visitor_hash(request, now)
+    for event in events:
+        if isinstance(event, list) and len(event) == 2 and event[0] in ANALYTICS_KINDS and isinstance(event[1], str):
+            analytics.record(event[0], event[1][:200], visitor, now)
+    return Response(status_code=204)
+
+
+async def analytics_summary_endpoint(request):
+    if not admin_authorized(request):
+        return PlainTextResponse("Not Found", status_code=404)
+    try:
+        hours = float(request.query_params.get("hours", "24"))
+    except ValueError:
+        return JSONResponse({"error": "hours must be a number"}, status_code=400)
+    return JSONResponse(await asyncio.to_thread(analytics.summary, time.time() - hours * 3600, analytics.pending()))
+
+
+@contextlib.asynccontextmanager
+async def analytics_lifespan():
+    async with periodic_flush("analytics", ANALYTICS_FLUSH_SECONDS, analytics.take, analytics.write, analytics.restore):
+        yield
+
+
+ANALYTICS_CLIENT_SCRIPT = f"""
+if (!window.webeducateTrack) {{
+  const queue = [];
+  const send = () => {{
+    if (!queue.length) return;
+    const body = JSON.stringify({{events: queue.splice(0, {ANALYTICS_MAX_EVENTS})}});
+    navigator.sendBeacon("{config.api_url}/analytics/beacon", new Blob([body], {{type: "text/plain"}}));
+  }};
+  window.webeducateTrack = (kind, path) => {{
+    queue.push([kind, path]);
+    if (queue.length >= 20) send();
+  }};
+  let last = null;
+  const view = () => {{
+    if (location.pathname !== last) window.webeducateTrack("view", (last = location.pathname));
+  }};
+  for (const method of ["pushState", "replaceState"]) {{
+    const original = history[method];
+    history[method] = function () {{
+      const result = original.apply(this, arguments);
+      view();
+      return result;
+    }};
+  }}
+  window.addEventListener("popstate", view);
+  document.addEventListener("visibilitychange", () => document.visibilityState === "hidden" && send());
+  window.addEventListener("pagehide", send);
+  setInterval(send, 30000);
+  view();
+}}
+"""
+
+
+def benchmark_analytics(visitors=(1_000, 100_000, 1_000_000)) -> dict:
+    """In-memory counter size and unique-visitor error as the number of visitors grows."""
+    routes = sorted(analytics.known_paths("view"))
+    results = {}
+    for count in visitors:
+        sample = Analytics(path=":memory:")
+        sample._paths = analytics._paths
+        start = time.perf_counter()
+        for visitor in range(count):
+            hashed = int.from_bytes(hashlib.blake2b(visitor.to_bytes(8, "big"), digest_size=8).digest(), "big")
+            sample.record("view", routes[visitor % len(routes)], hashed, 0)
+        seconds = time.perf_counter() - start
+        estimate = sample.counters[0, "site", "*"][1].estimate()
+        results[count] = {
+            "record_us": seconds / count * 1e6,
+            "register_bytes": sum(len(visitors.registers) for _, visitors in sample.counters.values()),
+            "error": abs(estimate - count) / count,
+        }
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Real-user Web Vitals
+# ---------------------------------------------------------------------------
+
+VITALS_ACCURACY = 0.01  # DDSketch relative error on every quantile
+VITALS_MAX_BINS = 1024  # Bins kept per sketch; past that the lowest ones merge, so high quantiles stay exact
+VITALS_MAX_SAMPLES = 40  # Samples accepted per beacon
+VITALS_BEACON_BYTES = 4096  # Largest beacon body read
+VITALS_QUANTILES = (0.5, 0.75, 0.95, 0.99)
+VITALS_THRESHOLDS = {  # Metric -> (good, poor) limits on the 75th percentile; ms except CLS
+    "LCP": (2500, 4000),
+    "CLS": (0.1, 0.25),
+    "INP": (200, 500),
+    "FCP": (1800, 3000),
+    "TTFB": (800, 1800),
+    "DCL": (None, None),  # Navigation timing, reported without a rating
+    "load": (None, None),
+}
+VITALS_CEILING = {"CLS": 100.0}  # Drop values no browser reports (anything else: an hour in ms)
+DEVICE_PATTERNS = (("tablet", re.compile(r"iPad|Tablet|Android(?!.*Mobile)")), ("mobile", re.compile(r"Mobi|iPhone|Android")))
+
+
+class DDSketch:
+    """Streaming quantiles with relative accuracy: values land in log-spaced bins, and sketches merge by adding bins."""
+
+    __slots__ = ("bins", "zeros", "count")
+    gamma = (1 + VITALS_ACCURACY) / (1 - VITALS_ACCURACY)
+    log_gamma = math.log(gamma)
+
+    def __init__(self):
+        self.bins: dict = {}  # bin index -> count
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value: float, weight: int = 1):
+        self.count += weight
+        if value <= 1e-9:
+            self.zeros += weight
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.bins[index] = self.bins.get(index, 0) + weight
+        if len(self.bins) > VITALS_MAX_BINS:
+            self._collapse()
+
+    def _collapse(self):
+        indexes = sorted(self.bins)
+        spill = sum(self.bins.pop(index) for index in indexes[: len(indexes) - VITALS_MAX_BINS])
+        self.bins[indexes[len(indexes) - VITALS_MAX_BINS]] += spill
+
+    def merge(self, other: "DDSketch"):
+        self.count += other.count
+        self.zeros += other.zeros
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        if len(self.bins) > VITALS_MAX_BINS:
+            self._collapse()
+
+    def quantile(self, q: float) -> float:
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return 2 * self.gamma**index / (self.gamma + 1)
+        return 0.0
+
+    def to_bytes(self) -> bytes:
+        pairs = [value for item in sorted(self.bins.items()) for value in item]
+        return zlib.compress(struct.pack(f"<Q{len(pairs)}q", self.zeros, *pairs))
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "DDSketch":
+        data = zlib.decompress(blob)
+        sketch = cls()
+        sketch.zeros, *pairs = struct.unpack(f"<Q{(len(data) - 8) // 8}q", data)
+        sketch.bins = dict(zip(pairs[::2], pairs[1::2]))
+        sketch.count = sketch.zeros + sum(sketch.bins.values())
+        return sketch
+
+
+def device_class(request) -> str:
+    agent = request.headers.get("user-agent", "")
+    return next((name for name, pattern in DEVICE_PATTERNS if pattern.search(agent)), "desktop")
+
+
+class Vitals:
+    """Web Vitals quantile sketches per time bucket, route, device class and metric.
+
+    Like Analytics, samples only touch in-memory sketches and flushing merges
+    them into SQLite. Keys are limited to registered routes (else "other"),
+    three device classes and the metrics in VITALS_THRESHOLDS, and each
+    sketch holds at most VITALS_MAX_BINS bins, so a burst of beacons costs
+    CPU but never memory.
+    """
+
+    def __init__(self, path: str = ANALYTICS_DB):
+        self.path = path
+        self.sketches: dict = {}  # (bucket, route, device, metric) -> DDSketch
+
+    def _connect(self):
+        db = sqlite3.connect(self.path)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS vitals "
+            "(bucket INTEGER, route TEXT, device TEXT, metric TEXT, sketch BLOB, PRIMARY KEY (bucket, route, device, metric))"
+        )
+        return db
+
+    def record(self, route: str, device: str, metric: str, value: float, at: float):
+        route = route.split("?")[0].rstrip("/") or "/"
+        if route not in analytics.known_paths("view"):
+            route = "other"
+        key = (int(at) // ANALYTICS_BUCKET_SECONDS * ANALYTICS_BUCKET_SECONDS, route, device, metric)
+        sketch = self.sketches.get(key)
+        if sketch is None:
+            sketch = self.sketches[key] = DDSketch()
+        sketch.add(value)
+
+    def take(self) -> dict:
+        batch, self.sketches = self.sketches, {}
+        return batch
+
+    def restore(self, batch: dict):
+        """Merge a batch that failed to write back into the pending sketches."""
+        for key, sketch in batch.items():
+            pending = self.sketches.get(key)
+            if pending is None:
+                self.sketches[key] = sketch
+            else:
+                pending.merge(sketch)
+
+    def flush(self) -> int:
+        return self.write(self.take())
+
+    def write(self, batch: dict) -> int:
+        """Merge a batch of sketches into SQLite in one transaction; returns how many rows changed.
+
+        As in Analytics.write, BEGIN IMMEDIATE holds the write lock across
+        the read-merge-write so workers sharing the file never drop bins,
+        and the batch is left untouched so a failed write can be restored.
+        """
+        if batch:
+            with contextlib.closing(self._connect()) as db, db:
+                db.execute("BEGIN IMMEDIATE")
+                for key, sketch in batch.items():
+                    row = db.execute(
+                        "SELECT sketch FROM vitals WHERE bucket = ? AND route = ? AND device = ? AND metric = ?", key
+                    ).fetchone()
+                    if row is not None:
+                        stored = DDSketch.from_bytes(row[0])
+                        stored.merge(sketch)
+                        sketch = stored
+                    db.execute("INSERT OR REPLACE INTO vitals VALUES (?, ?, ?, ?, ?)", (*key, sketch.to_bytes()))
+        return len(batch)
+
+    def pending(self) -> list:
+        """A copy of the sketches not yet flushed (take it on the event loop)."""
+        copies = []
+        for key, sketch in self.sketches.items():
+            copy = DDSketch()
+            copy.merge(sketch)
+            copies.append((key, copy))
+        return copies
+
+    def summary(self, since: float, pending=()) -> dict:
+        """Sample counts, quantiles and a p75 rating per route, device class and metric since `since`."""
+        start = int(since) // ANALYTICS_BUCKET_SECONDS * ANALYTICS_BUCKET_SECONDS
+        merged: dict = {}
+        with contextlib.closing(self._connect()) as db:
+            rows = db.execute("SELECT bucket, route, device, metric, sketch FROM vitals WHERE bucket >= ?", (start,))
+            stored = [((bucket, route, device, metric), DDSketch.from_bytes(blob)) for bucket, route, device, metric, blob in rows]
+        for (bucket, route, device, metric), sketch in [*stored, *pending]:
+            if bucket >= start:
+                merged.setdefault(route, {}).setdefault(device, {}).setdefault(metric, DDSketch()).merge(sketch)
+        report: dict = {}
+        for route, devices in sorted(merged.items()):
+            for device, by_metric in sorted(devices.items()):
+                for metric, sketch in sorted(by_metric.items()):
+                    row = {"count": sketch.count}
+                    row.update({f"p{round(q * 100)}": round(sketch.quantile(q), 3) for q in VITALS_QUANTILES})
+                    good, poor = VITALS_THRESHOLDS[metric]
+                    if good is not None:
+                        row["rating"] = "good" if row["p75"] <= good else "poor" if row["p75"] > poor else "needs-improvement"
+                    report.setdefault(route, {}).setdefault(device, {})[metric] = row
+        return {"since": start, "routes": report}
+
+
+vitals = Vitals()
+
+
+async def vitals_beacon_endpoint(request):
+    """Record a batch of [route, metric, value] samples sent with navigator.sendBeacon."""
+    body = b""
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > VITALS_BEACON_BYTES:
+            return Response(status_code=413)
+    try:
+        samples = json.loads(body)["samples"][:VITALS_MAX_SAMPLES]
+    except (ValueError, KeyError, TypeError):
+        return Response(status_code=400)
+    now = time.time()
+    device = device_class(request)
+    recorded = 0
+    for sample in samples:
+        if not (isinstance(sample, list) and len(sample) == 3 and sample[1] in VITALS_THRESHOLDS):
+            continue
+        route, metric, value = sample
+        if isinstance(route, str) and isinstance(value, (int, float)) and 0 <= value <= VITALS_CEILING.get(metric, 3_600_000):
+            vitals.record(route[:200], device, metric, value, now)
+            recorded += 1
+    metrics.inc("vitals_samples_total", recorded)
+    return Response(status_code=204)
+
+
+async def vitals_summary_endpoint(request):
+    if not admin_authorized(request):
+        return PlainTextResponse("Not Found", status_code=404)
+    try:
+        hours = float(request.query_params.get("hours", "24"))
+    except ValueError:
+        return JSONResponse({"error": "hours must be a number"}, status_code=400)
+    return JSONResponse(await asyncio.to_thread(vitals.summary, time.time() - hours * 3600, vitals.pending()))
+
+
+@contextlib.asynccontextmanager
+async def vitals_lifespan():
+    async with periodic_flush("vitals", ANALYTICS_FLUSH_SECONDS, vitals.take, vitals.write, vitals.restore):
+        yield
+
+
+# LCP, FCP, TTFB and navigation timing belong to the landing route and are
+# queued on the first hide; CLS (largest 1 s / 5 s session window) and INP
+# (worst interaction, skipping one per 50) are reported once per route visit,
+# on client-side navigation or the final pagehide, never on a mere tab switch.
+VITALS_CLIENT_SCRIPT = f"""
+if (!window.webeducateVitals && window.PerformanceObserver) {{
+  window.webeducateVitals = true;
+  const queue = [];
+  let route = location.pathname, landing = true, lcp = 0, cls = 0, session = 0, first = 0, previous = 0;
+  let interactions = new Map();
+  const observe = (type, callback, options) => {{
+    try {{
+      new PerformanceObserver((list) => list.getEntries().forEach(callback)).observe({{type, buffered: true, ...options}});
+    }} catch (error) {{}}
+  }};
+  observe("largest-contentful-paint", (entry) => (lcp = entry.startTime));
+  observe("paint", (entry) => entry.name === "first-contentful-paint" && queue.push([route, "FCP", entry.startTime]));
+  observe("layout-shift", (entry) => {{
+    if (entry.hadRecentInput) return;
+    if (session && (entry.startTime - previous > 1000 || entry.startTime - first > 5000)) session = 0;
+    if (!session) first = entry.startTime;
+    session += entry.value;
+    previous = entry.startTime;
+    cls = Math.max(cls, session);
+  }});
+  const interaction = (entry) => {{
+    if (!entry.interactionId) return;
+    interactions.set(entry.interactionId, Math.max(interactions.get(entry.interactionId) || 0, entry.duration));
+  }};
+  observe("event", interaction, {{durationThreshold: 40}});
+  observe("first-input", interaction);
+  const land = () => {{
+    if (landing) {{
+      const nav = performance.getEntriesByType("navigation")[0];
+      if (lcp) queue.push([route, "LCP", lcp]);
+      if (nav) {{
+        queue.push([route, "TTFB", nav.responseStart]);
+        if (nav.domContentLoadedEventEnd) queue.push([route, "DCL", nav.domContentLoadedEventEnd]);
+        if (nav.loadEventEnd) queue.push([route, "load", nav.loadEventEnd]);
+      }}
+      landing = false;
+    }}
+  }};
+  const finish = () => {{
+    queue.push([route, "CLS", cls]);
+    if (interactions.size) {{
+      const worst = [...interactions.values()].sort((a, b) => b - a);
+      queue.push([route, "INP", worst[Math.min(worst.length - 1, Math.floor(worst.length / 50))]]);
+    }}
+    cls = session = 0;
+    interactions = new Map();
+  }};
+  const send = () => {{
+    if (!queue.length) return;
+    const body = JSON.stringify({{samples: queue.splice(0, {VITALS_MAX_SAMPLES})}});
+    navigator.sendBeacon("{config.api_url}/vitals/beacon", new Blob([body], {{type: "text/plain"}}));
+  }};
+  const navigate = () => {{
+    if (location.pathname === route) return;
+    finish();
+    route = location.pathname;
+  }};
+  for (const method of ["pushState", "replaceState"]) {{
+    const original = history[method];
+    history[method] = function () {{
+      const result = original.apply(this, arguments);
+      navigate();
+      return result;
+    }};
+  }}
+  window.addEventListener("popstate", navigate);
+  document.addEventListener("visibilitychange", () => {{
+    if (document.visibilityState === "hidden") {{
+      land();
+      send();
+    }}
+  }});
+  window.addEventListener("pagehide", () => {{
+    land();
+    finish();
+    send();
+  }});
+  window.addEventListener("pageshow", (event) => event.persisted && (cls = session = 0, interactions = new Map()));
+}}
+"""
+
+
+def benchmark_vitals(samples=(10_000, 100_000, 1_000_000)) -> dict:
+    """Ingest cost, sketch memory and p75/p99 error for log-normal LCP samples as traffic grows."""
+    results = {}
+    rng = random.Random(50)
+    for count in samples:
+        sample = Vitals(path=":memory:")
+        values = [rng.lognormvariate(7.6, 0.6) for _ in range(count)]
+        start = time.perf_counter()
+        for value in values:
+            sample.record("/", "mobile", "LCP", value, 0)
+        seconds = time.perf_counter() - start
+        sketch = sample.sketches[0, "/", "mobile", "LCP"]
+        values.sort()
+        results[count] = {
+            "record_us": seconds / count * 1e6,
+            "bins": len(sketch.bins),
+            "stored_bytes": len(sketch.to_bytes()),
+            **{
+                f"p{round(q * 100)}_error": abs(sketch.quantile(q) - values[int(q * (count - 1))]) / values[int(q * (count - 1))]
+                for q in (0.75, 0.99)
+            },
+        }
+    return results
+
+
+# Extra backend routes, mounted in front of the Reflex backend
+api = Starlette()
+api.add_route("/metrics", metrics_endpoint)
+api.add_route("/admin/flight-recorder", flight_recorder_endpoint)
+api.add_route("/admin/profile", profile_endpoint, methods=["GET", "POST"])
+api.add_route("/admin/state-audit", state_audit_endpoint)
+api.add_route("/results/{token}", result_endpoint)
+api.add_route("/quiz/submit", quiz_submit_endpoint, methods=["POST"])
+api.add_route("/results/{token}/leaderboard", leaderboard_join_endpoint, methods=["POST"])
+api.add_route("/leaderboard", leaderboard_endpoint)
+api.add_route("/leaderboard/rank/{token}", leaderboard_rank_endpoint)
+api.add_route("/analytics/beacon", analytics_beacon_endpoint, methods=["POST"])
+api.add_route("/admin/analytics", analytics_summary_endpoint)
+api.add_route("/vitals/beacon", vitals_beacon_endpoint, methods=["POST"])
+api.add_route("/admin/vitals", vitals_summary_endpoint)
+
+
+app = rx.App(
+    stylesheets=["/styles.css", *filter(None, [FONT_MANIFEST["stylesheet"]])],  # Correct way to load external CSS
+    head_components=[  # Faces every page needs, fetched before the CSS that refers to them
+        rx.el.link(rel="preload", href=url, type="font/woff2", cross_origin="anonymous", custom_attrs={"as": "font"})
+        for url in FONT_MANIFEST["preload"]
+    ],
+    api_transformer=api,  # Serve /metrics alongside the Reflex backend
+    backend_exception_handler=backend_exception_handler,  # Count handler exceptions
+)
+app.add_middleware(EventMetricsMiddleware())
+app.register_lifespan_task(flight_recorder_lifespan)
+app.register_lifespan_task(session_store_lifespan)
+app.register_lifespan_task(result_signing_key)  # Load it (or fail, in production) when the server starts
+app.register_lifespan_task(leaderboard_lifespan)
+app.register_lifespan_task(response_log_lifespan)
+app.register_lifespan_task(analytics_lifespan)
+app.register_lifespan_task(vitals_lifespan)
+app.add_page(profiled_page(home), route="/")
+app.add_page(profiled_page(ux), route="/resources/user-experiences", on_load=State.onload)
+if IRT_AVAILABLE:
+    app.add_page(profiled_page(adaptive_quiz), route="/resources/user-experiences/adaptive", on_load=AdaptiveState.start)
+app.add_page(profiled_page(educational), route="/resources/educational-resources")
+app.add_page(profiled_page(about), route="/about-us")      
+app.add_page(profiled_page(contact), route="/contact-us")
+app.add_page(profiled_page(academics), route="/resources/ai-academics")
+app.add_page(profiled_page(custom_404) , route="/404")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="WebEducateAI maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("audit-state", help="Report serialized bytes per session for each State class")
+    bench_state = commands.add_parser("bench-state", help="Benchmark the shared Redis state backend")
+    bench_state.add_argument("--url", default=STATE_REDIS_URL or "redis://localhost:6379/15")
+    bench_state.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    bench_state.add_argument("--events", type=int, default=4000)
+    commands.add_parser("bench-transport", help="Compare JSON/MessagePack/CBOR state delta frames")
+    bench_timeline = commands.add_parser("bench-timeline", help="Measure the compiled timeline for growing era counts")
+    bench_timeline.add_argument("--url", help="Also measure this running page in a browser, e.g. .../resources/user-experiences")
+    commands.add_parser("bench-results", help="Compare result page loads from permalinks and from session state")
+    commands.add_parser("bench-shuffle", help="Measure the seeded quiz shuffle and scoring per session")
+    commands.add_parser("bench-adaptive", help="Measure adaptive item selection and test length")
+    commands.add_parser("bench-leaderboard", help="Measure leaderboard inserts, rank queries and top-N reads")
+    commands.add_parser("bench-analytics", help="Measure analytics memory and unique-visitor error as visitors grow")
+    commands.add_parser("bench-vitals", help="Measure Web Vitals sketch ingest cost, size and quantile error")
+    commands.add_parser("build-sw", help="Generate assets/sw.js with a content-hashed precache manifest")
+    compress = commands.add_parser("precompress", help="Write .br/.gz siblings for every text asset")
+    compress.add_argument("directories", nargs="*", default=list(PRECOMPRESS_DIRS))
+    serve = commands.add_parser("serve-static", help="Serve a directory (e.g. the export) with precompressed files")
+    serve.add_argument("directory", nargs="?", default=STATIC_EXPORT_DIR)
+    serve.add_argument("--port", type=int, default=3000)
+    serve.add_argument("--pack", help="Serve this static pack (see build-pack) instead of the directory")
+    bench_compress = commands.add_parser("bench-precompressed", help="Compare on-the-fly and precompressed serving")
+    bench_compress.add_argument("directory", nargs="?", default="CV_refinement")
+    critical = commands.add_parser("critical-css", help="Inline critical CSS into exported pages and defer the rest")
+    critical.add_argument("directory", nargs="?", default=STATIC_EXPORT_DIR)
+    icons = commands.add_parser("build-icons", help="Generate assets/icons.svg with the lucide icons the pages use")
+    icons.add_argument("--lucide", default=LUCIDE_DIR)
+    pack = commands.add_parser("build-pack", help="Pack assets/ and CV_refinement/ (or one directory) into one mmap-able file")
+    pack.add_argument("directory", nargs="?", help="Pack this directory at / instead, e.g. the static export")
+    pack.add_argument("--out", default=STATIC_PACK_FILE)
+    commands.add_parser("bench-pack", help="Compare the static pack with the directory-based static handlers")
+    commands.add_parser("fingerprint-assets", help="Copy static files to content-hashed names and write the manifest")
+    fonts = commands.add_parser("build-fonts", help="Subset the web fonts the pages use into assets/fonts")
+    fonts.add_argument("--source", default=FONT_SOURCE_DIR)
+    calibrate = commands.add_parser("calibrate-irt", help="Fit 2PL item parameters from a response log")
+    calibrate.add_argument("--log", default=IRT_RESPONSE_LOG or "responses.jsonl")
+    calibrate.add_argument("--out", default=IRT_PARAMS or "irt_params.json")
+    calibrate.add_argument("--iterations", type=int, default=30)
+    args = parser.parse_args()
+
+    if args.command == "audit-state":
+        print(f"{'State class':40} {'pickle':>8} {'json':>8}")
+        for name, sizes in audit_state_sizes().items():
+            print(f"{name:40} {sizes['pickle']:>8.0f} {sizes['json']:>8.0f}")
+
+    elif args.command == "bench-state":
+        for count, rate in benchmark_state_backend(args.url, args.workers, args.events).items():
+            print(f"{count:>3} workers: {rate:>10.0f} events/s")
+
+    elif args.command == "bench-transport":
+        print(f"{'codec':16} {'bytes':>7} {'deflate':>8} {'encode us':>10} {'decode us':>10}")
+        for codec, row in benchmark_transport().items():
+            print(f"{codec:16} {row['bytes']:>7.0f} {row['deflate']:>8.0f} {row['encode_us']:>10.1f} {row['decode_us']:>10.1f}")
+
+    elif args.command == "bench-timeline":
+        print(f"{'eras':>5} {'compile ms':>11} {'elements':>9} {'conditionals':>13} {'bytes':>9}")
+        for size, row in benchmark_timeline().items():
+            print(f"{size:>5} {row['compile_ms']:>11.1f} {row['elements']:>9} {row['conditionals']:>13} {row['bytes']:>9}")
+        if args.url:
+            page = measure_timeline_page(args.url)
+            print(
+                f"{args.url}: {page['dom_nodes']} DOM nodes ({page['timeline_nodes']} in the timeline), "
+                f"timeline in the DOM at {page['timeline_ms']:.0f} ms, load event at {page['load_ms']:.0f} ms"
+            )
+
+    elif args.command == "bench-results":
+        print(f"{'source':8} {'pages/s':>10} {'session bytes':>14}")
+        for source, row in benchmark_result_page().items():
+            print(f"{source:8} {row['pages_per_s']:>10.0f} {row['session_bytes']:>14.0f}")
+
+    elif args.command == "bench-shuffle":
+        report = benchmark_shuffle()
+        print(f"{'sessions':>9} {'shuffle us':>11} {'score us':>9}")
+        for count, row in report["sessions"].items():
+            print(f"{count:>9} {row['shuffle_us']:>11.1f} {row['score_us']:>9.1f}")
+        print(f"stored State bytes per session: {report['state_bytes']}")
+
+    elif args.command == "bench-adaptive":
+        print(f"{'items':>6} {'select us':>10} {'estimate us':>12} {'adaptive n':>11} {'fixed n':>8} {'adaptive rmse':>14} {'fixed rmse':>11}")
+        for size, row in benchmark_adaptive().items():
+            print(
+                f"{size:>6} {row['select_us']:>10.1f} {row['estimate_us']:>12.1f} {row['adaptive_items']:>11.1f} "
+                f"{row['fixed_items']:>8.1f} {row['adaptive_rmse']:>14.2f} {row['fixed_rmse']:>11.2f}"
+            )
+
+    elif args.command == "calibrate-irt":
+        used = calibrate_from_log(args.log, args.out, args.iterations)
+        print(f"Calibrated {len(QUIZ_QUESTIONS)} items from {used} responses into {args.out}")
+
+    elif args.command == "bench-leaderboard":
+        for name, value in benchmark_leaderboard().items():
+            print(f"{name:14} {value:>10.2f}")
+
+    elif args.command == "build-sw":
+        if os.environ.get("PYTHONHASHSEED") != "0":
+            # Page hashes depend on set order, so rerun with a fixed hash seed
+            os.execve(sys.executable, [sys.executable, *sys.argv], {**os.environ, "PYTHONHASHSEED": "0"})
+        built = build_service_worker()
+        print(
+            f"Wrote {SERVICE_WORKER_FILE}: {built['entries']} precached entries "
+            f"({built['asset_bytes']} asset bytes), {built['worker_bytes']} bytes of worker"
+        )
+
+    elif args.command == "precompress":
+        totals = precompress(args.directories)
+        print(
+            f"{totals['files']} files, {totals['bytes']} bytes -> gzip {totals['gzip']}, brotli {totals['br']} "
+            f"({totals['seconds']:.2f} s CPU)"
+        )
+
+    elif args.command == "serve-static":
+        import uvicorn
+
+        static = PackedStaticFiles(args.pack) if args.pack else PrecompressedStaticFiles(directory=args.directory, html=True)
+        uvicorn.run(
+            DownloadShaper(Starlette(routes=[Route("/metrics", metrics_endpoint), Mount("/", static)])),
+            port=args.port,
+        )
+
+    elif args.command == "bench-precompressed":
+        print(f"{'serving':28} {'CPU us/request':>15} {'bytes/round':>12}")
+        for label, row in benchmark_precompressed(args.directory).items():
+            print(f"{label:28} {row['cpu_us']:>15.1f} {row['bytes']:>12.0f}")
+
+    elif args.command == "build-fonts":
+        report = build_fonts(args.source)
+        print(f"{'route':40} {'faces':>6} {'full bytes':>11} {'subset bytes':>13} {'width shift':>12} {'adjusted':>9}")
+        for route, row in report["pages"].items():
+            print(
+                f"{route:40} {row['faces']:>6} {row['full_bytes']:>11} {row['subset_bytes']:>13} "
+                f"{row['width_shift']:>12.1%} {row['adjusted_width_shift']:>9.1%}"
+            )
+        for face in report["missing"]:
+            print(f"missing source font: {face}")
+
+    elif args.command == "critical-css":
+        print(f"{'route':40} {'blocking gz':>12} {'inline':>7} {'FCP before ms':>14} {'FCP after ms':>13}")
+        for route, row in inline_critical_css(args.directory).items():
+            print(
+                f"{route:40} {row['blocking_bytes']:>12} {row['inline_bytes']:>7} "
+                f"{row['fcp_before_ms']:>14.0f} {row['fcp_after_ms']:>13.0f}"
+            )
+
+    elif args.command == "build-icons":
+        report = build_icon_sprite(args.lucide)
+        print(f"{len(report['icons'])} icons: {', '.join(report['icons'])}")
+        print(f"sprite: {report['sprite_bytes']} bytes inline per page")
+        print(f"lucide-react modules no longer bundled: {report['module_bytes_removed']} bytes")
+
+    elif args.command == "fingerprint-assets":
+        report = fingerprint_assets()
+        print(
+            f"{report['files']} files ({report['copied']} new copies), {report['pages']} pages rewritten, "
+            f"{report['retired']} retired hashes kept, {report['removed']} expired removed"
+        )
+
+    elif args.command == "build-pack":
+        report = build_pack([("/", args.directory)] if args.directory else PACK_SOURCES, args.out)
+        print(f"{args.out}: {report['files']} files, {report['variants']} variants, {report['bytes']} bytes")
+
+    elif args.command == "bench-pack":
+        print(f"{'handler':26} {'CPU us/request':>15} {'requests/s':>11} {'bytes/round':>12}")
+        for label, row in benchmark_pack().items():
+            print(f"{label:26} {row['cpu_us']:>15.1f} {row['requests_per_s']:>11.0f} {row['bytes']:>12.0f}")
+
+    elif args.command == "bench-analytics":
+        print(f"{'visitors':>9} {'record us':>10} {'register bytes':>15} {'unique error':>13}")
+        for count, row in benchmark_analytics().items():
+            print(f"{count:>9} {row['record_us']:>10.2f} {row['register_bytes']:>15} {row['error']:>13.2%}")
+
+    elif args.command == "bench-vitals":
+        print(f"{'samples':>9} {'record us':>10} {'bins':>6} {'stored bytes':>13} {'p75 error':>10} {'p99 error':>10}")
+        for count, row in benchmark_vitals().items():
+            print(
+                f"{count:>9} {row['record_us']:>10.2f} {row['bins']:>6} {row['stored_bytes']:>13}"
+                f" {row['p75_error']:>10.2%} {row['p99_error']:>10.2%}"
+            )
@@ -0,0 +1,442 @@
+"""Focused tests for diss_website. Run from the app directory (next to rxconfig.py): python -m pytest tests"""
+
+import asyncio
+import base64
+import hashlib
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import diss_website as site  # noqa: E402
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+# ---------------------------------------------------------------------------
+# HyperLogLog and DDSketch error bounds
+# ---------------------------------------------------------------------------
+
+
+def hashed(value) -> int:
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big")
+
+
+@pytest.mark.parametrize("count", [50, 1000, 20000, 200000])
+def test_hyperloglog_estimate_within_bound(count):
+    hll = site.HyperLogLog()
+    for value in range(count):
+        hll.add(hashed(value))
+    standard_error = 1.04 / (1 << site.HLL_PRECISION) ** 0.5
+    assert abs(hll.estimate() - count) <= 3 * standard_error * count
+
+
+def test_hyperloglog_ignores_repeats_and_merges_as_union():
+    left, right = site.HyperLogLog(), site.HyperLogLog()
+    for value in range(6000):
+        left.add(hashed(value))
+        left.add(hashed(value))
+    for value in range(3000, 9000):
+        right.add(hashed(value))
+    assert abs(left.estimate() - 6000) <= 0.1 * 6000
+    left.merge(right)
+    assert abs(left.estimate() - 9000) <= 0.1 * 9000
+    assert site.HyperLogLog(bytes(left.registers)).registers == left.registers
+
+
+def exact_quantile(values, q):
+    return sorted(values)[int(q * (len(values) - 1))]
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_ddsketch_quantiles_within_relative_accuracy(seed):
+    rng = random.Random(seed)
+    values = [rng.lognormvariate(7, 1.5) for _ in range(20000)]
+    sketch = site.DDSketch()
+    for value in values:
+        sketch.add(value)
+    for q in (0.01, *site.VITALS_QUANTILES, 1.0):
+        exact = exact_quantile(values, q)
+        assert abs(sketch.quantile(q) - exact) <= site.VITALS_ACCURACY * exact * (1 + 1e-9)
+
+
+def test_ddsketch_merge_and_round_trip_match_one_sketch():
+    rng = random.Random(4)
+    values = [rng.uniform(0, 5000) for _ in range(4000)] + [0.0] * 100
+    whole, first, second = site.DDSketch(), site.DDSketch(), site.DDSketch()
+    for index, value in enumerate(values):
+        whole.add(value)
+        (first if index % 2 else second).add(value)
+    first.merge(second)
+    restored = site.DDSketch.from_bytes(first.to_bytes())
+    assert (restored.bins, restored.zeros, restored.count) == (whole.bins, whole.zeros, whole.count)
+    assert whole.quantile(0.01) == 0.0
+    exact = exact_quantile(values, 0.95)
+    assert abs(restored.quantile(0.95) - exact) <= site.VITALS_ACCURACY * exact * (1 + 1e-9)
+
+
+def test_ddsketch_collapses_low_bins_and_keeps_high_quantiles():
+    sketch = site.DDSketch()
+    values = [1.001**k for k in range(20000)]  # Far more distinct bins than VITALS_MAX_BINS
+    for value in values:
+        sketch.add(value)
+    assert len(sketch.bins) <= site.VITALS_MAX_BINS
+    exact = exact_quantile(values, 0.99)
+    assert abs(sketch.quantile(0.99) - exact) <= site.VITALS_ACCURACY * exact * (1 + 1e-9)
+
+
+# ---------------------------------------------------------------------------
+# Result tokens
+# ---------------------------------------------------------------------------
+
+B64_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+
+
+@pytest.fixture
+def signing_key(monkeypatch):
+    monkeypatch.setenv("RESULT_SIGNING_KEY", "test key")
+    site.result_signing_key.cache_clear()
+    yield
+    site.result_signing_key.cache_clear()
+
+
+def sample_answers():
+    return [1 << (index % len(q.options)) for index, q in enumerate(site.QUIZ_QUESTIONS)]
+
+
+def test_token_round_trip(signing_key):
+    answers = sample_answers()
+    order = list(reversed(range(len(answers))))
+    canonical = site.decode_result_token(site.sign_result_token(answers))
+    shuffled = site.decode_result_token(site.sign_result_token(answers, order))
+    assert canonical == (answers, list(range(len(answers))), False)
+    assert shuffled == (answers, order, False)
+    assert site.verify_result_token(site.sign_result_token(answers, order)) == answers
+
+
+def test_offline_token_is_flagged_and_distinct(signing_key):
+    answers = sample_answers()
+    online, offline = site.sign_result_token(answers), site.sign_result_token(answers, offline=True)
+    assert online != offline
+    assert site.decode_result_token(offline).offline is True
+    assert site.decode_result_token(online).offline is False
+
+
+def test_token_rejects_tampering(signing_key, monkeypatch):
+    token = site.sign_result_token(sample_answers())
+    middle = len(token) // 2
+    flipped = token[:middle] + ("A" if token[middle] != "A" else "B") + token[middle + 1 :]
+    assert site.decode_result_token(flipped) is None
+    monkeypatch.setenv("RESULT_SIGNING_KEY", "another key")
+    site.result_signing_key.cache_clear()
+    assert site.decode_result_token(token) is None
+
+
+def test_token_rejects_non_canonical_spellings(signing_key):
+    token = site.sign_result_token(sample_answers())
+    assert site.decode_result_token(token + "=") is None
+    assert site.decode_result_token(token + "A") is None
+    assert site.decode_result_token(f" {token}") is None
+    # Other final characters may decode to the same bytes through unused padding bits
+    spellings = [token[:-1] + char for char in B64_ALPHABET]
+    assert [spelling for spelling in spellings if site.decode_result_token(spelling)] == [token]
+
+
+def test_token_rejects_explicit_canonical_order(signing_key):
+    answers = sample_answers()
+    payload = bytes(answers) + bytes(range(len(answers)))
+    token = base64.urlsafe_b64encode(payload + site._result_mac(payload)).rstrip(b"=").decode()
+    assert site.decode_result_token(token) is None
+
+
+def test_token_rejects_invalid_contents(signing_key):
+    answers = sample_answers()
+    single = next(index for index, q in enumerate(site.QUIZ_QUESTIONS) if not q.multi)
+    answers[single] = 0b11  # Two picks on a single-choice question
+    assert site.decode_result_token(site.sign_result_token(answers)) is None
+    order = list(range(len(answers)))
+    order[-1] = order[0]  # A repeat, not a permutation
+    assert site.decode_result_token(site.sign_result_token(sample_answers(), order)) is None
+    assert site.decode_result_token(site.sign_result_token(sample_answers()[:-1])) is None
+
+
+# ---------------------------------------------------------------------------
+# Static asset pack
+# ---------------------------------------------------------------------------
+
+PACK_TEXT = ("body { color: black; }\n" * 40).encode()
+PACK_BINARY = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def packed(tmp_path):
+    source = tmp_path / "static"
+    (source / "docs").mkdir(parents=True)
+    (source / "style.css").write_bytes(PACK_TEXT)
+    (source / "docs" / "paper.pdf").write_bytes(PACK_BINARY)
+    site.build_pack((("/", str(source)),), str(tmp_path / "static.pack"))
+    server = site.PackedStaticFiles(str(tmp_path / "static.pack"))
+    yield server
+    server.pack.retire()
+
+
+def request(asgi_app, path: str, method: str = "GET", **headers):
+    """Send one request straight to an ASGI app: (status, headers, body)."""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http", "method": method, "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "http_version": "1.1", "scheme": "http", "server": ("test", 80),
+        "client": ("test", 1), "extensions": {},
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    }
+    run(asgi_app(scope, receive, send))
+    start = messages[0]
+    body = b"".join(bytes(message.get("body", b"")) for message in messages[1:])
+    return start["status"], {name.decode(): value.decode() for name, value in start["headers"]}, body
+
+
+def test_pack_serves_files_and_encodings(packed):
+    status, headers, body = request(packed, "/docs/paper.pdf")
+    assert (status, body, headers["content-type"]) == (200, PACK_BINARY, "application/pdf")
+    assert headers["content-length"] == str(len(PACK_BINARY))
+    status, headers, body = request(packed, "/style.css", accept_encoding="gzip")
+    assert (status, headers["content-encoding"]) == (200, "gzip")
+    assert len(body) < len(PACK_TEXT)
+    status, headers, body = request(packed, "/style.css", "HEAD")
+    assert (status, body, headers["content-length"]) == (200, b"", str(len(PACK_TEXT)))
+
+
+def test_pack_ranges(packed):
+    status, headers, body = request(packed, "/docs/paper.pdf", range="bytes=10-19")
+    assert (status, body, headers["content-range"]) == (206, PACK_BINARY[10:20], f"bytes 10-19/{len(PACK_BINARY)}")
+    status, headers, body = request(packed, "/docs/paper.pdf", range="bytes=1000-")
+    assert (status, body) == (206, PACK_BINARY[1000:])
+    status, headers, body = request(packed, "/docs/paper.pdf", range="bytes=-5")
+    assert (status, body) == (206, PACK_BINARY[-5:])
+    status, headers, body = request(packed, "/docs/paper.pdf", range="bytes=5-99999")
+    assert (status, body) == (206, PACK_BINARY[5:])
+    status, headers, _ = request(packed, "/docs/paper.pdf", range=f"bytes={len(PACK_BINARY)}-")
+    assert (status, headers["content-range"]) == (416, f"bytes */{len(PACK_BINARY)}")
+    assert request(packed, "/docs/paper.pdf", range="bytes=9-3")[0] == 416
+    assert request(packed, "/docs/paper.pdf", range="bytes=-")[0] == 200
+    # Ranges only apply to the identity bytes, never to a compressed variant
+    assert request(packed, "/style.css", range="bytes=0-9", accept_encoding="gzip")[0] == 200
+
+
+def test_pack_etags(packed):
+    status, headers, _ = request(packed, "/docs/paper.pdf")
+    etag = headers["etag"]
+    for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        status, revalidated, body = request(packed, "/docs/paper.pdf", if_none_match=header)
+        assert (status, body, revalidated["etag"]) == (304, b"", etag)
+    assert request(packed, "/docs/paper.pdf", if_none_match='"other"')[0] == 200
+    _, gzipped, _ = request(packed, "/style.css", accept_encoding="gzip")
+    _, identity, _ = request(packed, "/style.css")
+    assert gzipped["etag"] != identity["etag"]
+
+
+def test_pack_rejects_other_methods_and_unknown_paths(packed):
+    status, headers, _ = request(packed, "/style.css", "POST")
+    assert (status, headers["allow"]) == (405, "GET, HEAD")
+    assert request(packed, "/missing.css")[0] == 404
+
+
+def test_pack_retired_while_sending_closes_after_release(packed):
+    old = packed.pack
+    old.acquire()
+    old.retire()
+    assert not old.view.obj.closed
+    old.release()
+    assert old.mapping.closed
+    packed.pack = site.StaticPack(packed.path)
+
+
+# ---------------------------------------------------------------------------
+# Download admission
+# ---------------------------------------------------------------------------
+
+
+def test_downloads_handed_off_in_arrival_order(monkeypatch):
+    monkeypatch.setattr(site, "DOWNLOAD_GLOBAL_LIMIT", 1)
+    monkeypatch.setattr(site, "DOWNLOAD_QUEUE_LIMIT", 3)
+
+    async def scenario():
+        manager = site.DownloadManager()
+        assert await manager.acquire("first")
+        clients = ("second", "third", "fourth")
+        waiters = {client: asyncio.create_task(manager.acquire(client)) for client in clients}
+        await asyncio.sleep(0)
+        assert manager.queued == 3
+        assert await manager.acquire("late") is False  # Queue full
+        for holder, client in zip(("first", *clients), clients):
+            manager.release(holder)
+            assert await waiters[client]
+            assert [other for other, task in waiters.items() if not task.done()] == list(clients[clients.index(client) + 1 :])
+        return manager
+
+    manager = run(scenario())
+    assert (manager.active, manager.queued) == (1, 0)
+
+
+def test_download_waiter_blocked_by_its_own_cap_does_not_block_others():
+    async def scenario():
+        manager = site.DownloadManager()
+        for _ in range(site.DOWNLOAD_CLIENT_LIMIT):
+            assert await manager.acquire("busy")
+        blocked = asyncio.create_task(manager.acquire("busy"))
+        await asyncio.sleep(0)
+        assert await manager.acquire("other")  # A free global slot is not held for the blocked waiter
+        manager.release("busy")
+        assert await blocked
+        return manager
+
+    manager = run(scenario())
+    assert manager.per_client == {"busy": site.DOWNLOAD_CLIENT_LIMIT, "other": 1}
+
+
+def test_download_wait_times_out(monkeypatch):
+    monkeypatch.setattr(site, "DOWNLOAD_QUEUE_SECONDS", 0.01)
+    monkeypatch.setattr(site, "DOWNLOAD_QUEUE_LIMIT", 1)
+
+    async def scenario():
+        manager = site.DownloadManager()
+        for _ in range(site.DOWNLOAD_CLIENT_LIMIT):
+            await manager.acquire("client")
+        queued = asyncio.create_task(manager.acquire("client"))
+        await asyncio.sleep(0)
+        assert await manager.acquire("client") is False  # Queue full
+        assert await queued is False
+        return manager
+
+    manager = run(scenario())
+    assert (manager.active, manager.queued) == (site.DOWNLOAD_CLIENT_LIMIT, 0)
+
+
+def test_download_slot_returned_when_cancelled_after_hand_off():
+    async def scenario():
+        manager = site.DownloadManager()
+        for _ in range(site.DOWNLOAD_CLIENT_LIMIT):
+            await manager.acquire("client")
+        waiter = asyncio.create_task(manager.acquire("client"))
+        await asyncio.sleep(0)
+        manager.release("client")  # Hands the slot to the waiter...
+        waiter.cancel()  # ...which is cancelled before it resumes
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return manager
+
+    manager = run(scenario())
+    assert manager.active == site.DOWNLOAD_CLIENT_LIMIT - 1
+
+
+# ---------------------------------------------------------------------------
+# Bounded session store
+# ---------------------------------------------------------------------------
+
+
+def session_key(client_token: str) -> str:
+    return f"{client_token}_{site.State.get_full_name()}"
+
+
+async def touch(manager, client_token: str):
+    state = await manager.get_state(session_key(client_token))
+    await manager.set_state(session_key(client_token), state)
+
+
+def test_sessions_evicted_least_recently_used_over_cap():
+    async def scenario():
+        probe = site.BoundedStateManager(state=site.State)
+        await touch(probe, "probe")
+        size = probe._total_bytes
+        manager = site.BoundedStateManager(state=site.State, memory_cap=3 * size)
+        for client_token in ("a", "b", "c"):
+            await touch(manager, client_token)
+        await manager.get_state(session_key("a"))  # Now most recently used
+        await touch(manager, "d")
+        return manager, size
+
+    manager, size = run(scenario())
+    assert set(manager.states) == {"a", "c", "d"}
+    assert manager._total_bytes == 3 * size
+
+
+def test_idle_sessions_evicted_unless_in_use(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(site.time, "monotonic", lambda: clock[0])
+
+    async def scenario():
+        manager = site.BoundedStateManager(state=site.State, idle_ttl=60)
+        await touch(manager, "old")
+        await touch(manager, "busy")
+        clock[0] += 30
+        await touch(manager, "recent")
+        clock[0] += 45
+        lock = manager._states_locks.setdefault("busy", asyncio.Lock())  # As modify_state creates it
+        async with lock:  # An event is still running for this session
+            manager.evict_idle()
+        return manager
+
+    manager = run(scenario())
+    assert set(manager.states) == {"busy", "recent"}
+    assert set(manager._sizes) == {"busy", "recent"}
+
+
+# ---------------------------------------------------------------------------
+# Adaptive quiz
+# ---------------------------------------------------------------------------
+
+
+@pytest.fixture
+def item_bank():
+    pytest.importorskip("numpy")
+    return site.ItemBank([1.0, 1.5, 0.5, 2.0, 1.0], [-1.0, 0.0, 0.5, 1.0, 2.0])
+
+
+def test_irt_estimate_follows_responses(item_bank):
+    items = [0, 1, 2, 3, 4]
+    prior_theta, prior_se = item_bank.estimate([], 0)
+    assert abs(prior_theta) < 1e-9 and abs(prior_se - 1) < 0.01  # Standard normal prior
+    right, right_se = item_bank.estimate(items, 0b11111)
+    wrong, _ = item_bank.estimate(items, 0)
+    mixed, _ = item_bank.estimate(items, 0b00011)  # Only the two easiest right
+    assert wrong < mixed < right
+    assert right_se < prior_se
+
+
+def test_irt_estimate_matches_direct_posterior(item_bank):
+    np = pytest.importorskip("numpy")
+    items, responses = [3, 0, 4], 0b010  # Only item 0 right
+    grid = np.linspace(*site.IRT_GRID)
+    posterior = np.exp(-0.5 * grid**2)
+    for k, item in enumerate(items):
+        p = 1 / (1 + np.exp(-item_bank.a[item] * (grid - item_bank.b[item])))
+        posterior *= p if responses >> k & 1 else 1 - p
+    posterior /= posterior.sum()
+    theta = posterior @ grid
+    estimate, se = item_bank.estimate(items, responses)
+    assert abs(estimate - theta) < 1e-9
+    assert abs(se - np.sqrt(posterior @ (grid - theta) ** 2)) < 1e-9
+
+
+def test_irt_select_most_informative_unadministered(item_bank):
+    np = pytest.importorskip("numpy")
+    for theta in (-2.0, 0.0, 0.8, 3.0):
+        p = 1 / (1 + np.exp(-item_bank.a * (theta - item_bank.b)))
+        information = item_bank.a**2 * p * (1 - p)
+        assert item_bank.select(theta, set()) == int(information.argmax())
+        best = item_bank.select(theta, set())
+        information[best] = -1
+        assert item_bank.select(theta, {best}) == int(information.argmax())
+    assert item_bank.select(1.0, set()) == 3  # Steepest item at its own difficulty